@@ -12,10 +12,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 # Импортируем настройки и модели
 from config.settings import settings
 from database.base import Base
-from models.user import User
-from models.dish import Dish
-from models.order import Order, OrderItem
-from models.menu import Menu
+import models  # noqa: F401 - регистрирует все модели в Base.metadata
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -33,6 +30,8 @@ if database_url.startswith("sqlite+aiosqlite"):
     database_url = database_url.replace("sqlite+aiosqlite:///", "sqlite:///")
 elif database_url.startswith("sqlite:///"):
     pass  # Уже правильный формат
+elif database_url.startswith("postgresql+asyncpg://"):
+    database_url = database_url.replace("postgresql+asyncpg://", "postgresql://")
 config.set_main_option("sqlalchemy.url", database_url)
 
 # add your model's MetaData object here
@@ -84,7 +83,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite не умеет ALTER COLUMN - изменения таблиц через пересоздание
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
@@ -0,0 +1,208 @@
+"""baseline schema with hot-path indexes
+
+Базовая схема. Таблицы, которые уже создал init_db (create_all),
+пропускаются, а недостающие индексы добавляются, поэтому миграцию можно
+применять и к новой, и к существующей базе: alembic upgrade head.
+
+Перед созданием уникального индекса cafe_menu (cafe_id, dish_id, date)
+дубли удаляются, остается последняя строка.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_baseline'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_fsm_states_updated_at', 'fsm_states', ['updated_at'], False),
+    ('idx_outbox_status_available', 'notification_outbox', ['status', 'available_at'], False),
+    ('idx_menu_date_dish', 'menu', ['date', 'dish_id'], False),
+    ('idx_user_role', 'users', ['role'], False),
+    ('idx_user_office', 'users', ['office_id'], False),
+    ('uq_cafe_menu_cafe_dish_date', 'cafe_menu', ['cafe_id', 'dish_id', 'date'], True),
+    ('idx_cafe_menu_cafe_date', 'cafe_menu', ['cafe_id', 'date'], False),
+    ('idx_order_deadline_date_cafe_office', 'order_deadlines', ['date', 'cafe_id', 'office_id'], False),
+    ('ix_orders_user_id', 'orders', ['user_id'], False),
+    ('ix_orders_cafe_id', 'orders', ['cafe_id'], False),
+    ('ix_orders_order_date', 'orders', ['order_date'], False),
+    ('ix_orders_status', 'orders', ['status'], False),
+    ('idx_order_user_date', 'orders', ['user_id', 'order_date'], False),
+    ('idx_order_date_status', 'orders', ['order_date', 'status'], False),
+    ('idx_order_item_order', 'order_items', ['order_id'], False),
+    ('idx_order_item_dish_order', 'order_items', ['dish_id', 'order_id'], False),
+]
+
+
+def _create_table(inspector, name, *columns):
+    if not inspector.has_table(name):
+        op.create_table(name, *columns)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    _create_table(
+        inspector, 'offices',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'dishes',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('available', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'cafes',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('office_id', sa.Integer(), sa.ForeignKey('offices.id'), nullable=True),
+        sa.Column('contact_info', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('telegram_id', sa.Integer(), nullable=False, unique=True),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('full_name', sa.String(), nullable=True),
+        sa.Column('role', sa.Enum('USER', 'MANAGER', name='userrole'), nullable=True),
+        sa.Column('office_id', sa.Integer(), sa.ForeignKey('offices.id'), nullable=True),
+        sa.Column('is_blocked', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'menu',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('dish_id', sa.Integer(), sa.ForeignKey('dishes.id'), nullable=False),
+        sa.Column('available_quantity', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'cafe_menu',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('cafe_id', sa.Integer(), sa.ForeignKey('cafes.id'), nullable=False),
+        sa.Column('dish_id', sa.Integer(), sa.ForeignKey('dishes.id'), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('available_quantity', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'order_deadlines',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.Column('deadline_time', sa.DateTime(), nullable=False),
+        sa.Column('office_id', sa.Integer(), sa.ForeignKey('offices.id'), nullable=True),
+        sa.Column('cafe_id', sa.Integer(), sa.ForeignKey('cafes.id'), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'orders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('cafe_id', sa.Integer(), sa.ForeignKey('cafes.id'), nullable=True),
+        sa.Column('order_date', sa.DateTime(), nullable=False),
+        sa.Column('delivery_time', sa.DateTime(), nullable=True),
+        sa.Column('delivery_type', sa.Enum('DELIVERY', 'PICKUP', name='deliverytype'), nullable=True),
+        sa.Column('status', sa.Enum('PENDING', 'CONFIRMED', 'CANCELLED', 'COMPLETED', name='orderstatus'),
+                  nullable=True),
+        sa.Column('total_amount', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    _create_table(
+        inspector, 'order_items',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('order_id', sa.Integer(), sa.ForeignKey('orders.id'), nullable=False),
+        sa.Column('dish_id', sa.Integer(), sa.ForeignKey('dishes.id'), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+    )
+    _create_table(
+        inspector, 'daily_dish_stats',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('dish_id', sa.Integer(), sa.ForeignKey('dishes.id'), primary_key=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+    )
+    _create_table(
+        inspector, 'daily_user_stats',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('orders_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('items_count', sa.Integer(), nullable=False),
+    )
+    _create_table(
+        inspector, 'daily_cafe_stats',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('cafe_id', sa.Integer(), primary_key=True),
+        sa.Column('orders_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('items_count', sa.Integer(), nullable=False),
+    )
+    _create_table(
+        inspector, 'fsm_states',
+        sa.Column('key', sa.String(255), primary_key=True),
+        sa.Column('state', sa.String(255), nullable=True),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    _create_table(
+        inspector, 'notification_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('event', sa.String(50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('status', sa.Enum('PENDING', 'SENT', 'DEAD', name='outboxstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+    )
+
+    # Дубли меню кафе, накопившиеся до уникального индекса
+    op.execute(
+        "DELETE FROM cafe_menu WHERE id NOT IN ("
+        "SELECT MAX(id) FROM cafe_menu GROUP BY cafe_id, dish_id, date)"
+    )
+
+    inspector = sa.inspect(op.get_bind())
+    existing = {
+        table: {index['name'] for index in inspector.get_indexes(table)}
+        for table in {table for _, table, _, _ in INDEXES}
+    }
+    for name, table, columns, unique in INDEXES:
+        if name not in existing[table]:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    for table in ('notification_outbox', 'fsm_states', 'daily_cafe_stats', 'daily_user_stats',
+                  'daily_dish_stats', 'order_items', 'orders', 'order_deadlines', 'cafe_menu',
+                  'menu', 'users', 'cafes', 'dishes', 'offices'):
+        op.drop_table(table)
@@ -0,0 +1,101 @@
+"""day key columns for orders, menus and deadlines
+
+Столбец day (DATE) рядом с DateTime-столбцом даты: выборки за день
+становятся равенством по day, а уникальность меню проверяется по дню,
+а не по точному времени. Существующие строки заполняются из даты,
+дубли меню на один день удаляются, остается последняя строка.
+
+Revision ID: 0002_day_keys
+Revises: 0001_baseline
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_day_keys'
+down_revision: Union[str, None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблица -> DateTime-столбец, из которого берется день
+DAY_SOURCES = {
+    'orders': 'order_date',
+    'menu': 'date',
+    'cafe_menu': 'date',
+    'order_deadlines': 'date',
+}
+
+OLD_INDEXES = [
+    ('idx_order_user_date', 'orders', ['user_id', 'order_date'], False),
+    ('idx_order_date_status', 'orders', ['order_date', 'status'], False),
+    ('idx_menu_date_dish', 'menu', ['date', 'dish_id'], False),
+    ('uq_cafe_menu_cafe_dish_date', 'cafe_menu', ['cafe_id', 'dish_id', 'date'], True),
+    ('idx_cafe_menu_cafe_date', 'cafe_menu', ['cafe_id', 'date'], False),
+    ('idx_order_deadline_date_cafe_office', 'order_deadlines', ['date', 'cafe_id', 'office_id'], False),
+]
+
+NEW_INDEXES = [
+    ('idx_order_user_day', 'orders', ['user_id', 'day'], False),
+    ('idx_order_day_status', 'orders', ['day', 'status'], False),
+    ('uq_menu_day_dish', 'menu', ['day', 'dish_id'], True),
+    ('uq_cafe_menu_cafe_dish_day', 'cafe_menu', ['cafe_id', 'dish_id', 'day'], True),
+    ('idx_cafe_menu_cafe_day', 'cafe_menu', ['cafe_id', 'day'], False),
+    ('idx_order_deadline_day_cafe_office', 'order_deadlines', ['day', 'cafe_id', 'office_id'], False),
+]
+
+
+def _existing_indexes(tables):
+    inspector = sa.inspect(op.get_bind())
+    return {table: {index['name'] for index in inspector.get_indexes(table)} for table in tables}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    for table, source in DAY_SOURCES.items():
+        if 'day' in {column['name'] for column in inspector.get_columns(table)}:
+            continue
+        op.add_column(table, sa.Column('day', sa.Date(), nullable=True))
+        # В SQLite DateTime хранится строкой, date() отрезает время
+        expression = f"date({source})" if bind.dialect.name == 'sqlite' else f"CAST({source} AS DATE)"
+        op.execute(f"UPDATE {table} SET day = {expression}")
+
+    # Дубли меню на один день, накопившиеся при разном времени в date
+    op.execute(
+        "DELETE FROM cafe_menu WHERE id NOT IN ("
+        "SELECT MAX(id) FROM cafe_menu GROUP BY cafe_id, dish_id, day)"
+    )
+    op.execute(
+        "DELETE FROM menu WHERE id NOT IN ("
+        "SELECT MAX(id) FROM menu GROUP BY day, dish_id)"
+    )
+
+    existing = _existing_indexes(DAY_SOURCES)
+    for name, table, _, _ in OLD_INDEXES:
+        if name in existing[table]:
+            op.drop_index(name, table_name=table)
+
+    for table in DAY_SOURCES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('day', existing_type=sa.Date(), nullable=False)
+
+    existing = _existing_indexes(DAY_SOURCES)
+    for name, table, columns, unique in NEW_INDEXES:
+        if name not in existing[table]:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(NEW_INDEXES):
+        op.drop_index(name, table_name=table)
+    for table in DAY_SOURCES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('day')
+    for name, table, columns, unique in OLD_INDEXES:
+        op.create_index(name, table, columns, unique=unique)
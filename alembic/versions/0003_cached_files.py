@@ -0,0 +1,44 @@
+"""cached Telegram file ids of generated reports
+
+Таблица cached_files: хэш данных отчета -> file_id уже загруженного
+документа. Если таблицу уже создал init_db (create_all), она пропускается.
+
+Revision ID: 0003_cached_files
+Revises: 0002_day_keys
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_cached_files'
+down_revision: Union[str, None] = '0002_day_keys'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('cached_files'):
+        op.create_table(
+            'cached_files',
+            sa.Column('content_hash', sa.String(length=64), primary_key=True),
+            sa.Column('report_key', sa.String(length=100), nullable=False),
+            sa.Column('file_id', sa.String(length=255), nullable=False),
+            sa.Column('filename', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        inspector = sa.inspect(op.get_bind())
+
+    if 'idx_cached_file_report_key' not in {index['name'] for index in inspector.get_indexes('cached_files')}:
+        op.create_index('idx_cached_file_report_key', 'cached_files', ['report_key'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_cached_file_report_key', table_name='cached_files')
+    op.drop_table('cached_files')
@@ -0,0 +1,31 @@
+"""dish search index
+
+Поисковый индекс блюд по названию и описанию (database.search_index):
+FTS5-таблица dish_search с триггерами в SQLite, pg_trgm GIN-индексы в
+PostgreSQL. Индекс заполняется существующими блюдами.
+
+Revision ID: 0004_dish_search
+Revises: 0003_cached_files
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from database.search_index import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_dish_search'
+down_revision: Union[str, None] = '0003_cached_files'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_search_index(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_search_index(op.get_bind())
@@ -6,6 +6,15 @@ load_dotenv()
 class Settings:
     BOT_TOKEN: str = os.getenv("BOT_TOKEN", "")
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./lunch_bot.db")
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "5"))
+    DB_READ_MAX_OVERFLOW: int = int(os.getenv("DB_READ_MAX_OVERFLOW", "10"))
+    DB_READ_POOL_TIMEOUT: float = float(os.getenv("DB_READ_POOL_TIMEOUT", "30"))
+    DB_READ_POOL_RECYCLE: int = int(os.getenv("DB_READ_POOL_RECYCLE", "3600"))
     ADMIN_IDS: list[int] = [int(id) for id in os.getenv("ADMIN_IDS", "").split(",") if id]
     ORDER_DEADLINE_HOUR: int = int(os.getenv("ORDER_DEADLINE_HOUR", "12"))
     ORDER_DEADLINE_MINUTE: int = int(os.getenv("ORDER_DEADLINE_MINUTE", "0"))
@@ -14,6 +23,42 @@ class Settings:
     WEEKLY_REPORT_DAY: int = int(os.getenv("WEEKLY_REPORT_DAY", "0"))
     WEEKLY_REPORT_HOUR: int = int(os.getenv("WEEKLY_REPORT_HOUR", "18"))
     WEEKLY_REPORT_MINUTE: int = int(os.getenv("WEEKLY_REPORT_MINUTE", "0"))
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+    FSM_STATE_TTL_HOURS: int = int(os.getenv("FSM_STATE_TTL_HOURS", "72"))
+    RATE_LIMIT_CAPACITY: float = float(os.getenv("RATE_LIMIT_CAPACITY", "30"))
+    RATE_LIMIT_REFILL_PER_SECOND: float = float(os.getenv("RATE_LIMIT_REFILL_PER_SECOND", "0.5"))
+    RATE_LIMIT_MANAGER_MULTIPLIER: float = float(os.getenv("RATE_LIMIT_MANAGER_MULTIPLIER", "4"))
+    BROADCAST_RATE_PER_SECOND: float = float(os.getenv("BROADCAST_RATE_PER_SECOND", "30"))
+    BROADCAST_PER_CHAT_INTERVAL: float = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1"))
+    BROADCAST_CONCURRENCY: int = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+    BROADCAST_MAX_RETRIES: int = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+    OUTBOX_WORKERS: int = int(os.getenv("OUTBOX_WORKERS", "2"))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    WEBHOOK_CONCURRENCY: int = int(os.getenv("WEBHOOK_CONCURRENCY", "20"))
+    WEBHOOK_SHUTDOWN_TIMEOUT: float = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "10"))
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "0.0.0.0")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+    QUERY_BUDGET_PER_UPDATE: int = int(os.getenv("QUERY_BUDGET_PER_UPDATE", "30"))
+    N_PLUS_ONE_THRESHOLD: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "128"))
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "5"))
+    SQLITE_WRITE_BATCH_SIZE: int = int(os.getenv("SQLITE_WRITE_BATCH_SIZE", "50"))
+    EXPORT_MAX_CONCURRENCY: int = int(os.getenv("EXPORT_MAX_CONCURRENCY", "2"))
+    EXPORT_CHUNK_ROWS: int = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
+    FILE_ID_CACHE_TTL_DAYS: int = int(os.getenv("FILE_ID_CACHE_TTL_DAYS", "30"))
 
 settings = Settings()
 
@@ -1,69 +1,147 @@
+import functools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 from config.settings import settings
 from database.base import Base
+from database.sqlite_profile import configure_sqlite_engine, write_queue
+from database.search_index import create_search_index
 from loguru import logger
 
 engine = None
 async_session = None
+read_engine = None
+read_session = None
 
-async def init_db():
-    """
-    Инициализация подключения к базе данных
-    Поддерживает SQLite (для разработки) и PostgreSQL (для продакшена)
+T = TypeVar("T")
+
+def _pool_settings(role: str) -> dict:
+    """Параметры пула движка: primary (DB_POOL_*) или read (DB_READ_POOL_*)"""
+    prefix = "DB_READ" if role == "read" else "DB"
+    return {
+        "pool_size": getattr(settings, f"{prefix}_POOL_SIZE"),
+        "max_overflow": getattr(settings, f"{prefix}_MAX_OVERFLOW"),
+        "pool_timeout": getattr(settings, f"{prefix}_POOL_TIMEOUT"),
+        "pool_recycle": getattr(settings, f"{prefix}_POOL_RECYCLE"),
+    }
+
+def _create_engines(database_url: str, role: str = "primary"):
     """
-    global engine, async_session
+    Создает движок по URL
     
-    database_url = settings.DATABASE_URL
+    Args:
+        database_url: URL базы данных
+        role: primary - основная база, read - реплика для чтения
     
-    # Определяем параметры подключения в зависимости от типа БД
-    connect_args = {}
-    pool_kwargs = {}
+    Returns:
+        Tuple[AsyncEngine, Optional[AsyncEngine]]: Движок и движок писателя
+            SQLite (только для основной файловой SQLite)
+    """
+    writer_engine = None
     
     if database_url.startswith("sqlite"):
-        # SQLite для локальной разработки
+        # SQLite: небольшие офисы и локальная разработка
         database_url = database_url.replace("sqlite:///", "sqlite+aiosqlite:///")
         connect_args = {"check_same_thread": False}
-        logger.info("Используется SQLite база данных (локальная разработка)")
-        engine = create_async_engine(
-            database_url,
-            echo=False,
-            poolclass=NullPool,  # SQLite не поддерживает пулы
-            connect_args=connect_args
-        )
+        if ":memory:" in database_url or database_url.endswith("sqlite+aiosqlite://"):
+            # База в памяти живет, пока открыто ее единственное соединение
+            logger.info("Используется SQLite база данных в памяти")
+            engine = create_async_engine(
+                database_url,
+                echo=False,
+                poolclass=StaticPool,
+                connect_args=connect_args
+            )
+        else:
+            logger.info(f"Используется SQLite база данных ({role}: WAL, пул читателей)")
+            # Пул читателей; запись через write_queue идет отдельным соединением
+            engine = create_async_engine(
+                database_url,
+                echo=False,
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=settings.SQLITE_READ_POOL_SIZE,
+                max_overflow=0,
+                connect_args=connect_args
+            )
+            configure_sqlite_engine(engine)
+            if role == "primary":
+                writer_engine = create_async_engine(
+                    database_url,
+                    echo=False,
+                    poolclass=AsyncAdaptedQueuePool,
+                    pool_size=1,
+                    max_overflow=0,
+                    connect_args=connect_args
+                )
+                configure_sqlite_engine(writer_engine, writer=True)
     elif database_url.startswith("postgresql://") or database_url.startswith("postgresql+asyncpg://"):
         # PostgreSQL для продакшена
         if not database_url.startswith("postgresql+asyncpg://"):
             database_url = database_url.replace("postgresql://", "postgresql+asyncpg://")
         
-        # Настройки пула для PostgreSQL
-        pool_kwargs = {
-            "pool_size": 5,
-            "max_overflow": 10,
-            "pool_pre_ping": True,  # Проверка соединения перед использованием
-            "pool_recycle": 3600,   # Переиспользование соединений каждый час
-        }
-        logger.info("Используется PostgreSQL база данных (продакшен)")
+        logger.info(f"Используется PostgreSQL база данных ({role})")
         engine = create_async_engine(
             database_url,
             echo=False,
-            poolclass=QueuePool,
-            **pool_kwargs
+            poolclass=AsyncAdaptedQueuePool,
+            pool_pre_ping=True,  # Проверка соединения перед использованием
+            **_pool_settings(role)
         )
     else:
         logger.warning(f"Неизвестный тип базы данных: {database_url}. Используются стандартные настройки.")
         engine = create_async_engine(database_url, echo=False)
     
+    return engine, writer_engine
+
+async def init_db():
+    """
+    Инициализация подключения к базе данных
+    Поддерживает SQLite (для разработки) и PostgreSQL (для продакшена)
+    
+    Если задан DATABASE_READ_URL, отчеты, история и статистика
+    (функции с @read_replica) читают из реплики через read_session.
+    """
+    global engine, async_session, read_engine, read_session
+    write_queue.bind(None)
+    
+    engine, writer_engine = _create_engines(settings.DATABASE_URL)
+    read_engine = None
+    if settings.DATABASE_READ_URL:
+        read_engine, _ = _create_engines(settings.DATABASE_READ_URL, role="read")
+    
+    from utils.metrics import instrument_engine
+    from database.query_monitor import install_query_monitor
+    for instrumented in (engine, writer_engine, read_engine):
+        if instrumented is not None:
+            instrument_engine(instrumented)
+            install_query_monitor(instrumented)
+    
     async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    read_session = (
+        async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+        if read_engine is not None else None
+    )
     
     # Создаем таблицы если их нет
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            # Поисковый индекс блюд для базы, созданной до его появления
+            await conn.run_sync(create_search_index)
         logger.info("База данных инициализирована успешно")
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         raise
+    
+    write_queue.bind(writer_engine)
+    
+    # Агрегаты для базы, созданной до их появления
+    from services.rollup_service import backfill_rollups_if_empty
+    async with async_session() as session:
+        if await backfill_rollups_if_empty(session):
+            logger.info("Дневные агрегаты заполнены по существующим заказам")
 
 async def get_session():
     if async_session is None:
@@ -78,3 +156,108 @@ async def get_session():
             logger.error(f"Ошибка в сессии базы данных: {e}", exc_info=True)
             raise
 
+async def run_write(job: Callable[[AsyncSession], Awaitable[T]], session: Optional[AsyncSession] = None) -> T:
+    """
+    Выполняет запись горячего пути (заказы в дедлайн)
+    
+    Для файловой SQLite задача уходит в очередь единственного писателя
+    с групповым COMMIT, иначе выполняется в переданной сессии
+    (или в новой, если сессия не передана).
+    
+    Args:
+        job: Корутина-функция, принимающая сессию и фиксирующая изменения
+        session: Сессия вызывающего кода
+    
+    Returns:
+        Результат задачи
+    """
+    if write_queue.enabled:
+        return await write_queue.submit(job)
+    if session is not None:
+        return await job(session)
+    if async_session is None:
+        raise RuntimeError("База данных не инициализирована. Вызовите init_db() перед использованием.")
+    async with async_session() as new_session:
+        return await job(new_session)
+
+
+class UpdateScope:
+    """
+    Сессия, общая для всего апдейта: открывается при первом обращении
+    (чтение FSM, DatabaseMiddleware) и закрывается в конце апдейта
+    """
+
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None):
+        self.session_factory = session_factory
+        self.session: Optional[AsyncSession] = None
+        self.read_session: Optional[AsyncSession] = None
+
+    def get_session(self) -> AsyncSession:
+        if self.session is None:
+            factory = self.session_factory or async_session
+            if factory is None:
+                raise RuntimeError("База данных не инициализирована. Вызовите init_db() перед использованием.")
+            self.session = factory()
+        return self.session
+
+    def get_read_session(self) -> AsyncSession:
+        if self.read_session is None:
+            self.read_session = read_session()
+        return self.read_session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.read_session is not None:
+            await self.read_session.close()
+            self.read_session = None
+
+_update_scope: ContextVar[Optional[UpdateScope]] = ContextVar("update_scope", default=None)
+
+@asynccontextmanager
+async def update_scope(session_factory: Optional[async_sessionmaker] = None) -> AsyncIterator[UpdateScope]:
+    """Открывает область одной сессии на апдейт"""
+    scope = UpdateScope(session_factory)
+    token = _update_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _update_scope.reset(token)
+        await scope.close()
+
+def get_update_session() -> Optional[AsyncSession]:
+    """Сессия текущего апдейта или None вне update_scope"""
+    scope = _update_scope.get()
+    return scope.get_session() if scope is not None else None
+
+_primary_reads: ContextVar[bool] = ContextVar("primary_reads", default=False)
+
+@contextmanager
+def read_from_primary():
+    """Чтение из основной базы для экранов, которые должны видеть свои же записи"""
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+def read_replica(func):
+    """
+    Направляет функцию чтения в реплику DATABASE_READ_URL
+    
+    Первый аргумент функции - сессия. Если реплика задана и чтение не
+    переключено на основную базу (read_from_primary), вместо нее
+    передается сессия реплики текущего апдейта или временная сессия
+    (задачи планировщика). Реплика может отставать от основной базы.
+    """
+    @functools.wraps(func)
+    async def wrapper(session: AsyncSession, *args, **kwargs):
+        if read_session is None or _primary_reads.get():
+            return await func(session, *args, **kwargs)
+        scope = _update_scope.get()
+        if scope is not None:
+            return await func(scope.get_read_session(), *args, **kwargs)
+        async with read_session() as replica:
+            return await func(replica, *args, **kwargs)
+    return wrapper
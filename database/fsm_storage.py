@@ -0,0 +1,267 @@
+"""
+SQL-хранилище FSM aiogram с отложенной записью (write-behind)
+
+Состояние и данные сценариев (корзина, фильтры админки, незавершенный заказ)
+хранятся в таблице fsm_states на общем движке, поэтому переживают
+перезапуск и доступны нескольким процессам бота.
+
+За один апдейт обработчик несколько раз вызывает state.get_data/update_data:
+ключ читается из БД один раз, изменения копятся в буфере и записываются
+одним upsert в flush(), который FSMFlushMiddleware вызывает после апдейта.
+Записи, не обновлявшиеся дольше TTL, считаются пустыми и удаляются.
+"""
+import copy
+import enum
+import json
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from loguru import logger
+from database.database import get_update_session
+from models.fsm_state import FSMState
+from models.order import OrderStatus, DeliveryType
+from models.user import UserRole
+
+_ENUMS = {cls.__name__: cls for cls in (OrderStatus, DeliveryType, UserRole)}
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, dt_time):
+        return {"$t": value.isoformat()}
+    if isinstance(value, enum.Enum) and type(value).__name__ in _ENUMS:
+        return {"$e": type(value).__name__, "v": value.name}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Тип {type(value).__name__} не поддерживается в данных FSM")
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "$dt" in obj:
+            return datetime.fromisoformat(obj["$dt"])
+        if "$d" in obj:
+            return date.fromisoformat(obj["$d"])
+        if "$t" in obj:
+            return dt_time.fromisoformat(obj["$t"])
+    elif len(obj) == 2 and "$e" in obj and "v" in obj:
+        return _ENUMS[obj["$e"]][obj["v"]]
+    return obj
+
+def dumps_state_data(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Сериализует данные FSM в компактный JSON
+
+    datetime, date, time и перечисления моделей кодируются объектами
+    с одним служебным ключом ($dt, $d, $t, $e).
+
+    Returns:
+        str или None для пустых данных
+    """
+    if not data:
+        return None
+    return json.dumps(data, default=_encode, ensure_ascii=False, separators=(",", ":"))
+
+def loads_state_data(raw: Optional[str]) -> Dict[str, Any]:
+    """Восстанавливает данные FSM из JSON, записанного dumps_state_data"""
+    if not raw:
+        return {}
+    return json.loads(raw, object_hook=_decode)
+
+def storage_key(key: StorageKey) -> str:
+    """Строковый ключ записи fsm_states"""
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+@dataclass
+class _Entry:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    dirty: bool = False
+
+class SQLStorage(BaseStorage):
+    """
+    Хранилище FSM в таблице fsm_states с буфером отложенной записи
+
+    Args:
+        session_factory: Фабрика сессий (по умолчанию database.async_session
+            на момент вызова - init_db выполняется после создания Dispatcher)
+        ttl: Время жизни записи без обновлений
+        evict_interval: Как часто (в секундах) удалять устаревшие записи при flush
+        clock: Источник монотонного времени (для тестов)
+    """
+
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None,
+                 ttl: timedelta = timedelta(hours=72), evict_interval: float = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.evict_interval = evict_interval
+        self._clock = clock
+        self._entries: Dict[str, _Entry] = {}
+        self._writing: Dict[str, _Entry] = {}
+        self._last_eviction: Optional[float] = None
+        self.loads = 0
+        self.writes = 0
+
+    def _get_session_factory(self) -> async_sessionmaker:
+        if self.session_factory is not None:
+            return self.session_factory
+
+        from database import database
+        if database.async_session is None:
+            raise RuntimeError("База данных не инициализирована. Вызовите init_db() перед использованием.")
+        return database.async_session
+
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        # Внутри апдейта - общая сессия update_scope (то же соединение, что
+        # у DatabaseMiddleware), вне апдейта - собственная короткая сессия
+        session = get_update_session()
+        if session is not None:
+            yield session
+            return
+        async with self._get_session_factory()() as session:
+            yield session
+
+    async def _load(self, key: str) -> _Entry:
+        # Запись, которая сейчас пишется в БД, новее строки в таблице
+        writing = self._writing.get(key)
+        if writing is not None:
+            return _Entry(writing.state, copy.deepcopy(writing.data))
+
+        self.loads += 1
+        async with self._session() as session:
+            row = (await session.execute(
+                select(FSMState.state, FSMState.data, FSMState.updated_at).where(FSMState.key == key)
+            )).one_or_none()
+
+        if row is None or row.updated_at < _utcnow() - self.ttl:
+            return _Entry()
+        return _Entry(row.state, loads_state_data(row.data))
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        raw_key = storage_key(key)
+        entry = self._entries.get(raw_key)
+        if entry is None:
+            loaded = await self._load(raw_key)
+            entry = self._entries.setdefault(raw_key, loaded)
+        return entry
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        entry.dirty = True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry.data = copy.deepcopy(data)
+        entry.dirty = True
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._entry(key)).data)
+
+    async def flush(self, keys: Optional[Iterable[StorageKey]] = None) -> int:
+        """
+        Записывает накопленные изменения в БД и освобождает буфер
+
+        Следующий апдейт прочитает ключ из БД заново, поэтому изменения
+        из других процессов не теряются.
+
+        Args:
+            keys: Ключи для записи (по умолчанию все)
+
+        Returns:
+            int: Количество записанных ключей
+        """
+        raw_keys = list(self._entries) if keys is None else [storage_key(k) for k in keys]
+        pending = {}
+        for raw_key in raw_keys:
+            entry = self._entries.pop(raw_key, None)
+            if entry is not None and entry.dirty:
+                pending[raw_key] = entry
+
+        if pending:
+            self._writing.update(pending)
+            try:
+                await self._write(pending)
+            finally:
+                for raw_key, entry in pending.items():
+                    if self._writing.get(raw_key) is entry:
+                        del self._writing[raw_key]
+            self.writes += len(pending)
+
+        await self._maybe_evict()
+        return len(pending)
+
+    async def _write(self, pending: Dict[str, _Entry]) -> None:
+        now = _utcnow()
+        rows = [
+            {"key": raw_key, "state": entry.state, "data": dumps_state_data(entry.data), "updated_at": now}
+            for raw_key, entry in pending.items()
+            if entry.state is not None or entry.data
+        ]
+        cleared = [raw_key for raw_key, entry in pending.items() if entry.state is None and not entry.data]
+
+        async with self._session() as session:
+            if cleared:
+                await session.execute(delete(FSMState).where(FSMState.key.in_(cleared)))
+
+            if rows:
+                dialect = session.get_bind().dialect.name
+                if dialect in ("sqlite", "postgresql"):
+                    dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+                    stmt = dialect_insert(FSMState).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["key"],
+                        set_={c: stmt.excluded[c] for c in ("state", "data", "updated_at")}
+                    )
+                    await session.execute(stmt)
+                else:
+                    for row in rows:
+                        await session.merge(FSMState(**row))
+
+            await session.commit()
+
+    async def _maybe_evict(self) -> None:
+        now = self._clock()
+        if self._last_eviction is None:
+            self._last_eviction = now
+            return
+        if now - self._last_eviction < self.evict_interval:
+            return
+        self._last_eviction = now
+        try:
+            await self.evict_expired()
+        except Exception as e:
+            logger.warning(f"Не удалось удалить устаревшие состояния FSM: {e}")
+
+    async def evict_expired(self) -> int:
+        """
+        Удаляет записи, не обновлявшиеся дольше TTL
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        async with self._get_session_factory()() as session:
+            result = await session.execute(
+                delete(FSMState).where(FSMState.updated_at < _utcnow() - self.ttl)
+            )
+            await session.commit()
+        return result.rowcount or 0
+
+    async def close(self) -> None:
+        await self.flush()
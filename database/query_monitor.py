@@ -0,0 +1,171 @@
+"""
+Журнал медленных запросов и счетчик запросов на апдейт
+
+install_query_monitor подключает к движку before/after_cursor_execute:
+- запрос дольше SLOW_QUERY_THRESHOLD_MS логируется с нормализованным SQL
+  (литералы и списки IN свернуты) и формой параметров (типы, без значений);
+- запросы считаются в текущей области statement_scope. QueryBudgetMiddleware
+  открывает область на каждый апдейт и предупреждает, если апдейт выполнил
+  больше QUERY_BUDGET_PER_UPDATE запросов или один и тот же запрос
+  повторился N_PLUS_ONE_THRESHOLD раз (типичный N+1 в цикле).
+"""
+import re
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Callable, Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from loguru import logger
+from config.settings import settings
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+# Проверяется после замены чисел, поэтому $1 уже выглядит как $?
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|\$\?|:\w+)(?:\s*,\s*(?:\?|%s|\$\?|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_sql(statement: str) -> str:
+    """
+    Приводит SQL к виду, одинаковому для запросов, отличающихся только значениями
+
+    Returns:
+        str: SQL в одну строку, литералы заменены на ?, списки параметров - на (...)
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+def _value_shape(value: Any) -> str:
+    return "null" if value is None else type(value).__name__
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """
+    Описывает параметры запроса типами, без значений
+
+    Returns:
+        str: Например "(int, str)", "{id: int}" или "3 x (int, str)"
+    """
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        return f"{len(parameters)} x {parameter_shape(parameters[0])}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {_value_shape(value)}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_value_shape(value) for value in parameters) + ")"
+    return _value_shape(parameters)
+
+class StatementCounter:
+    """Запросы, выполненные в одной области (апдейт, задача, тест)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str) -> None:
+        self.count += 1
+        self.statements[normalize_sql(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Запросы, повторенные не менее threshold раз"""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+_current_counter: ContextVar[Optional[StatementCounter]] = ContextVar("statement_counter", default=None)
+
+@contextmanager
+def statement_scope(name: str) -> Iterator[StatementCounter]:
+    """Считает запросы, выполненные внутри блока (включая вложенные задачи)"""
+    counter = StatementCounter(name)
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+def report_statement_budget(counter: StatementCounter, budget: Optional[int] = None,
+                            repeat_threshold: Optional[int] = None) -> bool:
+    """
+    Логирует превышение бюджета запросов и повторяющиеся запросы
+
+    Returns:
+        bool: True, если найдено превышение или N+1
+    """
+    budget = settings.QUERY_BUDGET_PER_UPDATE if budget is None else budget
+    repeat_threshold = settings.N_PLUS_ONE_THRESHOLD if repeat_threshold is None else repeat_threshold
+    repeated = counter.repeated(repeat_threshold) if repeat_threshold else []
+    over_budget = bool(budget) and counter.count > budget
+    if not over_budget and not repeated:
+        return False
+
+    details = "; ".join(f"{count} x {sql[:200]}" for sql, count in repeated[:3])
+    logger.warning(
+        f"{counter.name}: {counter.count} SQL-запросов"
+        + (f" (бюджет {budget})" if over_budget else "")
+        + (f", возможный N+1: {details}" if details else "")
+    )
+    return True
+
+def count_statements(name: str, budget: Optional[int] = None) -> Callable:
+    """
+    Декоратор корутины: запросы считаются в отдельной области и проверяются по бюджету
+
+    Args:
+        name: Название области в логе
+        budget: Бюджет запросов (по умолчанию QUERY_BUDGET_PER_UPDATE, 0 - только поиск N+1)
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with statement_scope(name) as counter:
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    report_statement_budget(counter, budget)
+        return wrapper
+    return decorator
+
+_monitored_engines: "weakref.WeakSet" = weakref.WeakSet()
+
+def install_query_monitor(engine, slow_threshold_ms: Optional[float] = None) -> None:
+    """
+    Подключает журнал медленных запросов и счетчик запросов к движку
+
+    Args:
+        engine: AsyncEngine или Engine
+        slow_threshold_ms: Порог медленного запроса (по умолчанию из settings, 0 - не логировать)
+    """
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS if slow_threshold_ms is None else slow_threshold_ms
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine in _monitored_engines:
+        return
+    _monitored_engines.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+        counter = _current_counter.get()
+        if counter is not None:
+            counter.record(statement)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+        if threshold and elapsed_ms >= threshold:
+            counter = _current_counter.get()
+            logger.warning(
+                f"Медленный запрос {elapsed_ms:.1f} мс"
+                + (f" ({counter.name})" if counter is not None else "")
+                + f": {normalize_sql(statement)} | параметры {parameter_shape(parameters, executemany)}"
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
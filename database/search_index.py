@@ -0,0 +1,98 @@
+"""
+Поисковый индекс блюд по названию и описанию
+
+SQLite: FTS5-таблица dish_search с токенизатором trigram (поиск подстроки
+без учета регистра, включая кириллицу) поверх dishes как внешнего
+содержимого; триггеры держат ее в актуальном состоянии.
+PostgreSQL: расширение pg_trgm и GIN-индексы gin_trgm_ops, которые
+использует ILIKE '%...%'.
+
+Индекс создается вместе с таблицей dishes (create_all), для существующей
+базы - в init_db и миграцией 0004_dish_search; запросы к нему строит
+services.search_service.
+"""
+import sqlite3
+from sqlalchemy import Table, event
+from sqlalchemy.exc import DBAPIError
+from loguru import logger
+
+FTS_TABLE = "dish_search"
+
+# Токенизатор trigram появился в SQLite 3.34
+SQLITE_TRIGRAM = sqlite3.sqlite_version_info >= (3, 34, 0)
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, content='dishes', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS dishes_search_ai AFTER INSERT ON dishes BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS dishes_search_ad AFTER DELETE ON dishes BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    f"VALUES ('delete', old.id, old.name, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS dishes_search_au AFTER UPDATE OF name, description ON dishes BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    f"VALUES ('delete', old.id, old.name, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    # Заполняет индекс уже существующими блюдами
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS dishes_search_ai",
+    "DROP TRIGGER IF EXISTS dishes_search_ad",
+    "DROP TRIGGER IF EXISTS dishes_search_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_dish_name_trgm ON dishes USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_dish_description_trgm ON dishes USING gin (description gin_trgm_ops)",
+]
+
+POSTGRES_DROP_DDL = [
+    "DROP INDEX IF EXISTS idx_dish_description_trgm",
+    "DROP INDEX IF EXISTS idx_dish_name_trgm",
+]
+
+def create_search_index(connection) -> None:
+    """
+    Создает поисковый индекс блюд для диалекта соединения
+
+    Повторный вызов ничего не меняет. Если индекс создать нельзя (нет прав
+    на pg_trgm), поиск работает без него обычным ILIKE.
+
+    Args:
+        connection: Синхронное соединение SQLAlchemy
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite" and SQLITE_TRIGRAM:
+        exists = connection.exec_driver_sql(
+            f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'"
+        ).first()
+        if exists:
+            return
+        statements = SQLITE_DDL
+    elif dialect == "postgresql":
+        statements = POSTGRES_DDL
+    else:
+        return
+
+    try:
+        with connection.begin_nested():
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+    except DBAPIError as e:
+        logger.warning(f"Поисковый индекс блюд не создан, поиск будет без индекса: {e}")
+
+def drop_search_index(connection) -> None:
+    """Удаляет поисковый индекс блюд"""
+    dialect = connection.dialect.name
+    statements = {"sqlite": SQLITE_DROP_DDL, "postgresql": POSTGRES_DROP_DDL}.get(dialect, [])
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+def install_search_index(table: Table) -> None:
+    """Создает и удаляет индекс вместе с таблицей dishes"""
+    event.listen(table, "after_create", lambda target, connection, **kw: create_search_index(connection))
+    event.listen(table, "before_drop", lambda target, connection, **kw: drop_search_index(connection))
@@ -0,0 +1,193 @@
+"""
+Профиль SQLite для продакшена
+
+Файловая база SQLite открывается с прагмами WAL, synchronous=NORMAL,
+busy_timeout, cache_size и mmap_size. Чтения и обычные запросы идут через
+небольшой пул переиспользуемых соединений, а горячие записи (создание и
+отмена заказов) - через единственного писателя: задачи ставятся в очередь
+и выполняются по одной в общей транзакции BEGIN IMMEDIATE, каждая в своем
+SAVEPOINT, а транзакция фиксируется одним COMMIT на всю пачку (group commit).
+Пока идет COMMIT, в очереди копятся следующие задачи, поэтому под нагрузкой
+пачки растут сами, без искусственной задержки.
+
+Ошибка задачи откатывает только ее SAVEPOINT и возвращается вызывающему;
+ошибка COMMIT возвращается всем задачам пачки.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from loguru import logger
+from config.settings import settings
+
+T = TypeVar("T")
+WriteJob = Callable[[AsyncSession], Awaitable[T]]
+
+def sqlite_pragmas() -> List[str]:
+    """Прагмы, выполняемые при открытии каждого соединения"""
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        # Отрицательное значение - размер кэша в КиБ, а не в страницах
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+    ]
+
+def configure_sqlite_engine(engine: AsyncEngine, writer: bool = False) -> None:
+    """
+    Подключает прагмы к движку SQLite
+
+    Args:
+        engine: Асинхронный движок SQLite
+        writer: Движок писателя - транзакции открываются BEGIN IMMEDIATE
+            (блокировка записи берется сразу) и поддерживают SAVEPOINT
+    """
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        if writer:
+            # Транзакциями управляет SQLAlchemy, а не драйвер sqlite3
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    if writer:
+        @event.listens_for(engine.sync_engine, "begin")
+        def _on_begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+class SQLiteWriteQueue:
+    """Очередь записей с одним писателем и групповым COMMIT"""
+
+    def __init__(self, max_batch: Optional[int] = None):
+        self.max_batch = max_batch or settings.SQLITE_WRITE_BATCH_SIZE
+        self._engine: Optional[AsyncEngine] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.jobs = 0
+        self.failed_jobs = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._engine is not None
+
+    def bind(self, engine: Optional[AsyncEngine]) -> None:
+        """Назначает движок писателя (None - записи идут в обычные сессии)"""
+        self._engine = engine
+
+    async def submit(self, job: WriteJob) -> T:
+        """
+        Выполняет задачу записи в очереди писателя
+
+        Задача работает с сессией как обычно и вызывает session.commit();
+        изменения, не зафиксированные задачей, откатываются.
+
+        Args:
+            job: Корутина-функция, принимающая сессию
+
+        Returns:
+            Результат задачи после фиксации пачки
+        """
+        if not self.enabled:
+            raise RuntimeError("Писатель SQLite не настроен")
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                # Соединение не открылось или BEGIN не прошел
+                logger.error(f"Ошибка пачки записей SQLite: {e}")
+                self.failed_batches += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit_batch(self, batch: List[Tuple[WriteJob, asyncio.Future]]) -> None:
+        done: List[Tuple[asyncio.Future, Any]] = []
+        async with self._engine.connect() as conn:
+            await conn.begin()
+            for job, future in batch:
+                if future.cancelled():
+                    continue
+                session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint",
+                                       expire_on_commit=False)
+                try:
+                    result = await job(session)
+                except Exception as e:
+                    self.failed_jobs += 1
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                finally:
+                    await session.close()
+                done.append((future, result))
+
+            try:
+                await conn.commit()
+            except Exception as e:
+                logger.error(f"COMMIT пачки записей SQLite не выполнен: {e}")
+                self.failed_batches += 1
+                # Задачи уже обновили снимки меню после своих commit
+                from services.menu_snapshot_service import invalidate_menu_snapshots
+                invalidate_menu_snapshots()
+                for future, _ in done:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        self.batches += 1
+        self.jobs += len(done)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+
+    async def stop(self) -> None:
+        """Дожидается очереди и останавливает писателя"""
+        if self._queue is not None:
+            await self._queue.join()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "jobs": self.jobs,
+            "failed_jobs": self.failed_jobs,
+            "failed_batches": self.failed_batches,
+            "largest_batch": self.largest_batch
+        }
+
+write_queue = SQLiteWriteQueue()
+
+def get_sqlite_writer_stats() -> Dict[str, Any]:
+    """Статистика писателя SQLite"""
+    return write_queue.get_stats()
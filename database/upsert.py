@@ -0,0 +1,66 @@
+"""
+Пакетный upsert строк с возвратом ORM-объектов
+
+В SQLite и PostgreSQL строки пишутся INSERT ... ON CONFLICT DO UPDATE ...
+RETURNING пачками по UPSERT_CHUNK_ROWS (ограничение числа параметров
+SQLite), в остальных диалектах - поиском существующей строки по ключу.
+"""
+from typing import Any, Dict, List, Sequence, Type, TypeVar
+from sqlalchemy import and_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+UPSERT_CHUNK_ROWS = 500
+
+async def upsert_returning(session: AsyncSession, model: Type[T], rows: List[Dict[str, Any]],
+                           key_columns: Sequence[str], update_columns: Sequence[str]) -> List[T]:
+    """
+    Вставляет строки или обновляет существующие по уникальному ключу (без коммита)
+
+    Повторы ключа в rows схлопываются, последняя строка побеждает.
+
+    Args:
+        session: Сессия базы данных
+        model: ORM-модель
+        rows: Значения столбцов
+        key_columns: Столбцы уникального индекса
+        update_columns: Столбцы, обновляемые у существующей строки
+
+    Returns:
+        list: Записанные объекты модели
+    """
+    rows = list({tuple(row[c] for c in key_columns): row for row in rows}.values())
+    if not rows:
+        return []
+
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        written: List[T] = []
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            stmt = dialect_insert(model).values(rows[start:start + UPSERT_CHUNK_ROWS])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={c: stmt.excluded[c] for c in update_columns}
+            ).returning(model)
+            result = await session.execute(stmt, execution_options={"populate_existing": True})
+            written.extend(result.scalars().all())
+        return written
+
+    written = []
+    for row in rows:
+        result = await session.execute(
+            select(model).where(and_(*(getattr(model, c) == row[c] for c in key_columns)))
+        )
+        existing = result.scalar_one_or_none()
+        if existing is None:
+            existing = model(**row)
+            session.add(existing)
+        else:
+            for c in update_columns:
+                setattr(existing, c, row[c])
+        written.append(existing)
+    await session.flush()
+    return written
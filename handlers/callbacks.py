@@ -41,95 +41,73 @@ async def callback_help(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(lambda c: c.data == "cancel")
-async def callback_cancel(callback: CallbackQuery, state: FSMContext):
+async def callback_cancel(callback: CallbackQuery, state: FSMContext, user_is_admin: bool):
     await state.clear()
     from utils.keyboards import get_main_menu_keyboard
-    from database.database import get_session
-    from services.user_service import get_or_create_user, is_admin
     
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            callback.from_user.id,
-            callback.from_user.username,
-            callback.from_user.full_name
-        )
-        user_is_admin = await is_admin(session, user.telegram_id)
-        
-        await callback.message.edit_text(
-            "❌ <b>Операция отменена</b>\n\n"
-            "💡 Выберите действие из главного меню:",
-            reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
-            parse_mode="HTML"
-        )
-        await callback.answer()
-        return
+    await callback.message.edit_text(
+        "❌ <b>Операция отменена</b>\n\n"
+        "💡 Выберите действие из главного меню:",
+        reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+    return
 
 @router.message(Command("cancel"))
-async def cmd_cancel(message: Message, state: FSMContext):
+async def cmd_cancel(message: Message, state: FSMContext, user_is_admin: bool):
     current_state = await state.get_state()
     await state.clear()
     
     from utils.keyboards import get_main_menu_keyboard, get_back_keyboard
-    from database.database import get_session
-    from services.user_service import get_or_create_user, is_admin
     
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.full_name
-        )
-        user_is_admin = await is_admin(session, user.telegram_id)
-        
-        if current_state:
-            state_name = str(current_state)
-            if "DishManagementStates" in state_name or "LoadMenuStates" in state_name:
-                await message.answer(
-                    "❌ <b>Операция отменена</b>\n\n"
-                    "💡 Вы можете вернуться к управлению меню.",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="◀️ К управлению меню", callback_data="admin_menu")],
-                        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
-                    ]),
-                    parse_mode="HTML"
-                )
-            elif "OrderStates" in state_name:
-                await message.answer(
-                    "❌ <b>Создание заказа отменено</b>\n\n"
-                    "💡 Вы можете начать новый заказ из главного меню.",
-                    reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="📋 Создать заказ", callback_data="create_order")],
-                        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
-                    ]),
-                    parse_mode="HTML"
-                )
-            elif "HistoryFilterStates" in state_name or "AdminOrderFilterStates" in state_name:
-                await message.answer(
-                    "❌ <b>Фильтрация отменена</b>\n\n"
-                    "💡 Выберите действие из главного меню:",
-                    reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
-                    parse_mode="HTML"
-                )
-            else:
-                await message.answer(
-                    "❌ <b>Операция отменена</b>\n\n"
-                    "💡 Выберите действие из главного меню:",
-                    reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
-                    parse_mode="HTML"
-                )
+    if current_state:
+        state_name = str(current_state)
+        if "DishManagementStates" in state_name or "LoadMenuStates" in state_name:
+            await message.answer(
+                "❌ <b>Операция отменена</b>\n\n"
+                "💡 Вы можете вернуться к управлению меню.",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="◀️ К управлению меню", callback_data="admin_menu")],
+                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
+                ]),
+                parse_mode="HTML"
+            )
+        elif "OrderStates" in state_name:
+            await message.answer(
+                "❌ <b>Создание заказа отменено</b>\n\n"
+                "💡 Вы можете начать новый заказ из главного меню.",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="📋 Создать заказ", callback_data="create_order")],
+                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
+                ]),
+                parse_mode="HTML"
+            )
+        elif "HistoryFilterStates" in state_name or "AdminOrderFilterStates" in state_name:
+            await message.answer(
+                "❌ <b>Фильтрация отменена</b>\n\n"
+                "💡 Выберите действие из главного меню:",
+                reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
+                parse_mode="HTML"
+            )
         else:
             await message.answer(
-                "❌ <b>Нет активных операций для отмены</b>\n\n"
+                "❌ <b>Операция отменена</b>\n\n"
                 "💡 Выберите действие из главного меню:",
                 reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
                 parse_mode="HTML"
             )
-        return
+    else:
+        await message.answer(
+            "❌ <b>Нет активных операций для отмены</b>\n\n"
+            "💡 Выберите действие из главного меню:",
+            reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
+            parse_mode="HTML"
+        )
+    return
 
 @router.callback_query(lambda c: c.data == "start")
-async def callback_start(callback: CallbackQuery, state: FSMContext):
+async def callback_start(callback: CallbackQuery, state: FSMContext, user_is_admin: bool):
     # Проверяем незавершенную корзину ПЕРЕД очисткой state
     data = await state.get_data()
     cart = data.get("cart", [])
@@ -141,36 +119,25 @@ async def callback_start(callback: CallbackQuery, state: FSMContext):
         await state.set_state(None)
     
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    from database.database import get_session
-    from services.user_service import get_or_create_user, is_admin
     from utils.keyboards import get_main_menu_keyboard
     from utils.formatters import format_date
     
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            callback.from_user.id,
-            callback.from_user.username,
-            callback.from_user.full_name
-        )
-        
-        from utils.keyboards import get_main_menu_keyboard
-        user_is_admin = await is_admin(session, user.telegram_id)
-        
-        # Получаем главное меню
-        keyboard = get_main_menu_keyboard(is_admin=user_is_admin)
-        
-        # Если есть незавершенная корзина, добавляем кнопку в начало
-        if cart and saved_order_date:
-            total = sum(item["price"] * item["quantity"] for item in cart)
-            keyboard.inline_keyboard.insert(0, [
-                InlineKeyboardButton(
-                    text=f"🛒 Вернуться к корзине ({len(cart)} шт., {total:.0f} ₽)",
-                    callback_data="return_to_cart"
-                )
-            ])
-        
-        welcome_text = f"""
+    from utils.keyboards import get_main_menu_keyboard
+    
+    # Получаем главное меню
+    keyboard = get_main_menu_keyboard(is_admin=user_is_admin)
+    
+    # Если есть незавершенная корзина, добавляем кнопку в начало
+    if cart and saved_order_date:
+        total = sum(item["price"] * item["quantity"] for item in cart)
+        keyboard.inline_keyboard.insert(0, [
+            InlineKeyboardButton(
+                text=f"🛒 Вернуться к корзине ({len(cart)} шт., {total:.0f} ₽)",
+                callback_data="return_to_cart"
+            )
+        ])
+    
+    welcome_text = f"""
 👋 <b>Добро пожаловать!</b>
 
 Привет, <b>{callback.from_user.first_name}</b>! 👨‍🍳
@@ -185,14 +152,14 @@ async def callback_start(callback: CallbackQuery, state: FSMContext):
 📅 Выбирать блюда на любую дату
 
 💡 Выберите действие из меню ниже 👇"""
-        
-        if cart and saved_order_date:
-            welcome_text += f"\n\n🛒 У вас есть незавершенная корзина на {format_date(saved_order_date)}"
-        
-        await callback.message.edit_text(
-            welcome_text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-        await callback.answer()
+    
+    if cart and saved_order_date:
+        welcome_text += f"\n\n🛒 У вас есть незавершенная корзина на {format_date(saved_order_date)}"
+    
+    await callback.message.edit_text(
+        welcome_text,
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
+    await callback.answer()
 
@@ -3,288 +3,254 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from database.database import get_session
-from services.user_service import get_or_create_user
-from services.order_service import get_user_orders, get_order_by_id, cancel_order, search_user_orders_by_dish
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.user import User
+from services.order_service import get_user_orders, get_user_orders_page, get_order_by_id, cancel_order
 from models.order import OrderStatus
 from utils.formatters import format_order, format_date
+from utils.callback_data import CallbackData
+from utils.dates import start_of_day
+from database.database import run_write, read_from_primary
 from datetime import datetime, timedelta
 
 router = Router()
 
+HISTORY_ORDERS_PER_PAGE = 5
+
 class HistoryFilterStates(StatesGroup):
     waiting_for_date_from = State()
     waiting_for_date_to = State()
     waiting_for_dish_search = State()
 
 @router.message(Command("orders"))
-async def cmd_orders(message: Message):
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            message.from_user.id,
-            message.from_user.username,
-            message.from_user.full_name
-        )
-        
+async def cmd_orders(message: Message, session: AsyncSession, user: User, user_is_admin: bool):
+    # Только что созданный или отмененный заказ должен быть виден сразу
+    with read_from_primary():
         orders = await get_user_orders(session, user.id, OrderStatus.PENDING)
+    
+    if not orders:
+        from utils.keyboards import get_main_menu_keyboard
         
-        if not orders:
-            from utils.keyboards import get_main_menu_keyboard
-            from services.user_service import is_admin
-            user_is_admin = await is_admin(session, user.telegram_id)
-            
-            await message.answer(
-                "📭 <b>Активных заказов нет</b>\n\n"
-                "💡 Используйте кнопку '📋 Создать заказ' для оформления нового заказа.",
-                reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
-                parse_mode="HTML"
-            )
-            return
-        
-        for order in orders:
-            order_text = format_order(order)
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="❌ Отменить заказ", callback_data=f"cancel_order_{order.id}")],
-                [InlineKeyboardButton(text="📋 Детали", callback_data=f"order_details_{order.id}")]
-            ])
-            await message.answer(
-                order_text,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
+        await message.answer(
+            "📭 <b>Активных заказов нет</b>\n\n"
+            "💡 Используйте кнопку '📋 Создать заказ' для оформления нового заказа.",
+            reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
+            parse_mode="HTML"
+        )
+        return
+    
+    for order in orders:
+        order_text = format_order(order)
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Отменить заказ", callback_data=f"cancel_order_{order.id}")],
+            [InlineKeyboardButton(text="📋 Детали", callback_data=f"order_details_{order.id}")]
+        ])
+        await message.answer(
+            order_text,
+            reply_markup=keyboard,
+            parse_mode="HTML"
+        )
 
 @router.callback_query(lambda c: c.data == "my_orders")
-async def callback_my_orders(callback: CallbackQuery):
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            callback.from_user.id,
-            callback.from_user.username,
-            callback.from_user.full_name
-        )
-        
+async def callback_my_orders(callback: CallbackQuery, session: AsyncSession, user: User, user_is_admin: bool):
+    # Только что созданный или отмененный заказ должен быть виден сразу
+    with read_from_primary():
         orders = await get_user_orders(session, user.id, OrderStatus.PENDING)
+    
+    if not orders:
+        from utils.keyboards import get_main_menu_keyboard
         
-        if not orders:
-            from utils.keyboards import get_main_menu_keyboard
-            from services.user_service import is_admin
-            user_is_admin = await is_admin(session, user.telegram_id)
-            
-            await callback.message.edit_text(
-                "📭 <b>Активных заказов нет</b>\n\n"
-                "💡 Используйте кнопку '📋 Создать заказ' для оформления нового заказа.",
-                reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
-                parse_mode="HTML"
-            )
-            await callback.answer()
-            return
-        
-        if len(orders) == 1:
-            order = orders[0]
-            order_text = format_order(order)
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="❌ Отменить заказ", callback_data=f"cancel_order_{order.id}")],
-                [InlineKeyboardButton(text="✏️ Редактировать заказ", callback_data=f"edit_order_{order.id}")],
-                [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
-            ])
-            await callback.message.edit_text(
-                order_text,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-        else:
-            keyboard_buttons = []
-            for order in orders:
-                keyboard_buttons.append([InlineKeyboardButton(
-                    text=f"Заказ #{order.id} - {format_date(order.order_date)}",
-                    callback_data=f"order_details_{order.id}"
-                )])
-            keyboard_buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")])
-            
-            await callback.message.edit_text(
-                f"Ваши активные заказы ({len(orders)}):",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-            )
+        await callback.message.edit_text(
+            "📭 <b>Активных заказов нет</b>\n\n"
+            "💡 Используйте кнопку '📋 Создать заказ' для оформления нового заказа.",
+            reply_markup=get_main_menu_keyboard(is_admin=user_is_admin),
+            parse_mode="HTML"
+        )
         await callback.answer()
-
-@router.callback_query(lambda c: c.data.startswith("order_details_"))
-async def callback_order_details(callback: CallbackQuery):
-    order_id = int(callback.data.replace("order_details_", ""))
+        return
     
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            callback.from_user.id,
-            callback.from_user.username,
-            callback.from_user.full_name
-        )
-        
-        order = await get_order_by_id(session, order_id, user.id)
-        
-        if not order:
-            await callback.answer("Заказ не найден", show_alert=True)
-            return
-        
+    if len(orders) == 1:
+        order = orders[0]
         order_text = format_order(order)
-        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="❌ Отменить заказ", callback_data=f"cancel_order_{order.id}")],
+            [InlineKeyboardButton(text="✏️ Редактировать заказ", callback_data=f"edit_order_{order.id}")],
+            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
+        ])
+        await callback.message.edit_text(
+            order_text,
+            reply_markup=keyboard,
+            parse_mode="HTML"
+        )
+    else:
         keyboard_buttons = []
-        if order.status == OrderStatus.PENDING:
-            keyboard_buttons.append([InlineKeyboardButton(text="✏️ Редактировать заказ", callback_data=f"edit_order_{order.id}")])
-        keyboard_buttons.append([InlineKeyboardButton(text="❌ Отменить заказ", callback_data=f"cancel_order_{order.id}")])
-        keyboard_buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="my_orders")])
+        for order in orders:
+            keyboard_buttons.append([InlineKeyboardButton(
+                text=f"Заказ #{order.id} - {format_date(order.order_date)}",
+                callback_data=f"order_details_{order.id}"
+            )])
         keyboard_buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")])
         
         await callback.message.edit_text(
-            order_text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons),
-            parse_mode="HTML"
+            f"Ваши активные заказы ({len(orders)}):",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
         )
-        await callback.answer()
+    await callback.answer()
+
+@router.callback_query(lambda c: c.data.startswith("order_details_"))
+async def callback_order_details(callback: CallbackQuery, session: AsyncSession, user: User):
+    order_id = int(callback.data.replace("order_details_", ""))
+    
+    order = await get_order_by_id(session, order_id, user.id)
+    
+    if not order:
+        await callback.answer("Заказ не найден", show_alert=True)
+        return
+    
+    order_text = format_order(order)
+    
+    keyboard_buttons = []
+    if order.status == OrderStatus.PENDING:
+        keyboard_buttons.append([InlineKeyboardButton(text="✏️ Редактировать заказ", callback_data=f"edit_order_{order.id}")])
+    keyboard_buttons.append([InlineKeyboardButton(text="❌ Отменить заказ", callback_data=f"cancel_order_{order.id}")])
+    keyboard_buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="my_orders")])
+    keyboard_buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")])
+    
+    await callback.message.edit_text(
+        order_text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons),
+        parse_mode="HTML"
+    )
+    await callback.answer()
 
 @router.callback_query(lambda c: c.data.startswith("cancel_order_"))
-async def callback_cancel_order(callback: CallbackQuery):
+async def callback_cancel_order(callback: CallbackQuery, session: AsyncSession, user: User):
     order_id = int(callback.data.replace("cancel_order_", ""))
     
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            callback.from_user.id,
-            callback.from_user.username,
-            callback.from_user.full_name
+    order = await get_order_by_id(session, order_id, user.id)
+    if not order:
+        await callback.answer("Заказ не найден", show_alert=True)
+        return
+    
+    from utils.validators import validate_order_can_be_cancelled
+    can_cancel, error_msg = validate_order_can_be_cancelled(order.order_date)
+    if not can_cancel:
+        await callback.answer(error_msg, show_alert=True)
+        return
+    
+    success = await run_write(lambda write_session: cancel_order(write_session, order_id, user.id), session)
+    
+    if success:
+        await callback.message.edit_text(
+            f"✅ Заказ #{order_id} успешно отменен",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="◀️ Назад", callback_data="my_orders")],
+                [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
+            ])
         )
-        
-        order = await get_order_by_id(session, order_id, user.id)
-        if not order:
-            await callback.answer("Заказ не найден", show_alert=True)
-            return
-        
-        from utils.validators import validate_order_can_be_cancelled
-        can_cancel, error_msg = validate_order_can_be_cancelled(order.order_date)
-        if not can_cancel:
-            await callback.answer(error_msg, show_alert=True)
-            return
-        
-        success = await cancel_order(session, order_id, user.id)
-        
-        if success:
-            await callback.message.edit_text(
-                f"✅ Заказ #{order_id} успешно отменен",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="◀️ Назад", callback_data="my_orders")],
-                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
-                ])
-            )
-            await callback.answer("Заказ отменен")
-        else:
-            await callback.answer("Не удалось отменить заказ", show_alert=True)
+        await callback.answer("Заказ отменен")
+    else:
+        await callback.answer("Не удалось отменить заказ", show_alert=True)
 
 @router.callback_query(lambda c: c.data == "order_history" or c.data.startswith("history_page_") or c.data == "history_clear_filters")
-async def callback_order_history(callback: CallbackQuery, state: FSMContext):
-    page = 0
-    if callback.data.startswith("history_page_"):
-        page = int(callback.data.replace("history_page_", ""))
+async def callback_order_history(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: User):
+    page, after, before = 0, None, None
+    page_data = CallbackData.parse_orders_page("history_page_", callback.data)
+    if page_data:
+        page, direction, cursor = page_data
+        after, before = (cursor, None) if direction == "a" else (None, cursor)
     
     if callback.data == "history_clear_filters":
         await state.update_data(history_date_from=None, history_date_to=None, history_dish_search=None)
     
-    ITEMS_PER_PAGE = 5
     filter_data = await state.get_data()
     date_from = filter_data.get("history_date_from")
     date_to = filter_data.get("history_date_to")
     dish_search = filter_data.get("history_dish_search")
     
-    async for session in get_session():
-        user = await get_or_create_user(
-            session,
-            callback.from_user.id,
-            callback.from_user.username,
-            callback.from_user.full_name
-        )
-        
-        # Применяем фильтры
-        if dish_search:
-            all_orders = await search_user_orders_by_dish(session, user.id, dish_search)
-        else:
-            all_orders = await get_user_orders(
-                session, 
-                user.id, 
-                date_from=date_from, 
-                date_to=date_to
-            )
-        
-        completed_orders = [o for o in all_orders if o.status != OrderStatus.PENDING]
-        
-        if not completed_orders:
-            filter_text = ""
-            if date_from or date_to or dish_search:
-                filter_text = "\n\n🔍 Активные фильтры:\n"
-                if date_from:
-                    filter_text += f"С: {format_date(date_from)}\n"
-                if date_to:
-                    filter_text += f"По: {format_date(date_to)}\n"
-                if dish_search:
-                    filter_text += f"Блюдо: {dish_search}\n"
-            
-            await callback.message.edit_text(
-                f"История заказов пуста{filter_text}",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🔍 Фильтры", callback_data="history_filters")],
-                    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
-                ])
-            )
-            await callback.answer()
-            return
-        
-        total_pages = (len(completed_orders) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
-        if page >= total_pages:
-            page = total_pages - 1
-        if page < 0:
-            page = 0
-        
-        start_idx = page * ITEMS_PER_PAGE
-        end_idx = start_idx + ITEMS_PER_PAGE
-        page_orders = completed_orders[start_idx:end_idx]
-        
-        orders_text = "\n\n".join([
-            f"Заказ #{order.id} - {format_date(order.order_date)}\n"
-            f"Статус: {order.status.value}\n"
-            f"Сумма: {order.total_amount:.0f} ₽"
-            for order in page_orders
-        ])
-        
+    # Фильтры и исключение ожидающих заказов применяются в запросе
+    order_page = await get_user_orders_page(
+        session,
+        user.id,
+        limit=HISTORY_ORDERS_PER_PAGE,
+        after=after,
+        before=before,
+        exclude_status=OrderStatus.PENDING,
+        date_from=date_from,
+        date_to=date_to,
+        dish_name=dish_search
+    )
+    page_orders = order_page.orders
+    
+    if not page_orders:
         filter_text = ""
         if date_from or date_to or dish_search:
-            filter_text = "\n\n🔍 Фильтры: "
-            filters = []
+            filter_text = "\n\n🔍 Активные фильтры:\n"
             if date_from:
-                filters.append(f"с {format_date(date_from)}")
+                filter_text += f"С: {format_date(date_from)}\n"
             if date_to:
-                filters.append(f"по {format_date(date_to)}")
+                filter_text += f"По: {format_date(date_to)}\n"
             if dish_search:
-                filters.append(f'"{dish_search}"')
-            filter_text += ", ".join(filters)
-        
-        keyboard_buttons = []
-        
-        # Кнопки навигации
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="◀️ Предыдущая", callback_data=f"history_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Следующая ▶️", callback_data=f"history_page_{page + 1}"))
-        
-        if nav_buttons:
-            keyboard_buttons.append(nav_buttons)
-        
-        keyboard_buttons.append([InlineKeyboardButton(text="🔍 Фильтры", callback_data="history_filters")])
-        keyboard_buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")])
+                filter_text += f"Блюдо: {dish_search}\n"
         
         await callback.message.edit_text(
-            f"📊 История заказов (страница {page + 1} из {total_pages}){filter_text}:\n\n{orders_text}",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+            f"История заказов пуста{filter_text}",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔍 Фильтры", callback_data="history_filters")],
+                [InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")]
+            ])
         )
         await callback.answer()
+        return
+    
+    total_pages = max(1, (order_page.total + HISTORY_ORDERS_PER_PAGE - 1) // HISTORY_ORDERS_PER_PAGE)
+    page = min(max(page, 0), total_pages - 1)
+    
+    orders_text = "\n\n".join([
+        f"Заказ #{order.id} - {format_date(order.order_date)}\n"
+        f"Статус: {order.status.value}\n"
+        f"Сумма: {order.total_amount:.0f} ₽"
+        for order in page_orders
+    ])
+    
+    filter_text = ""
+    if date_from or date_to or dish_search:
+        filter_text = "\n\n🔍 Фильтры: "
+        filters = []
+        if date_from:
+            filters.append(f"с {format_date(date_from)}")
+        if date_to:
+            filters.append(f"по {format_date(date_to)}")
+        if dish_search:
+            filters.append(f'"{dish_search}"')
+        filter_text += ", ".join(filters)
+    
+    keyboard_buttons = []
+    
+    # Кнопки навигации
+    nav_buttons = []
+    if order_page.prev_cursor:
+        nav_buttons.append(InlineKeyboardButton(
+            text="◀️ Предыдущая",
+            callback_data=CallbackData.create_orders_page("history_page_", page - 1, "b", order_page.prev_cursor)
+        ))
+    if order_page.next_cursor:
+        nav_buttons.append(InlineKeyboardButton(
+            text="Следующая ▶️",
+            callback_data=CallbackData.create_orders_page("history_page_", page + 1, "a", order_page.next_cursor)
+        ))
+    
+    if nav_buttons:
+        keyboard_buttons.append(nav_buttons)
+    
+    keyboard_buttons.append([InlineKeyboardButton(text="🔍 Фильтры", callback_data="history_filters")])
+    keyboard_buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="start")])
+    
+    await callback.message.edit_text(
+        f"📊 История заказов (страница {page + 1} из {total_pages}){filter_text}:\n\n{orders_text}",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    )
+    await callback.answer()
 
 @router.callback_query(lambda c: c.data == "history_filters")
 async def callback_history_filters(callback: CallbackQuery, state: FSMContext):
@@ -347,7 +313,7 @@ async def process_history_date_from(message: Message, state: FSMContext):
         for fmt in ["%d.%m.%Y", "%d-%m-%Y", "%Y-%m-%d"]:
             try:
                 date = datetime.strptime(message.text.strip(), fmt)
-                date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+                date = start_of_day(date)
                 await state.update_data(history_date_from=date)
                 await message.answer(f"✅ Дата начала установлена: {format_date(date)}")
                 await state.clear()
@@ -388,7 +354,7 @@ async def process_history_date_to(message: Message, state: FSMContext):
         for fmt in ["%d.%m.%Y", "%d-%m-%Y", "%Y-%m-%d"]:
             try:
                 date = datetime.strptime(message.text.strip(), fmt)
-                date = date.replace(hour=23, minute=59, second=59, microsecond=999999)
+                date = start_of_day(date)
                 await state.update_data(history_date_to=date)
                 await message.answer(f"✅ Дата окончания установлена: {format_date(date)}")
                 await state.clear()
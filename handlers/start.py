@@ -1,15 +1,14 @@
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
-from database.database import get_session
-from services.user_service import get_or_create_user
+from models.user import User
 from config.settings import settings
 from loguru import logger
 
 router = Router()
 
 @router.message(Command("start"))
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, user: User, user_is_admin: bool):
     user_id = message.from_user.id
     username = message.from_user.username or "без username"
     first_name = message.from_user.first_name or "пользователь"
@@ -17,30 +16,9 @@ async def cmd_start(message: Message):
     logger.info(f"🔵 ПОЛУЧЕНА КОМАНДА /start от пользователя {user_id} (@{username})")
     
     try:
-        user_is_admin = user_id in settings.ADMIN_IDS
-        logger.info(f"🔵 Проверка прав администратора: {user_is_admin}")
-        
-        try:
-            async for session in get_session():
-                try:
-                    user = await get_or_create_user(
-                        session,
-                        user_id,
-                        message.from_user.username,
-                        message.from_user.full_name
-                    )
-                    logger.info(f"🔵 Пользователь {user_id} найден/создан: {user.full_name if user else 'None'}")
-                    
-                    from services.user_service import is_admin
-                    db_admin_check = await is_admin(session, user.telegram_id)
-                    user_is_admin = user_is_admin or db_admin_check
-                    logger.info(f"🔵 Пользователь {user_id} является администратором: {user_is_admin}")
-                    break
-                except Exception as e:
-                    logger.error(f"🔴 Ошибка при работе с базой данных: {e}", exc_info=True)
-                    break
-        except Exception as e:
-            logger.warning(f"🟡 Не удалось подключиться к базе данных: {e}")
+        user_is_admin = user_is_admin or user_id in settings.ADMIN_IDS
+        logger.info(f"🔵 Пользователь {user_id} найден/создан: {user.full_name if user else 'None'}")
+        logger.info(f"🔵 Пользователь {user_id} является администратором: {user_is_admin}")
         
         from utils.keyboards import get_main_menu_keyboard
         
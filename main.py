@@ -1,17 +1,26 @@
 import asyncio
 import sys
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.memory import SimpleEventIsolation
 from loguru import logger
 from config.settings import settings
 from handlers import start, menu, orders, admin, callbacks, edit_order, help, statistics
 from database.database import init_db
+from database.sqlite_profile import write_queue
 from middleware.logging_middleware import LoggingMiddleware
 from middleware.error_middleware import ErrorMiddleware
 from middleware.unknown_message_middleware import UnknownMessageMiddleware
 from middleware.rate_limit_middleware import RateLimitMiddleware
+from middleware.database_middleware import DatabaseMiddleware
+from middleware.fsm_flush_middleware import FSMFlushMiddleware
+from middleware.metrics_middleware import UpdateMetricsMiddleware, HandlerMetricsMiddleware
+from middleware.query_budget_middleware import QueryBudgetMiddleware
+from utils.metrics import BotApiMetricsMiddleware, start_metrics_server
+from database.fsm_storage import SQLStorage
 from services.scheduler_service import setup_scheduler
+from services.outbox_service import outbox_dispatcher
 from pathlib import Path
+from datetime import timedelta
 
 logger.remove()
 logger.add(
@@ -76,17 +85,33 @@ async def main():
         return
     
     bot_instance = Bot(token=settings.BOT_TOKEN)
+    bot_instance.session.middleware(BotApiMetricsMiddleware())
     from config.bot_instance import set_bot
     set_bot(bot_instance)
-    dp = Dispatcher(storage=MemoryStorage())
+    storage = SQLStorage(ttl=timedelta(hours=settings.FSM_STATE_TTL_HOURS))
+    # Апдейты одного пользователя обрабатываются по очереди: буфер FSM
+    # не смешивает изменения двух одновременных апдейтов
+    dp = Dispatcher(storage=storage, events_isolation=SimpleEventIsolation(), disable_fsm=True)
     
+    # FSMFlushMiddleware открывает сессию апдейта раньше, чем FSMContextMiddleware
+    # читает состояние, поэтому FSM и обработчики используют одно соединение
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(QueryBudgetMiddleware())
+    dp.update.outer_middleware(FSMFlushMiddleware(storage))
+    dp.update.outer_middleware(dp.fsm)
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
     dp.message.middleware(LoggingMiddleware())
     dp.callback_query.middleware(LoggingMiddleware())
-    dp.message.middleware(RateLimitMiddleware(max_requests=20, time_window=60))
-    dp.callback_query.middleware(RateLimitMiddleware(max_requests=30, time_window=60))
+    rate_limit = RateLimitMiddleware()
+    dp.message.middleware(rate_limit)
+    dp.callback_query.middleware(rate_limit)
     dp.message.middleware(UnknownMessageMiddleware())
     dp.message.middleware(ErrorMiddleware())
     dp.callback_query.middleware(ErrorMiddleware())
+    dp.message.middleware(DatabaseMiddleware())
+    dp.callback_query.middleware(DatabaseMiddleware())
     
     logger.info("Регистрация роутеров...")
     dp.include_router(start.router)
@@ -107,14 +132,26 @@ async def main():
     setup_scheduler(bot_instance)
     logger.info("✅ Планировщик настроен")
     
+    outbox_dispatcher.start(bot_instance)
+    dp.shutdown.register(outbox_dispatcher.stop)
+    dp.shutdown.register(write_queue.stop)
+    
     await set_bot_photo(bot_instance)
     logger.info("✅ Фото бота проверено")
     
     logger.info("🚀 Бот запущен и готов к работе!")
     logger.info(f"🔑 BOT_TOKEN: {settings.BOT_TOKEN[:20]}...")
     logger.info(f"👤 ADMIN_IDS: {settings.ADMIN_IDS}")
+    logger.info(f"📡 Режим получения апдейтов: {settings.BOT_MODE}")
     
-    await dp.start_polling(bot_instance)
+    if settings.BOT_MODE == "webhook":
+        from utils.webhook_server import run_webhook
+        await run_webhook(dp, bot_instance)
+    else:
+        if settings.METRICS_PORT:
+            metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+            dp.shutdown.register(metrics_runner.cleanup)
+        await dp.start_polling(bot_instance)
 
 if __name__ == '__main__':
     asyncio.run(main())
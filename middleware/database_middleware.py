@@ -0,0 +1,105 @@
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event as sa_event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import Callable, Dict, Any, Awaitable, Optional
+from models.user import UserRole
+from services.user_service import get_or_create_user
+from database.database import get_update_session
+from middleware.rate_limit_middleware import rate_limit_store
+
+class DatabaseMiddleware(BaseMiddleware):
+    """
+    Одна сессия БД на апдейт (unit of work)
+
+    Открывает AsyncSession, один раз разрешает пользователя и его роль
+    и передает в обработчик session, user и user_is_admin. После обработчика
+    коммитит, только если в сессии остались несохраненные изменения;
+    при исключении откатывает транзакцию.
+
+    Args:
+        session_factory: Фабрика сессий (по умолчанию database.async_session
+            на момент вызова - init_db выполняется после регистрации middleware)
+    """
+
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None):
+        self.session_factory = session_factory
+
+    def _get_session_factory(self) -> async_sessionmaker:
+        if self.session_factory is not None:
+            return self.session_factory
+
+        from database import database
+        if database.async_session is None:
+            raise RuntimeError("База данных не инициализирована. Вызовите init_db() перед использованием.")
+        return database.async_session
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        # Внутри update_scope (FSMFlushMiddleware) сессию апдейта уже могло
+        # открыть чтение FSM - используем ее, закрывает ее update_scope
+        session = get_update_session()
+        if session is not None:
+            return await self._handle(handler, event, data, session)
+        async with self._get_session_factory()() as session:
+            return await self._handle(handler, event, data, session)
+
+    async def _handle(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+        session: AsyncSession
+    ) -> Any:
+        _track_flushes(session)
+        data["session"] = session
+
+        from_user = data.get("event_from_user") or getattr(event, "from_user", None)
+        if from_user:
+            user = await get_or_create_user(
+                session,
+                from_user.id,
+                from_user.username,
+                from_user.full_name
+            )
+            data["user"] = user
+            data["user_is_admin"] = user.role == UserRole.MANAGER
+            rate_limit_store.set_manager(from_user.id, data["user_is_admin"])
+
+        try:
+            result = await handler(event, data)
+        except Exception:
+            await session.rollback()
+            raise
+
+        if _is_dirty(session):
+            await session.commit()
+        return result
+
+_FLUSHED = "uow_flushed"
+
+def _track_flushes(session: AsyncSession) -> None:
+    """Отмечает в session.info записи (flush и DML-запросы), еще не закоммиченные"""
+    sync_session = session.sync_session
+
+    def after_flush(sync_session, flush_context):
+        sync_session.info[_FLUSHED] = True
+
+    def do_orm_execute(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            orm_execute_state.session.info[_FLUSHED] = True
+
+    def after_transaction_end(sync_session, transaction):
+        if transaction.parent is None:
+            sync_session.info.pop(_FLUSHED, None)
+
+    sa_event.listen(sync_session, "after_flush", after_flush)
+    sa_event.listen(sync_session, "do_orm_execute", do_orm_execute)
+    sa_event.listen(sync_session, "after_transaction_end", after_transaction_end)
+
+def _is_dirty(session: AsyncSession) -> bool:
+    return bool(session.new or session.dirty or session.deleted or session.info.get(_FLUSHED))
@@ -0,0 +1,42 @@
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from loguru import logger
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from typing import Callable, Dict, Any, Awaitable, Optional
+from database.database import update_scope
+from database.fsm_storage import SQLStorage
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """
+    Открывает одну сессию БД на апдейт и записывает изменения FSM одним upsert
+
+    Регистрируется как outer middleware на dp.update перед FSMContextMiddleware:
+    чтение состояния, DatabaseMiddleware и запись состояния после обработчика
+    используют одну сессию (update_scope), то есть одно соединение.
+
+    Args:
+        storage: Хранилище FSM
+        session_factory: Фабрика сессий (по умолчанию фабрика хранилища
+            или database.async_session на момент вызова)
+    """
+
+    def __init__(self, storage: SQLStorage, session_factory: Optional[async_sessionmaker] = None):
+        self.storage = storage
+        self.session_factory = session_factory or storage.session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        async with update_scope(self.session_factory):
+            try:
+                return await handler(event, data)
+            finally:
+                state = data.get("state")
+                if state is not None:
+                    try:
+                        await self.storage.flush([state.key])
+                    except Exception as e:
+                        logger.error(f"Ошибка при записи состояния FSM: {e}", exc_info=True)
@@ -0,0 +1,62 @@
+import time
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, Message, CallbackQuery
+from typing import Callable, Dict, Any, Awaitable
+from utils.metrics import UPDATES, UPDATE_DURATION, HANDLER_DURATION, HANDLER_ERRORS, label_prefix
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Число апдейтов и полное время их обработки (dp.update.outer_middleware)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type if isinstance(event, Update) else type(event).__name__
+        UPDATES.inc(type=update_type)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started, type=update_type)
+
+def event_prefix(event: TelegramObject) -> str:
+    """Префикс callback_data без ID, команда или тип содержимого сообщения"""
+    if isinstance(event, CallbackQuery):
+        return label_prefix(event.data)
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            return event.text.split(maxsplit=1)[0].split("@")[0][:40]
+        return event.content_type
+    return "none"
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время обработчика по роутеру и префиксу callback_data (или команде)
+
+    Роутеры создаются без имени, поэтому роутер определяется
+    модулем функции-обработчика (handlers.menu, handlers.admin, ...).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        labels = {
+            "router": getattr(callback, "__module__", None) or "unknown",
+            "event": "callback_query" if isinstance(event, CallbackQuery) else "message",
+            "prefix": event_prefix(event)
+        }
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(**labels)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, **labels)
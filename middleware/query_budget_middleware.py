@@ -0,0 +1,29 @@
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from typing import Callable, Dict, Any, Awaitable
+from database.query_monitor import statement_scope, report_statement_budget
+from middleware.metrics_middleware import event_prefix
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Считает SQL-запросы каждого апдейта (dp.update.outer_middleware)
+
+    Апдейт, превысивший QUERY_BUDGET_PER_UPDATE запросов или повторивший
+    один запрос N_PLUS_ONE_THRESHOLD раз, логируется с самыми частыми запросами.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        name = "update"
+        if isinstance(event, Update):
+            name = f"update {event.update_id} {event.event_type}:{event_prefix(event.event)}"
+
+        with statement_scope(name) as counter:
+            try:
+                return await handler(event, data)
+            finally:
+                report_statement_budget(counter)
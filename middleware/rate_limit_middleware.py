@@ -1,54 +1,209 @@
+"""
+Ограничение частоты запросов пользователей (token bucket)
+
+На каждого пользователя - одно ведро токенов, общее для сообщений и
+callback-запросов; тип события задает стоимость. Проверка O(1) по
+time.monotonic(). Ведро, которое успело бы наполниться полностью, ничем
+не отличается от отсутствующего, поэтому периодическая очистка удаляет
+такие ведра без потери состояния.
+"""
+import time
+from dataclasses import dataclass
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
-from typing import Callable, Dict, Any, Awaitable
-from collections import defaultdict
-from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Awaitable, Optional, Set
 from loguru import logger
+from config.settings import settings
+
+@dataclass
+class BucketLimit:
+    """Емкость ведра и скорость пополнения (токенов в секунду)"""
+    capacity: float
+    refill_rate: float
+
+    @property
+    def refill_time(self) -> float:
+        """Время полного наполнения пустого ведра"""
+        return self.capacity / self.refill_rate
+
+class _Bucket:
+    __slots__ = ("tokens", "updated_at", "notified")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+        self.notified = False
+
+class RateLimitStore:
+    """
+    Хранилище ведер токенов с лимитами по ролям
+
+    Args:
+        user_limit: Лимит обычного пользователя
+        manager_limit: Лимит менеджера (None - менеджеры не ограничиваются)
+        managers: Telegram ID менеджеров, известные заранее
+        sweep_interval: Как часто (в секундах) удалять наполнившиеся ведра
+        clock: Источник монотонного времени (для тестов)
+    """
+
+    def __init__(self, user_limit: BucketLimit, manager_limit: Optional[BucketLimit] = None,
+                 managers: Optional[Set[int]] = None, sweep_interval: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self.user_limit = user_limit
+        self.manager_limit = manager_limit
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._managers: Set[int] = set(managers or ())
+        self._buckets: Dict[int, _Bucket] = {}
+        self._last_sweep = clock()
+        self._stats = dict.fromkeys(("allowed", "throttled", "swept"), 0)
+        self._throttled_by_type: Dict[str, int] = {}
+
+    def set_manager(self, user_id: int, is_manager: bool) -> None:
+        """Запоминает роль пользователя (вызывается после разрешения пользователя из БД)"""
+        if is_manager:
+            self._managers.add(user_id)
+        else:
+            self._managers.discard(user_id)
+
+    def _limit_for(self, user_id: int) -> Optional[BucketLimit]:
+        if user_id in self._managers:
+            return self.manager_limit
+        return self.user_limit
+
+    def consume(self, user_id: int, cost: float = 1.0, event_type: str = "event") -> Optional[_Bucket]:
+        """
+        Списывает cost токенов из ведра пользователя
+
+        Returns:
+            None, если запрос разрешен; ведро пользователя, если запрос отклонен
+        """
+        now = self._clock()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        limit = self._limit_for(user_id)
+        if limit is None:
+            self._stats["allowed"] += 1
+            return None
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = _Bucket(limit.capacity, now)
+        else:
+            bucket.tokens = min(limit.capacity, bucket.tokens + (now - bucket.updated_at) * limit.refill_rate)
+            bucket.updated_at = now
+
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            bucket.notified = False
+            self._stats["allowed"] += 1
+            return None
+
+        self._stats["throttled"] += 1
+        self._throttled_by_type[event_type] = self._throttled_by_type.get(event_type, 0) + 1
+        return bucket
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Удаляет ведра, которые уже наполнились бы полностью
+
+        Returns:
+            int: Количество удаленных ведер
+        """
+        now = self._clock() if now is None else now
+        self._last_sweep = now
+        idle = [
+            user_id for user_id, bucket in self._buckets.items()
+            if self._limit_for(user_id) is None
+            or now - bucket.updated_at >= self._limit_for(user_id).refill_time
+        ]
+        for user_id in idle:
+            del self._buckets[user_id]
+        self._stats["swept"] += len(idle)
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики ограничителя
+
+        Returns:
+            Dict с числом ведер, разрешенных и отклоненных событий
+        """
+        return {
+            "buckets": len(self._buckets),
+            "managers": len(self._managers),
+            **self._stats,
+            "throttled_by_type": dict(self._throttled_by_type)
+        }
+
+def _manager_limit() -> Optional[BucketLimit]:
+    if settings.RATE_LIMIT_MANAGER_MULTIPLIER <= 0:
+        return None
+    return BucketLimit(
+        settings.RATE_LIMIT_CAPACITY * settings.RATE_LIMIT_MANAGER_MULTIPLIER,
+        settings.RATE_LIMIT_REFILL_PER_SECOND * settings.RATE_LIMIT_MANAGER_MULTIPLIER
+    )
+
+rate_limit_store = RateLimitStore(
+    user_limit=BucketLimit(settings.RATE_LIMIT_CAPACITY, settings.RATE_LIMIT_REFILL_PER_SECOND),
+    manager_limit=_manager_limit(),
+    managers=set(settings.ADMIN_IDS)
+)
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """Счетчики общего ограничителя"""
+    return rate_limit_store.stats()
 
 class RateLimitMiddleware(BaseMiddleware):
-    def __init__(self, max_requests: int = 10, time_window: int = 60):
-        self.max_requests = max_requests
-        self.time_window = time_window
-        self.user_requests: Dict[int, list[datetime]] = defaultdict(list)
-    
+    """
+    Отклоняет события пользователя, если в его ведре не хватает токенов
+
+    Один экземпляр регистрируется и на сообщения, и на callback-запросы:
+    ведро общее, стоимость зависит от типа события. Предупреждение
+    отправляется один раз за серию отклоненных событий.
+
+    Args:
+        store: Хранилище ведер (по умолчанию общий rate_limit_store)
+        message_cost: Стоимость сообщения
+        callback_cost: Стоимость callback-запроса
+    """
+
+    def __init__(self, store: Optional[RateLimitStore] = None, message_cost: float = 1.5,
+                 callback_cost: float = 1.0):
+        self.store = store or rate_limit_store
+        self.costs = {Message: message_cost, CallbackQuery: callback_cost}
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        user_id = None
-        if isinstance(event, (Message, CallbackQuery)) and event.from_user:
-            user_id = event.from_user.id
-        
-        if user_id:
-            now = datetime.now()
-            user_requests = self.user_requests[user_id]
-            
-            user_requests[:] = [req_time for req_time in user_requests 
-                               if now - req_time < timedelta(seconds=self.time_window)]
-            
-            if len(user_requests) >= self.max_requests:
-                logger.warning(f"Rate limit exceeded for user {user_id}")
-                if isinstance(event, Message):
-                    await event.answer(
-                        "⚠️ <b>Слишком много запросов</b>\n\n"
-                        "Пожалуйста, подождите немного перед следующим запросом.",
-                        parse_mode="HTML"
-                    )
-                elif isinstance(event, CallbackQuery):
-                    await event.answer(
-                        "Слишком много запросов. Пожалуйста, подождите.",
-                        show_alert=True
-                    )
-                return
-            
-            user_requests.append(now)
-        
-        return await handler(event, data)
-
-
-
+        cost = self.costs.get(type(event))
+        if cost is None or not event.from_user:
+            return await handler(event, data)
 
+        user_id = event.from_user.id
+        bucket = self.store.consume(user_id, cost, type(event).__name__)
+        if bucket is None:
+            return await handler(event, data)
 
+        if bucket.notified:
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return
+        bucket.notified = True
 
+        logger.warning(f"Rate limit exceeded for user {user_id}")
+        if isinstance(event, Message):
+            await event.answer(
+                "⚠️ <b>Слишком много запросов</b>\n\n"
+                "Пожалуйста, подождите немного перед следующим запросом.",
+                parse_mode="HTML"
+            )
+        elif isinstance(event, CallbackQuery):
+            await event.answer(
+                "Слишком много запросов. Пожалуйста, подождите.",
+                show_alert=True
+            )
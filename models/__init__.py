@@ -6,6 +6,10 @@ from .office import Office
 from .cafe import Cafe
 from .cafe_menu import CafeMenu
 from .order_deadline import OrderDeadline
+from .daily_stats import DailyDishStats, DailyUserStats, DailyCafeStats
+from .fsm_state import FSMState
+from .notification_outbox import NotificationOutbox, OutboxStatus
+from .cached_file import CachedFile
 
 __all__ = [
     "User", "UserRole",
@@ -15,6 +19,10 @@ __all__ = [
     "Office",
     "Cafe",
     "CafeMenu",
-    "OrderDeadline"
+    "OrderDeadline",
+    "DailyDishStats", "DailyUserStats", "DailyCafeStats",
+    "FSMState",
+    "NotificationOutbox", "OutboxStatus",
+    "CachedFile"
 ]
 
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, DateTime, Index
+from datetime import datetime, timezone
+from database.base import Base
+
+class CachedFile(Base):
+    """
+    Telegram file_id документа, уже загруженного ботом
+
+    Ключ - хэш содержимого отчета; report_key объединяет версии одного
+    отчета (например, ежедневный отчет за дату), чтобы новая версия
+    вытесняла прежнюю.
+    """
+    __tablename__ = "cached_files"
+
+    content_hash = Column(String(64), primary_key=True)
+    report_key = Column(String(100), nullable=False)
+    file_id = Column(String(255), nullable=False)
+    filename = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    __table_args__ = (
+        Index('idx_cached_file_report_key', 'report_key'),
+    )
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, ForeignKey, Date, DateTime, Index
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime, timezone
 from database.base import Base
+from utils.dates import day_of, day_key_default
 
 class CafeMenu(Base):
     __tablename__ = "cafe_menu"
@@ -10,9 +11,21 @@ class CafeMenu(Base):
     cafe_id = Column(Integer, ForeignKey("cafes.id"), nullable=False)
     dish_id = Column(Integer, ForeignKey("dishes.id"), nullable=False)
     date = Column(DateTime, nullable=False)
+    day = Column(Date, nullable=False, default=day_key_default("date"))
     available_quantity = Column(Integer, default=0)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
     cafe = relationship("Cafe", back_populates="menu_items")
     dish = relationship("Dish", back_populates="cafe_menu_items")
+    
+    __table_args__ = (
+        # Одна строка меню на кафе, блюдо и день
+        Index('uq_cafe_menu_cafe_dish_day', 'cafe_id', 'dish_id', 'day', unique=True),
+        Index('idx_cafe_menu_cafe_day', 'cafe_id', 'day'),
+    )
+    
+    @validates("date")
+    def _set_day(self, key, value):
+        self.day = day_of(value)
+        return value
 
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey
+from database.base import Base
+
+class DailyDishStats(Base):
+    """Агрегат по дням и блюдам (без отмененных заказов)"""
+    __tablename__ = "daily_dish_stats"
+    
+    day = Column(Date, primary_key=True)
+    dish_id = Column(Integer, ForeignKey("dishes.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+class DailyUserStats(Base):
+    """Агрегат по дням и пользователям (без отмененных заказов)"""
+    __tablename__ = "daily_user_stats"
+    
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0.0)
+    items_count = Column(Integer, nullable=False, default=0)
+
+class DailyCafeStats(Base):
+    """Агрегат по дням и кафе (без отмененных заказов), cafe_id = 0 - заказы без кафе"""
+    __tablename__ = "daily_cafe_stats"
+    
+    day = Column(Date, primary_key=True)
+    cafe_id = Column(Integer, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0.0)
+    items_count = Column(Integer, nullable=False, default=0)
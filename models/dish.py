@@ -2,6 +2,7 @@ from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from database.base import Base
+from database.search_index import install_search_index
 
 class Dish(Base):
     __tablename__ = "dishes"
@@ -18,3 +19,5 @@ class Dish(Base):
     menu_items = relationship("Menu", back_populates="dish")
     cafe_menu_items = relationship("CafeMenu", back_populates="dish")
 
+
+install_search_index(Dish.__table__)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Text, DateTime
+from datetime import datetime, timezone
+from database.base import Base
+
+class FSMState(Base):
+    """Состояние и данные FSM aiogram по ключу StorageKey"""
+    __tablename__ = "fsm_states"
+    
+    key = Column(String(255), primary_key=True)
+    state = Column(String(255), nullable=True)
+    data = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
@@ -1,16 +1,28 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Date, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime, timezone
 from database.base import Base
+from utils.dates import day_of, day_key_default
 
 class Menu(Base):
     __tablename__ = "menu"
     
     id = Column(Integer, primary_key=True)
     date = Column(DateTime, nullable=False)
+    day = Column(Date, nullable=False, default=day_key_default("date"))
     dish_id = Column(Integer, ForeignKey("dishes.id"), nullable=False)
     available_quantity = Column(Integer, default=0)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
     dish = relationship("Dish", back_populates="menu_items")
+    
+    __table_args__ = (
+        # Одна строка общего меню на день и блюдо
+        Index('uq_menu_day_dish', 'day', 'dish_id', unique=True),
+    )
+    
+    @validates("date")
+    def _set_day(self, key, value):
+        self.day = day_of(value)
+        return value
 
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Index
+from datetime import datetime, timezone
+import enum
+from database.base import Base
+
+class OutboxStatus(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    DEAD = "dead"
+
+class NotificationOutbox(Base):
+    """
+    Уведомление, записанное в одной транзакции с изменением данных
+    и отправляемое фоновыми обработчиками outbox_service
+    """
+    __tablename__ = "notification_outbox"
+    
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, nullable=False)
+    event = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=True)
+    status = Column(Enum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Время, после которого запись можно взять в работу (повтор или истечение аренды)
+    available_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index('idx_outbox_status_available', 'status', 'available_at'),
+    )
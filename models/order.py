@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Enum, Index, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Float, Date, DateTime, ForeignKey, Enum, Index, String
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime, timezone
 import enum
 from database.base import Base
+from utils.dates import day_of, day_key_default
 
 class OrderStatus(enum.Enum):
     PENDING = "pending"
@@ -21,6 +22,7 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     cafe_id = Column(Integer, ForeignKey("cafes.id"), nullable=True, index=True)
     order_date = Column(DateTime, nullable=False, index=True)
+    day = Column(Date, nullable=False, default=day_key_default("order_date"))
     delivery_time = Column(DateTime, nullable=True)
     delivery_type = Column(Enum(DeliveryType), nullable=True)
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING, index=True)
@@ -33,9 +35,14 @@ class Order(Base):
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     
     __table_args__ = (
-        Index('idx_order_user_date', 'user_id', 'order_date'),
-        Index('idx_order_date_status', 'order_date', 'status'),
+        Index('idx_order_user_day', 'user_id', 'day'),
+        Index('idx_order_day_status', 'day', 'status'),
     )
+    
+    @validates("order_date")
+    def _set_day(self, key, value):
+        self.day = day_of(value)
+        return value
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -48,4 +55,9 @@ class OrderItem(Base):
     
     order = relationship("Order", back_populates="items")
     dish = relationship("Dish", back_populates="order_items")
+    
+    __table_args__ = (
+        Index('idx_order_item_order', 'order_id'),
+        Index('idx_order_item_dish_order', 'dish_id', 'order_id'),
+    )
 
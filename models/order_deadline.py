@@ -1,13 +1,15 @@
-from sqlalchemy import Column, Integer, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Date, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime, timezone
 from database.base import Base
+from utils.dates import day_of, day_key_default
 
 class OrderDeadline(Base):
     __tablename__ = "order_deadlines"
     
     id = Column(Integer, primary_key=True)
     date = Column(DateTime, nullable=False)
+    day = Column(Date, nullable=False, default=day_key_default("date"))
     deadline_time = Column(DateTime, nullable=False)
     office_id = Column(Integer, ForeignKey("offices.id"), nullable=True)
     cafe_id = Column(Integer, ForeignKey("cafes.id"), nullable=True)
@@ -16,4 +18,13 @@ class OrderDeadline(Base):
     
     office = relationship("Office")
     cafe = relationship("Cafe")
+    
+    __table_args__ = (
+        Index('idx_order_deadline_day_cafe_office', 'day', 'cafe_id', 'office_id'),
+    )
+    
+    @validates("date")
+    def _set_day(self, key, value):
+        self.day = day_of(value)
+        return value
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Enum, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 import enum
@@ -22,4 +22,9 @@ class User(Base):
     
     office = relationship("Office", back_populates="users")
     orders = relationship("Order", back_populates="user")
+    
+    __table_args__ = (
+        Index('idx_user_role', 'role'),
+        Index('idx_user_office', 'office_id'),
+    )
 
@@ -0,0 +1,168 @@
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from aiogram import Bot
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.storage.memory import DisabledEventIsolation
+from aiogram.fsm.strategy import FSMStrategy
+from aiogram.types import User as TelegramUser, Chat, CallbackQuery
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from database.base import Base
+from middleware.database_middleware import DatabaseMiddleware
+from middleware.fsm_flush_middleware import FSMFlushMiddleware
+from database.fsm_storage import SQLStorage
+from models.user import UserRole
+from services.user_service import get_or_create_user, is_admin, update_user
+from services.order_service import get_user_orders, get_all_orders
+
+TELEGRAM_ID = 123456
+
+class Counters:
+    def __init__(self, engine):
+        self.checkouts = 0
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine.sync_engine.pool, "checkout", self._on_checkout)
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_statement)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_checkout(self, *args):
+        self.checkouts += 1
+
+    def _on_statement(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def snapshot(self):
+        return self.checkouts, self.statements, self.commits
+
+# Прежняя схема: отдельная сессия на проверку прав и на каждый блок обработчика,
+# get_or_create_user с безусловным коммитом и повторный запрос роли
+
+async def legacy_my_orders(async_session, from_user):
+    async with async_session() as session:
+        user = await get_or_create_user(session, from_user.id, from_user.username, from_user.full_name)
+        await session.commit()
+        orders = await get_user_orders(session, user.id)
+        if not orders:
+            await is_admin(session, user.telegram_id)
+
+async def legacy_admin_orders(async_session, from_user):
+    async with async_session() as session:
+        if not await is_admin(session, from_user.id):
+            return
+    async with async_session() as session:
+        await get_all_orders(session)
+
+# Схема с DatabaseMiddleware: обработчики получают session, user и user_is_admin
+
+async def my_orders(update: CallbackQuery, data: dict):
+    orders = await get_user_orders(data["session"], data["user"].id)
+    if not orders:
+        return data["user_is_admin"]
+
+async def admin_orders(update: CallbackQuery, data: dict):
+    if not data["user_is_admin"]:
+        return
+    await get_all_orders(data["session"])
+
+async def cart_update(update: CallbackQuery, data: dict):
+    await data["state"].update_data(cart=[{"dish_id": 1, "quantity": 1}])
+
+def stateful(handler, async_session, scoped: bool):
+    """
+    Полная цепочка апдейта с FSM: чтение состояния, DatabaseMiddleware,
+    обработчик и запись состояния. scoped=False - FSM и обработчик
+    с отдельными сессиями (без update_scope)
+    """
+    storage = SQLStorage(async_session)
+    fsm = FSMContextMiddleware(storage, DisabledEventIsolation(), FSMStrategy.USER_IN_CHAT)
+    middleware = DatabaseMiddleware(async_session)
+    flush = FSMFlushMiddleware(storage)
+
+    async def with_fsm(event, data):
+        return await fsm(lambda e, d: middleware(handler, e, d), event, data)
+
+    async def unscoped(event, data):
+        await with_fsm(event, data)
+        await storage.flush([data["state"].key])
+
+    return flush if scoped else None, with_fsm if scoped else unscoped
+
+async def run(iterations: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_dir}/benchmark.db")
+        async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        from_user = TelegramUser(id=TELEGRAM_ID, is_bot=False, first_name="Bench", username="bench")
+        async with async_session() as session:
+            user = await get_or_create_user(session, from_user.id, from_user.username, from_user.full_name)
+            await update_user(session, user.id, role=UserRole.MANAGER)
+
+        counters = Counters(engine)
+        middleware = DatabaseMiddleware(async_session)
+        update = CallbackQuery(id="1", from_user=from_user, chat_instance="1", data="my_orders")
+
+        scenarios = [
+            ("my_orders", lambda: legacy_my_orders(async_session, from_user), my_orders),
+            ("admin_today_orders", lambda: legacy_admin_orders(async_session, from_user), admin_orders),
+        ]
+
+        bot = Bot(token="42:BENCHMARK")
+        chat = Chat(id=TELEGRAM_ID, type="private")
+
+        def fsm_call(scoped: bool):
+            flush, chain = stateful(cart_update, async_session, scoped)
+            data = {"event_from_user": from_user, "event_chat": chat, "bot": bot}
+            return flush(chain, update, data) if flush else chain(update, data)
+
+        print(f"{'Сценарий':<22}{'Схема':<14}{'Соединений':>12}{'Запросов':>10}{'Коммитов':>10}")
+        for name, legacy, handler in scenarios:
+            for label, call in (
+                ("legacy", legacy),
+                ("middleware", lambda: middleware(handler, update, {"event_from_user": from_user})),
+            ):
+                before = counters.snapshot()
+                for _ in range(iterations):
+                    await call()
+                after = counters.snapshot()
+                checkouts, statements, commits = (
+                    (a - b) / iterations for a, b in zip(after, before)
+                )
+                print(f"{name:<22}{label:<14}{checkouts:>12.1f}{statements:>10.1f}{commits:>10.1f}")
+
+        # Апдейт со сценарием FSM (корзина): отдельные сессии FSM и обработчика
+        # против общей сессии update_scope
+        for label, scoped in (("fsm_separate", False), ("update_scope", True)):
+            before = counters.snapshot()
+            for _ in range(iterations):
+                await fsm_call(scoped)
+            after = counters.snapshot()
+            checkouts, statements, commits = ((a - b) / iterations for a, b in zip(after, before))
+            print(f"{'cart_update':<22}{label:<14}{checkouts:>12.1f}{statements:>10.1f}{commits:>10.1f}")
+
+        await bot.session.close()
+
+        await engine.dispose()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Соединения, запросы и коммиты на один апдейт: прежняя схема и DatabaseMiddleware"
+    )
+    parser.add_argument("--iterations", type=int, default=100, help="Число апдейтов на сценарий")
+
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
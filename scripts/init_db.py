@@ -15,6 +15,8 @@ from models.office import Office
 from models.cafe import Cafe
 from models.order import Order, OrderItem, OrderStatus
 from models.order_deadline import OrderDeadline
+from models.daily_stats import DailyDishStats, DailyUserStats, DailyCafeStats
+from services.rollup_service import rebuild_daily_rollups
 from sqlalchemy import select, delete
 
 async def create_test_data(force: bool = False):
@@ -42,6 +44,9 @@ async def create_test_data(force: bool = False):
         
         if force and existing_dishes:
             print("[INFO] Удаление существующих данных...")
+            await session.execute(delete(DailyDishStats))
+            await session.execute(delete(DailyUserStats))
+            await session.execute(delete(DailyCafeStats))
             await session.execute(delete(CafeMenu))
             await session.execute(delete(OrderDeadline))
             await session.execute(delete(Order))
@@ -270,6 +275,9 @@ async def create_test_data(force: bool = False):
         await session.commit()
         print(f"[OK] Создано {orders_created} тестовых заказов")
         
+        await rebuild_daily_rollups(session)
+        print("[OK] Дневные агрегаты пересчитаны")
+        
         print("\n" + "="*50)
         print("[SUCCESS] Тестовые данные успешно созданы!")
         print("="*50)
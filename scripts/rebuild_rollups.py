@@ -0,0 +1,63 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from datetime import date
+from database.database import init_db, get_session
+from services.rollup_service import rebuild_daily_rollups, check_rollup_consistency
+
+async def rebuild_rollups(date_from: date = None, date_to: date = None, check: bool = False):
+    """
+    Пересчитывает дневные агрегаты по сырым заказам за [date_from, date_to)
+    или только проверяет их согласованность
+    
+    Args:
+        date_from: Первый день периода (включительно)
+        date_to: День, следующий за последним днем периода
+        check: Если True, только сравнивает агрегаты с сырыми данными
+    """
+    await init_db()
+    
+    async for session in get_session():
+        if check:
+            mismatches = await check_rollup_consistency(session, date_from, date_to)
+            if not mismatches:
+                print("[OK] Агрегаты согласованы с заказами")
+                return
+            
+            print(f"[WARNING] Найдено расхождений: {len(mismatches)}")
+            for mismatch in mismatches:
+                print(f"   - {mismatch}")
+            sys.exit(1)
+        
+        written = await rebuild_daily_rollups(session, date_from, date_to)
+        print("[OK] Дневные агрегаты пересчитаны")
+        for table_name, rows_count in written.items():
+            print(f"   - {table_name}: {rows_count}")
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Пересчет дневных агрегатов по заказам")
+    parser.add_argument(
+        "--date-from",
+        type=date.fromisoformat,
+        help="Первый день периода (YYYY-MM-DD, включительно)"
+    )
+    parser.add_argument(
+        "--date-to",
+        type=date.fromisoformat,
+        help="День после последнего дня периода (YYYY-MM-DD, не включительно)"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Только проверить согласованность агрегатов с заказами"
+    )
+    
+    args = parser.parse_args()
+    asyncio.run(rebuild_rollups(args.date_from, args.date_to, args.check))
@@ -0,0 +1,266 @@
+"""
+Массовая рассылка сообщений с учетом ограничений Telegram
+
+Сообщения отправляются пулом из BROADCAST_CONCURRENCY задач. Перед каждой
+отправкой берется токен из общего ведра (BROADCAST_RATE_PER_SECOND сообщений
+в секунду на бота) и выдерживается интервал между сообщениями в один чат.
+TelegramRetryAfter приостанавливает всю рассылку на указанное время,
+сетевые ошибки и ошибки сервера повторяются с экспоненциальной задержкой.
+Пользователи, заблокировавшие бота, помечаются User.is_blocked.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramNetworkError, TelegramServerError
+)
+from sqlalchemy import update
+from loguru import logger
+from config.settings import settings
+from models.user import User
+
+SendFunc = Callable[[int], Awaitable[Any]]
+
+class BroadcastLimiter:
+    """
+    Общее ведро токенов на бота и минимальный интервал между сообщениями в чат
+
+    Args:
+        rate: Сообщений в секунду на бота
+        per_chat_interval: Минимальный интервал между сообщениями в один чат (секунды)
+        clock: Источник монотонного времени (для тестов)
+        sleep: Функция ожидания (для тестов)
+    """
+
+    def __init__(self, rate: float, per_chat_interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = rate
+        self._updated_at = clock()
+        self._paused_until = 0.0
+        self._chat_next: Dict[int, float] = {}
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает все отправки (ответ Telegram с retry_after)"""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def _wait_time(self, chat_id: int, now: float) -> float:
+        self._tokens = min(self.rate, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        # Допуск на погрешность float: без него ожидание может оказаться меньше
+        # шага часов, и ведро никогда не наберет целый токен
+        token_wait = 0.0 if self._tokens >= 1 - 1e-9 else (1 - self._tokens) / self.rate
+        return max(self._paused_until - now, self._chat_next.get(chat_id, 0.0) - now, token_wait)
+
+    async def acquire(self, chat_id: int) -> None:
+        """Ждет, пока можно отправить сообщение в чат"""
+        while True:
+            now = self._clock()
+            wait = self._wait_time(chat_id, now)
+            if wait <= 0:
+                self._tokens -= 1
+                self._chat_next[chat_id] = now + self.per_chat_interval
+                if len(self._chat_next) > 10000:
+                    self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+                return
+            await self._sleep(wait)
+
+@dataclass
+class BroadcastResult:
+    """Итог рассылки"""
+    name: str
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    blocked: List[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed + len(self.blocked)
+
+    @property
+    def throughput(self) -> float:
+        """Отправлено сообщений в секунду"""
+        return self.sent / self.elapsed if self.elapsed > 0 else float(self.sent)
+
+class Broadcaster:
+    """
+    Рассылка с ограниченной параллельностью, лимитом скорости и повторами
+
+    Args:
+        limiter: Ограничитель скорости (по умолчанию из settings)
+        concurrency: Число параллельных отправок
+        max_retries: Число повторов одного сообщения
+        backoff: Начальная задержка повтора при сетевой ошибке (секунды)
+        progress_every: Как часто (в сообщениях) логировать прогресс
+        clock: Источник монотонного времени (для тестов)
+        sleep: Функция ожидания (для тестов)
+    """
+
+    def __init__(self, limiter: Optional[BroadcastLimiter] = None, concurrency: int = 10,
+                 max_retries: int = 3, backoff: float = 1.0, progress_every: int = 100,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        self.limiter = limiter or BroadcastLimiter(
+            settings.BROADCAST_RATE_PER_SECOND, settings.BROADCAST_PER_CHAT_INTERVAL, clock, sleep
+        )
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.progress_every = progress_every
+        self._clock = clock
+        self._sleep = sleep
+        self._stats = dict.fromkeys(("broadcasts", "sent", "failed", "blocked", "retries"), 0)
+        self._last: Optional[Dict[str, Any]] = None
+
+    async def broadcast(self, chat_ids: Iterable[int], send: SendFunc, name: str = "broadcast",
+                        on_progress: Optional[Callable[[BroadcastResult], Any]] = None,
+                        mark_blocked: bool = True) -> BroadcastResult:
+        """
+        Отправляет сообщение каждому чату
+
+        Args:
+            chat_ids: Telegram ID получателей (повторы отбрасываются)
+            send: Корутина отправки одному получателю, например
+                lambda chat_id: bot.send_message(chat_id, text)
+            name: Название рассылки для логов
+            on_progress: Вызывается каждые progress_every обработанных получателей
+            mark_blocked: Помечать ли заблокировавших бота пользователей в БД
+
+        Returns:
+            BroadcastResult
+        """
+        recipients = list(dict.fromkeys(chat_ids))
+        result = BroadcastResult(name=name, total=len(recipients))
+        if not recipients:
+            return result
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in recipients:
+            queue.put_nowait(chat_id)
+        started = self._clock()
+
+        async def worker():
+            while not queue.empty():
+                chat_id = queue.get_nowait()
+                await self._deliver(chat_id, send, result)
+                result.elapsed = self._clock() - started
+                if self.progress_every and result.processed % self.progress_every == 0:
+                    logger.info(
+                        f"Рассылка {name}: {result.processed}/{result.total}, "
+                        f"{result.throughput:.1f} сообщ/с"
+                    )
+                    if on_progress:
+                        on_progress(result)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(recipients)))))
+        result.elapsed = self._clock() - started
+
+        if mark_blocked and result.blocked:
+            try:
+                await mark_users_blocked(result.blocked)
+            except Exception as e:
+                logger.error(f"Не удалось отметить пользователей, заблокировавших бота: {e}")
+
+        self._record(result)
+        logger.info(
+            f"Рассылка {name} завершена: отправлено {result.sent} из {result.total}, "
+            f"заблокировали бота {len(result.blocked)}, ошибок {result.failed}, "
+            f"повторов {result.retries}, {result.elapsed:.1f} с ({result.throughput:.1f} сообщ/с)"
+        )
+        return result
+
+    async def _deliver(self, chat_id: int, send: SendFunc, result: BroadcastResult) -> None:
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                await send(chat_id)
+                result.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood control при рассылке {result.name}: пауза {e.retry_after} с")
+                self.limiter.pause(e.retry_after)
+            except TelegramForbiddenError:
+                result.blocked.append(chat_id)
+                return
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logger.warning(f"Ошибка отправки {chat_id} ({result.name}), попытка {attempt + 1}: {e}")
+                if attempt < self.max_retries:
+                    await self._sleep(self.backoff * 2 ** attempt)
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение {chat_id} ({result.name}): {e}")
+                result.failed += 1
+                return
+            if attempt < self.max_retries:
+                result.retries += 1
+
+        logger.error(f"Не удалось отправить сообщение {chat_id} ({result.name}) после {self.max_retries} повторов")
+        result.failed += 1
+
+    def _record(self, result: BroadcastResult) -> None:
+        self._stats["broadcasts"] += 1
+        self._stats["sent"] += result.sent
+        self._stats["failed"] += result.failed
+        self._stats["blocked"] += len(result.blocked)
+        self._stats["retries"] += result.retries
+        self._last = {
+            "name": result.name,
+            "total": result.total,
+            "sent": result.sent,
+            "elapsed": round(result.elapsed, 2),
+            "throughput": round(result.throughput, 1)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики рассылок
+
+        Returns:
+            Dict с суммарными счетчиками и итогом последней рассылки
+        """
+        return {**self._stats, "last": self._last}
+
+async def mark_users_blocked(telegram_ids: List[int]) -> None:
+    """Помечает пользователей, заблокировавших бота"""
+    from database.database import get_session
+
+    async for session in get_session():
+        await session.execute(
+            update(User).where(User.telegram_id.in_(telegram_ids)).values(is_blocked=True)
+        )
+        await session.commit()
+
+broadcaster = Broadcaster(
+    concurrency=settings.BROADCAST_CONCURRENCY,
+    max_retries=settings.BROADCAST_MAX_RETRIES
+)
+
+def get_broadcast_stats() -> Dict[str, Any]:
+    """Счетчики общего рассыльщика"""
+    return broadcaster.stats()
+
+_background: Set[asyncio.Task] = set()
+
+def run_in_background(coro: Awaitable[Any]) -> asyncio.Task:
+    """
+    Запускает рассылку, не задерживая обработчик апдейта
+
+    Ссылка на задачу хранится до ее завершения, ошибки логируются.
+    """
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+
+    def _done(task: asyncio.Task) -> None:
+        _background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка фоновой рассылки: {task.exception()}")
+
+    task.add_done_callback(_done)
+    return task
@@ -2,8 +2,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from models.cafe import Cafe
 from models.cafe_menu import CafeMenu
+from database.upsert import upsert_returning
+from services.menu_snapshot_service import apply_menu_stock, invalidate_menu_snapshots
+from utils.dates import day_of, start_of_day
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 async def get_all_cafes(session: AsyncSession, office_id: Optional[int] = None, active_only: bool = True) -> List[Cafe]:
     query = select(Cafe)
@@ -45,6 +48,7 @@ async def update_cafe(session: AsyncSession, cafe_id: int, name: Optional[str] =
     
     await session.commit()
     await session.refresh(cafe)
+    invalidate_menu_snapshots(cafe_id=cafe_id)
     return cafe
 
 async def delete_cafe(session: AsyncSession, cafe_id: int) -> bool:
@@ -54,17 +58,14 @@ async def delete_cafe(session: AsyncSession, cafe_id: int) -> bool:
     
     await session.delete(cafe)
     await session.commit()
+    invalidate_menu_snapshots(cafe_id=cafe_id)
     return True
 
 async def get_cafe_menu_for_date(session: AsyncSession, cafe_id: int, date: datetime) -> List[CafeMenu]:
-    date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-    date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
     query = select(CafeMenu).where(
         and_(
             CafeMenu.cafe_id == cafe_id,
-            CafeMenu.date >= date_start,
-            CafeMenu.date <= date_end
+            CafeMenu.day == day_of(date)
         )
     )
     result = await session.execute(query)
@@ -72,54 +73,64 @@ async def get_cafe_menu_for_date(session: AsyncSession, cafe_id: int, date: date
 
 async def get_cafe_menu_item(session: AsyncSession, cafe_id: int, date: datetime, dish_id: int) -> Optional[CafeMenu]:
     """Получить элемент меню кафе по cafe_id, dish_id и date"""
-    date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-    date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
     result = await session.execute(
         select(CafeMenu).where(
             and_(
                 CafeMenu.cafe_id == cafe_id,
                 CafeMenu.dish_id == dish_id,
-                CafeMenu.date >= date_start,
-                CafeMenu.date <= date_end
+                CafeMenu.day == day_of(date)
             )
         )
     )
     return result.scalar_one_or_none()
 
-async def load_cafe_menu_for_date(session: AsyncSession, cafe_id: int, date: datetime,
-                                  dish_ids: List[int], quantities: List[int]) -> List[CafeMenu]:
-    date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+async def upsert_cafe_menus(session: AsyncSession, cafe_ids: Sequence[int], dates: Sequence[datetime],
+                            dish_ids: List[int], quantities: List[int]) -> List[CafeMenu]:
+    """
+    Записывает одно меню во все кафе и на все даты одной транзакцией
     
-    menu_items = []
-    for dish_id, quantity in zip(dish_ids, quantities):
-        existing = await session.execute(
-            select(CafeMenu).where(
-                and_(
-                    CafeMenu.cafe_id == cafe_id,
-                    CafeMenu.dish_id == dish_id,
-                    CafeMenu.date >= date_start,
-                    CafeMenu.date < date_start.replace(day=date_start.day + 1)
-                )
-            )
-        )
-        existing_item = existing.scalar_one_or_none()
-        
-        if existing_item:
-            existing_item.available_quantity = quantity
-            menu_items.append(existing_item)
-        else:
-            menu_item = CafeMenu(
-                cafe_id=cafe_id,
-                dish_id=dish_id,
-                date=date_start,
-                available_quantity=quantity
-            )
-            session.add(menu_item)
-            menu_items.append(menu_item)
+    Все строки (кафе x дата x блюдо) пишутся пакетным INSERT ... ON CONFLICT
+    DO UPDATE ... RETURNING по ключу (cafe_id, dish_id, day): у существующих
+    строк меняется только остаток.
     
+    Args:
+        session: Сессия базы данных
+        cafe_ids: Кафе
+        dates: Даты меню
+        dish_ids: Блюда
+        quantities: Остатки порций в порядке dish_ids
+    
+    Returns:
+        list[CafeMenu]: Записанные строки меню
+    """
+    stock = dict(zip(dish_ids, quantities))
+    days = [start_of_day(date) for date in dates]
+    rows = [
+        {
+            "cafe_id": cafe_id,
+            "dish_id": dish_id,
+            "date": date_start,
+            "day": day_of(date_start),
+            "available_quantity": quantity
+        }
+        for cafe_id in cafe_ids
+        for date_start in days
+        for dish_id, quantity in stock.items()
+    ]
+    
+    menu_items = await upsert_returning(
+        session, CafeMenu, rows,
+        key_columns=("cafe_id", "dish_id", "day"),
+        update_columns=("available_quantity",)
+    )
     await session.commit()
-    for item in menu_items:
-        await session.refresh(item)
+    
+    for cafe_id in cafe_ids:
+        for date_start in days:
+            apply_menu_stock(cafe_id, date_start, stock)
     return menu_items
 
+async def load_cafe_menu_for_date(session: AsyncSession, cafe_id: int, date: datetime,
+                                  dish_ids: List[int], quantities: List[int]) -> List[CafeMenu]:
+    return await upsert_cafe_menus(session, [cafe_id], [date], dish_ids, quantities)
+
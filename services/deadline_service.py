@@ -1,19 +1,26 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from models.order_deadline import OrderDeadline
+from utils.dates import day_of
 from datetime import datetime
 from typing import List, Optional
 
+def _invalidate_menu_snapshots(deadline: OrderDeadline) -> None:
+    # Снимки меню хранят дедлайн, поэтому сбрасываем все снимки на эту дату
+    from services.menu_snapshot_service import invalidate_menu_snapshots
+    invalidate_menu_snapshots(order_date=deadline.date)
+
+async def _reschedule_reminders(session: AsyncSession, deadline: OrderDeadline) -> None:
+    # Напоминания - одноразовые задачи на точное время дедлайна
+    from services.reminder_service import reschedule_deadline_reminders
+    await reschedule_deadline_reminders(session, deadline.date.date())
+
 async def get_deadline_for_date(session: AsyncSession, date: datetime, 
                                 office_id: Optional[int] = None,
                                 cafe_id: Optional[int] = None) -> Optional[OrderDeadline]:
-    date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-    date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
     query = select(OrderDeadline).where(
         and_(
-            OrderDeadline.date >= date_start,
-            OrderDeadline.date <= date_end,
+            OrderDeadline.day == day_of(date),
             OrderDeadline.is_active == True
         )
     )
@@ -38,6 +45,8 @@ async def create_deadline(session: AsyncSession, date: datetime, deadline_time:
     session.add(deadline)
     await session.commit()
     await session.refresh(deadline)
+    _invalidate_menu_snapshots(deadline)
+    await _reschedule_reminders(session, deadline)
     return deadline
 
 async def get_all_deadlines(session: AsyncSession, active_only: bool = True) -> List[OrderDeadline]:
@@ -63,6 +72,8 @@ async def update_deadline(session: AsyncSession, deadline_id: int,
     
     await session.commit()
     await session.refresh(deadline)
+    _invalidate_menu_snapshots(deadline)
+    await _reschedule_reminders(session, deadline)
     return deadline
 
 async def delete_deadline(session: AsyncSession, deadline_id: int) -> bool:
@@ -73,5 +84,7 @@ async def delete_deadline(session: AsyncSession, deadline_id: int) -> bool:
     
     await session.delete(deadline)
     await session.commit()
+    _invalidate_menu_snapshots(deadline)
+    await _reschedule_reminders(session, deadline)
     return True
 
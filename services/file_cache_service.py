@@ -0,0 +1,188 @@
+"""
+Кэш Telegram file_id сгенерированных отчетов
+
+Документ загружается в Telegram один раз: после первой отправки его file_id
+сохраняется в cached_files под хэшем данных отчета, и остальным
+администраторам (и при повторных запросах) файл пересылается по file_id
+без построения и загрузки. Хэш считается по данным, а не по байтам файла
+(в xlsx записывается время создания), поэтому изменившиеся данные дают
+новый хэш: файл строится заново, а запись прежней версии того же отчета
+(report_key) удаляется.
+"""
+import asyncio
+import hashlib
+import json
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputFile, Message
+from sqlalchemy import select, delete, or_
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from loguru import logger
+from config.settings import settings
+from models.cached_file import CachedFile
+
+# Меняется вместе с форматом файлов, чтобы не пересылать файлы старого вида
+REPORT_FORMAT_VERSION = 1
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def report_digest(report_key: str, data: Any) -> str:
+    """
+    Хэш данных отчета
+
+    Args:
+        report_key: Ключ отчета (вид и период, например "daily_report:2024-01-15")
+        data: Данные, из которых строится файл (сериализуемые в JSON)
+
+    Returns:
+        str: sha256 в hex
+    """
+    payload = json.dumps(
+        [REPORT_FORMAT_VERSION, report_key, data],
+        sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class FileIdCache:
+    """Соответствие хэш отчета -> file_id с хранением в БД"""
+
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None, ttl_days: int = 30):
+        self.session_factory = session_factory
+        self.ttl = timedelta(days=ttl_days)
+        # report_key -> (хэш, file_id) последней версии отчета
+        self._memory: Dict[str, Tuple[str, str]] = {}
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._stats = dict.fromkeys(("hits", "uploads", "invalidations"), 0)
+
+    def _get_session_factory(self) -> async_sessionmaker:
+        if self.session_factory is not None:
+            return self.session_factory
+
+        from database import database
+        if database.async_session is None:
+            raise RuntimeError("База данных не инициализирована. Вызовите init_db() перед использованием.")
+        return database.async_session
+
+    def _lock(self, report_key: str) -> asyncio.Lock:
+        lock = self._locks.get(report_key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[report_key] = lock
+        return lock
+
+    async def _lookup(self, report_key: str, digest: str) -> Optional[str]:
+        cached = self._memory.get(report_key)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+        try:
+            async with self._get_session_factory()() as session:
+                file_id = await session.scalar(
+                    select(CachedFile.file_id).where(CachedFile.content_hash == digest)
+                )
+        except RuntimeError:
+            return None
+        if file_id is not None:
+            self._memory[report_key] = (digest, file_id)
+        return file_id
+
+    async def _store(self, report_key: str, digest: str, file_id: str, filename: Optional[str]) -> None:
+        """Сохраняет file_id, удаляя прежние версии отчета и устаревшие записи"""
+        try:
+            async with self._get_session_factory()() as session:
+                stale = or_(
+                    CachedFile.report_key == report_key,
+                    CachedFile.content_hash == digest,
+                    CachedFile.created_at < _utcnow() - self.ttl
+                )
+                removed = (await session.execute(
+                    select(CachedFile.report_key, CachedFile.content_hash).where(stale)
+                )).all()
+                await session.execute(delete(CachedFile).where(stale))
+                session.add(CachedFile(
+                    content_hash=digest, report_key=report_key, file_id=file_id, filename=filename
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить file_id отчета {report_key}: {e}")
+            removed = []
+
+        for key, content_hash in removed:
+            if content_hash != digest:
+                self._stats["invalidations"] += 1
+            if key in self._memory and self._memory[key][0] == content_hash:
+                del self._memory[key]
+        self._memory[report_key] = (digest, file_id)
+
+    async def forget(self, report_key: str) -> None:
+        """Удаляет сохраненный file_id отчета"""
+        self._memory.pop(report_key, None)
+        try:
+            async with self._get_session_factory()() as session:
+                await session.execute(delete(CachedFile).where(CachedFile.report_key == report_key))
+                await session.commit()
+        except RuntimeError:
+            pass
+
+    async def _send_cached(self, bot: Bot, chat_id: int, report_key: str, digest: str,
+                           **kwargs: Any) -> Optional[Message]:
+        file_id = await self._lookup(report_key, digest)
+        if file_id is None:
+            return None
+        try:
+            message = await bot.send_document(chat_id, file_id, **kwargs)
+        except TelegramBadRequest as e:
+            # file_id перестал приниматься - загрузим файл заново
+            logger.warning(f"file_id отчета {report_key} отклонен: {e}")
+            self._stats["invalidations"] += 1
+            await self.forget(report_key)
+            return None
+        self._stats["hits"] += 1
+        return message
+
+    async def send_document(self, bot: Bot, chat_id: int, report_key: str, digest: str,
+                            build: Callable[[], Awaitable[InputFile]], **kwargs: Any) -> Message:
+        """
+        Отправляет отчет по сохраненному file_id или строит и загружает его
+
+        Одновременные отправки одного отчета ждут первую загрузку
+        и пересылают уже загруженный файл.
+
+        Args:
+            bot: Экземпляр бота
+            chat_id: Получатель
+            report_key: Ключ отчета (новая версия вытесняет прежнюю)
+            digest: Хэш данных отчета (report_digest)
+            build: Корутина, возвращающая файл для загрузки
+            **kwargs: Параметры send_document (caption и т.д.)
+
+        Returns:
+            Message: Отправленное сообщение
+        """
+        message = await self._send_cached(bot, chat_id, report_key, digest, **kwargs)
+        if message is not None:
+            return message
+
+        async with self._lock(report_key):
+            message = await self._send_cached(bot, chat_id, report_key, digest, **kwargs)
+            if message is not None:
+                return message
+
+            file = await build()
+            message = await bot.send_document(chat_id, file, **kwargs)
+            self._stats["uploads"] += 1
+            if message.document is not None:
+                await self._store(report_key, digest, message.document.file_id, getattr(file, "filename", None))
+            return message
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "cached": len(self._memory)}
+
+file_id_cache = FileIdCache(ttl_days=settings.FILE_ID_CACHE_TTL_DAYS)
+
+def get_file_cache_stats() -> Dict[str, Any]:
+    """Счетчики кэша file_id отчетов"""
+    return file_id_cache.get_stats()
@@ -1,10 +1,13 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 from datetime import datetime
 from models.dish import Dish
 from models.menu import Menu
-from utils.cache import clear_cache
-from typing import List, Optional, Any
+from database.upsert import upsert_returning
+from utils.cache import invalidate_tags
+from utils.dates import day_of
+from services.menu_snapshot_service import invalidate_menu_snapshots
+from typing import List, Optional, Any, Sequence, Tuple
 
 async def add_dish(
     session: AsyncSession, 
@@ -23,13 +26,31 @@ async def add_dish(
     session.add(dish)
     await session.commit()
     await session.refresh(dish)
-    clear_cache("get_dish_categories")
+    invalidate_tags("dishes")
     return dish
 
 async def get_all_dishes(session: AsyncSession) -> List[Dish]:
     result = await session.execute(select(Dish).order_by(Dish.category, Dish.name))
     return list(result.scalars().all())
 
+async def get_dish_category_counts(session: AsyncSession) -> List[Tuple[Optional[str], int]]:
+    """
+    Категории каталога с числом блюд (без загрузки самих блюд)
+    
+    Returns:
+        list[tuple]: (категория, число блюд) по алфавиту
+    """
+    result = await session.execute(
+        select(Dish.category, func.count(Dish.id)).group_by(Dish.category).order_by(Dish.category)
+    )
+    return [(category, count) for category, count in result.all()]
+
+async def get_dishes_by_category(session: AsyncSession, category: Optional[str]) -> List[Dish]:
+    result = await session.execute(
+        select(Dish).where(Dish.category.is_(None) if category is None else Dish.category == category).order_by(Dish.name)
+    )
+    return list(result.scalars().all())
+
 async def get_dish_by_id(session: AsyncSession, dish_id: int) -> Optional[Dish]:
     result = await session.execute(select(Dish).where(Dish.id == dish_id))
     return result.scalar_one_or_none()
@@ -47,7 +68,8 @@ async def update_dish(session: AsyncSession, dish_id: int, **kwargs: Any) -> Opt
     
     await session.commit()
     await session.refresh(dish)
-    clear_cache("get_dish_categories")
+    invalidate_tags("dishes")
+    invalidate_menu_snapshots()
     return dish
 
 async def delete_dish(session: AsyncSession, dish_id: int) -> bool:
@@ -59,44 +81,48 @@ async def delete_dish(session: AsyncSession, dish_id: int) -> bool:
     
     await session.delete(dish)
     await session.commit()
-    clear_cache("get_dish_categories")
+    invalidate_tags("dishes")
+    invalidate_menu_snapshots()
     return True
 
+async def upsert_menus(
+    session: AsyncSession,
+    dates: Sequence[datetime],
+    dish_ids: List[int],
+    quantities: List[int]
+) -> List[Menu]:
+    """
+    Записывает общее меню на все даты одним пакетным upsert по (day, dish_id)
+    
+    Args:
+        session: Сессия базы данных
+        dates: Даты меню
+        dish_ids: Блюда
+        quantities: Остатки порций в порядке dish_ids
+    
+    Returns:
+        list[Menu]: Записанные строки меню
+    """
+    rows = [
+        {"date": date, "day": day_of(date), "dish_id": dish_id, "available_quantity": quantity}
+        for date in dates
+        for dish_id, quantity in zip(dish_ids, quantities)
+    ]
+    menus = await upsert_returning(
+        session, Menu, rows,
+        key_columns=("day", "dish_id"),
+        update_columns=("available_quantity",)
+    )
+    await session.commit()
+    return menus
+
 async def load_menu_for_date(
     session: AsyncSession, 
     date: datetime, 
     dish_ids: List[int], 
     quantities: List[int]
 ) -> List[Menu]:
-    date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-    date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
-    existing_result = await session.execute(
-        select(Menu).where(
-            Menu.date >= date_start,
-            Menu.date <= date_end
-        )
-    )
-    existing_menus = {menu.dish_id: menu for menu in existing_result.scalars().all()}
-    
-    new_menus = []
-    for dish_id, quantity in zip(dish_ids, quantities):
-        if dish_id in existing_menus:
-            existing_menus[dish_id].available_quantity = quantity
-        else:
-            menu = Menu(
-                date=date,
-                dish_id=dish_id,
-                available_quantity=quantity
-            )
-            session.add(menu)
-            new_menus.append(menu)
-    
-    await session.commit()
-    for menu in new_menus:
-        await session.refresh(menu)
-    
-    return new_menus + list(existing_menus.values())
+    return await upsert_menus(session, [date], dish_ids, quantities)
 
 
 
@@ -0,0 +1,218 @@
+"""
+Снимок меню кафе на дату для сценария оформления заказа
+
+Снимок по ключу (cafe_id, дата) хранит категории, блюда, цены, остатки,
+название кафе и дедлайн, поэтому просмотр меню, выбор количества и правка
+корзины обслуживаются из памяти процесса. В БД идет только финальное
+резервирование в create_order.
+
+Записи в остатки (create_order, cancel_order, load_cafe_menu_for_date)
+обновляют снимок на месте. Каждая запись увеличивает версию ключа:
+загрузка из БД, начавшаяся до записи, не заменит более свежий снимок.
+TTL ограничивает расхождение с изменениями из других процессов.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from models.cafe import Cafe
+from models.cafe_menu import CafeMenu
+from models.dish import Dish
+from services.deadline_service import get_deadline_for_date
+
+NO_CATEGORY = "Без категории"
+
+@dataclass
+class MenuSnapshotItem:
+    dish_id: int
+    name: str
+    description: Optional[str]
+    price: float
+    category: str
+    available_quantity: int
+
+@dataclass
+class MenuSnapshot:
+    cafe_id: int
+    day: date
+    cafe_name: str
+    deadline_time: Optional[datetime]
+    items: Dict[int, MenuSnapshotItem]
+    version: int
+    loaded_at: float = field(default=0.0)
+
+    def categories(self) -> Dict[str, List[MenuSnapshotItem]]:
+        """
+        Блюда с ненулевым остатком, сгруппированные по категориям
+
+        Returns:
+            Dict {категория: [позиции]} в порядке меню
+        """
+        categories: Dict[str, List[MenuSnapshotItem]] = {}
+        for item in self.items.values():
+            if item.available_quantity > 0:
+                categories.setdefault(item.category, []).append(item)
+        return categories
+
+async def _load_snapshot(session: AsyncSession, cafe_id: int, day: date, version: int) -> MenuSnapshot:
+    result = await session.execute(
+        select(CafeMenu.dish_id, CafeMenu.available_quantity, Dish.name, Dish.description, Dish.price, Dish.category)
+        .join(Dish, CafeMenu.dish_id == Dish.id)
+        .where(
+            CafeMenu.cafe_id == cafe_id,
+            CafeMenu.day == day
+        )
+        .order_by(CafeMenu.id)
+    )
+    items = {
+        dish_id: MenuSnapshotItem(
+            dish_id=dish_id,
+            name=name,
+            description=description,
+            price=price,
+            category=category or NO_CATEGORY,
+            available_quantity=available_quantity
+        )
+        for dish_id, available_quantity, name, description, price, category in result.all()
+    }
+
+    cafe_name = (await session.execute(select(Cafe.name).where(Cafe.id == cafe_id))).scalar_one_or_none()
+    deadline = await get_deadline_for_date(session, day, cafe_id=cafe_id)
+
+    return MenuSnapshot(
+        cafe_id=cafe_id,
+        day=day,
+        cafe_name=cafe_name or f"Кафе #{cafe_id}",
+        deadline_time=deadline.deadline_time if deadline else None,
+        items=items,
+        version=version
+    )
+
+class MenuSnapshotStore:
+    """
+    Хранилище снимков меню с версионированными обновлениями
+
+    Args:
+        ttl_seconds: Время жизни снимка
+        clock: Источник монотонного времени (для тестов)
+    """
+
+    def __init__(self, ttl_seconds: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._snapshots: Dict[Tuple[int, date], MenuSnapshot] = {}
+        self._versions: Dict[Tuple[int, date], int] = {}
+        self._loading: Dict[Tuple[int, date], asyncio.Future] = {}
+        self.loads = 0
+
+    async def get(self, session: AsyncSession, cafe_id: int, order_date: datetime) -> MenuSnapshot:
+        """
+        Возвращает снимок меню, загружая его из БД при отсутствии или устаревании
+
+        Одновременные промахи по одному ключу ждут одну загрузку.
+        """
+        key = (cafe_id, order_date.date() if isinstance(order_date, datetime) else order_date)
+
+        while True:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and self._clock() - snapshot.loaded_at < self.ttl_seconds:
+                return snapshot
+
+            loading = self._loading.get(key)
+            if loading is None:
+                break
+
+            try:
+                return await asyncio.shield(loading)
+            except asyncio.CancelledError:
+                if not loading.cancelled():
+                    raise
+                # Загружавший запрос был отменен - загружаем сами
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        version = self._versions.get(key, 0)
+
+        try:
+            self.loads += 1
+            snapshot = await _load_snapshot(session, cafe_id, key[1], version)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()
+            raise
+        else:
+            snapshot.loaded_at = self._clock()
+            if self._versions.get(key, 0) == version:
+                self._snapshots[key] = snapshot
+            future.set_result(snapshot)
+            return snapshot
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def _bump(self, key: Tuple[int, date]) -> int:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return self._versions[key]
+
+    def apply_stock(self, cafe_id: int, order_date: datetime, stock: Dict[int, int]) -> bool:
+        """
+        Записывает в снимок остатки, прочитанные из БД после записи
+
+        Args:
+            cafe_id: ID кафе
+            order_date: Дата меню
+            stock: Остатки {dish_id: available_quantity}
+
+        Returns:
+            bool: True, если снимок обновлен на месте; False, если снимка нет
+            или в нем нет одного из блюд (тогда снимок сбрасывается)
+        """
+        key = (cafe_id, order_date.date() if isinstance(order_date, datetime) else order_date)
+        version = self._bump(key)
+
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return False
+        if any(dish_id not in snapshot.items for dish_id in stock):
+            del self._snapshots[key]
+            return False
+
+        for dish_id, available_quantity in stock.items():
+            snapshot.items[dish_id].available_quantity = available_quantity
+        snapshot.version = version
+        return True
+
+    def invalidate(self, cafe_id: Optional[int] = None, order_date: Optional[datetime] = None) -> None:
+        """
+        Сбрасывает снимки по кафе и/или дате (без аргументов - все)
+        """
+        day = order_date.date() if isinstance(order_date, datetime) else order_date
+        keys = set(self._snapshots) | set(self._loading)
+        for key in keys:
+            if (cafe_id is None or key[0] == cafe_id) and (day is None or key[1] == day):
+                self._bump(key)
+                self._snapshots.pop(key, None)
+
+    def clear(self) -> None:
+        """Сбрасывает все снимки"""
+        self.invalidate()
+
+menu_snapshots = MenuSnapshotStore()
+
+async def get_menu_snapshot(session: AsyncSession, cafe_id: int, order_date: datetime) -> MenuSnapshot:
+    """Снимок меню кафе на дату из общего хранилища"""
+    return await menu_snapshots.get(session, cafe_id, order_date)
+
+def apply_menu_stock(cafe_id: int, order_date: datetime, stock: Dict[int, int]) -> bool:
+    """Обновляет остатки в снимке меню кафе на дату"""
+    return menu_snapshots.apply_stock(cafe_id, order_date, stock)
+
+def invalidate_menu_snapshots(cafe_id: Optional[int] = None, order_date: Optional[datetime] = None) -> None:
+    """Сбрасывает снимки меню по кафе и/или дате (без аргументов - все)"""
+    menu_snapshots.invalidate(cafe_id, order_date)
@@ -3,13 +3,137 @@
 Обеспечивает создание, получение, обновление и отмену заказов
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, String
+from sqlalchemy import select, update, case, func, and_, or_, String
 from sqlalchemy.orm import selectinload
+from dataclasses import dataclass
 from datetime import datetime
+from collections import defaultdict
 from models.order import Order, OrderItem, OrderStatus
 from models.user import User
 from models.dish import Dish
-from typing import List, Dict, Optional, Any
+from services.rollup_service import order_snapshot, apply_order_change
+from services.menu_snapshot_service import apply_menu_stock
+from services.outbox_service import enqueue_admin_notification
+from services.search_service import matching_dish_ids
+from database.database import read_replica
+from utils.dates import day_of
+from typing import List, Dict, NamedTuple, Optional, Any, Tuple
+
+async def _shift_cafe_menu_stock(
+    session: AsyncSession,
+    cafe_id: int,
+    order_date: datetime,
+    requested: Dict[int, int],
+    reserve: bool
+) -> Dict[int, int]:
+    """
+    Изменяет остаток порций одним UPDATE ... RETURNING относительно текущего значения
+    
+    Args:
+        session: Сессия базы данных
+        cafe_id: ID кафе
+        order_date: Дата заказа
+        requested: Количество порций по блюдам {dish_id: quantity}
+        reserve: True - списать (только строки, где остатка хватает), False - вернуть
+    
+    Returns:
+        Dict[int, int]: Остаток порций измененных строк {dish_id: available_quantity}
+    """
+    from models.cafe_menu import CafeMenu
+    
+    if not requested:
+        return {}
+    
+    quantity_case = case(
+        *[(CafeMenu.dish_id == dish_id, quantity) for dish_id, quantity in requested.items()],
+        else_=0
+    )
+    
+    conditions = [
+        CafeMenu.cafe_id == cafe_id,
+        CafeMenu.dish_id.in_(list(requested)),
+        CafeMenu.day == day_of(order_date)
+    ]
+    if reserve:
+        conditions.append(CafeMenu.available_quantity >= quantity_case)
+        new_quantity = CafeMenu.available_quantity - quantity_case
+    else:
+        new_quantity = CafeMenu.available_quantity + quantity_case
+    
+    result = await session.execute(
+        update(CafeMenu)
+        .where(*conditions)
+        .values(available_quantity=new_quantity)
+        .returning(CafeMenu.dish_id, CafeMenu.available_quantity)
+        .execution_options(synchronize_session="fetch")
+    )
+    return {dish_id: available for dish_id, available in result.all()}
+
+def _order_item_quantities(order: Order) -> Dict[int, int]:
+    requested: Dict[int, int] = defaultdict(int)
+    for item in order.items:
+        requested[item.dish_id] += item.quantity
+    return requested
+
+async def reserve_cafe_menu_items(
+    session: AsyncSession,
+    cafe_id: int,
+    order_date: datetime,
+    items: List[Dict[str, Any]]
+) -> Dict[int, int]:
+    """
+    Атомарно резервирует порции всех позиций заказа в меню кафе
+    
+    Все позиции списываются одним условным UPDATE ... RETURNING:
+    строка обновляется, только если остатка хватает. Если хотя бы одна
+    позиция не зарезервирована, транзакция откатывается целиком.
+    
+    Args:
+        session: Сессия базы данных
+        cafe_id: ID кафе
+        order_date: Дата заказа
+        items: Список позиций заказа [{"dish_id": int, "quantity": int, ...}]
+    
+    Returns:
+        Dict[int, int]: Остаток порций после резервирования {dish_id: available_quantity}
+    
+    Raises:
+        ValueError: Если блюдо не найдено в меню или недоступно в нужном количестве
+    """
+    from models.cafe_menu import CafeMenu
+    
+    requested: Dict[int, int] = defaultdict(int)
+    for item in items:
+        requested[item['dish_id']] += item['quantity']
+    
+    if not requested:
+        return {}
+    
+    reserved = await _shift_cafe_menu_stock(session, cafe_id, order_date, requested, reserve=True)
+    
+    missing = [dish_id for dish_id in requested if dish_id not in reserved]
+    if not missing:
+        return reserved
+    
+    await session.rollback()
+    
+    stock_result = await session.execute(
+        select(CafeMenu.dish_id, CafeMenu.available_quantity).where(
+            CafeMenu.cafe_id == cafe_id,
+            CafeMenu.dish_id.in_(missing),
+            CafeMenu.day == day_of(order_date)
+        )
+    )
+    stock = {dish_id: available for dish_id, available in stock_result.all()}
+    apply_menu_stock(cafe_id, order_date, stock)
+    
+    dish_id = missing[0]
+    if dish_id not in stock:
+        raise ValueError(f"Блюдо с ID {dish_id} не найдено в меню кафе на эту дату")
+    raise ValueError(
+        f"Доступно только {stock[dish_id]} порций блюда с ID {dish_id}, "
+        f"запрошено {requested[dish_id]}"
+    )
 
 async def create_order(
     session: AsyncSession, 
@@ -18,11 +142,16 @@ async def create_order(
     items: List[Dict[str, Any]],
     cafe_id: Optional[int] = None,
     delivery_time: Optional[datetime] = None,
-    delivery_type: Optional[Any] = None
+    delivery_type: Optional[Any] = None,
+    notify_admins: bool = False
 ) -> Order:
     """
     Создает новый заказ с защитой от race condition
     
+    Остатки в меню кафе резервируются одним условным UPDATE
+    (см. reserve_cafe_menu_items), заказ, позиции и уведомления менеджерам
+    в outbox сохраняются одним commit.
+    
     Args:
         session: Сессия базы данных
         user_id: ID пользователя
@@ -31,6 +160,7 @@ async def create_order(
         cafe_id: ID кафе (опционально)
         delivery_time: Время доставки (опционально)
         delivery_type: Тип доставки (опционально)
+        notify_admins: Добавить уведомление о заказе менеджерам в outbox
     
     Returns:
         Order: Созданный заказ
@@ -38,36 +168,9 @@ async def create_order(
     Raises:
         ValueError: Если блюдо недоступно в нужном количестве
     """
-    from sqlalchemy import select
-    from models.cafe_menu import CafeMenu
-    
-    date_start = order_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    date_end = order_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
+    reserved_stock = {}
     if cafe_id:
-        for item in items:
-            result = await session.execute(
-                select(CafeMenu)
-                .where(
-                    CafeMenu.cafe_id == cafe_id,
-                    CafeMenu.dish_id == item['dish_id'],
-                    CafeMenu.date >= date_start,
-                    CafeMenu.date <= date_end
-                )
-                .with_for_update()
-            )
-            menu_item = result.scalar_one_or_none()
-            
-            if not menu_item:
-                raise ValueError(f"Блюдо с ID {item['dish_id']} не найдено в меню кафе на эту дату")
-            
-            if menu_item.available_quantity < item['quantity']:
-                raise ValueError(
-                    f"Доступно только {menu_item.available_quantity} порций блюда с ID {item['dish_id']}, "
-                    f"запрошено {item['quantity']}"
-                )
-            
-            menu_item.available_quantity -= item['quantity']
+        reserved_stock = await reserve_cafe_menu_items(session, cafe_id, order_date, items)
     
     total_amount = sum(item['price'] * item['quantity'] for item in items)
     
@@ -78,24 +181,28 @@ async def create_order(
         delivery_time=delivery_time,
         delivery_type=delivery_type,
         status=OrderStatus.PENDING,
-        total_amount=total_amount
+        total_amount=total_amount,
+        items=[
+            OrderItem(
+                dish_id=item['dish_id'],
+                quantity=item['quantity'],
+                price=item['price']
+            )
+            for item in items
+        ]
     )
     session.add(order)
-    await session.flush()
-    
-    for item in items:
-        order_item = OrderItem(
-            order_id=order.id,
-            dish_id=item['dish_id'],
-            quantity=item['quantity'],
-            price=item['price']
-        )
-        session.add(order_item)
+    await apply_order_change(session, None, order_snapshot(order))
+    if notify_admins:
+        await session.flush()
+        await enqueue_admin_notification(session, "new_order", {"order_id": order.id})
     
     await session.commit()
-    await session.refresh(order)
+    if cafe_id:
+        apply_menu_stock(cafe_id, order_date, reserved_stock)
     return order
 
+@read_replica
 async def get_user_orders(
     session: AsyncSession, 
     user_id: int, 
@@ -124,51 +231,34 @@ async def get_user_orders(
     if status:
         query = query.where(Order.status == status)
     if date_from:
-        query = query.where(Order.order_date >= date_from)
+        query = query.where(Order.day >= day_of(date_from))
     if date_to:
-        query = query.where(Order.order_date <= date_to)
+        query = query.where(Order.day <= day_of(date_to))
     query = query.order_by(Order.order_date.desc())
     
     result = await session.execute(query)
     return list(result.scalars().all())
 
+@read_replica
 async def search_user_orders_by_dish(session: AsyncSession, user_id: int, dish_name: str) -> List[Order]:
     """
-    Поиск заказов пользователя по названию блюда (case-insensitive)
+    Поиск заказов пользователя по названию или описанию блюда (без учета регистра)
     
     Args:
         session: Сессия базы данных
         user_id: ID пользователя
-        dish_name: Название блюда для поиска (частичное совпадение)
+        dish_name: Строка для поиска (частичное совпадение)
     
     Returns:
         list[Order]: Список заказов, содержащих блюдо с указанным названием
     """
-    from models.dish import Dish
-    from models.order import OrderItem
-    
-    # Ищем блюда по названию (case-insensitive)
-    dish_query = select(Dish.id).where(Dish.name.ilike(f"%{dish_name}%"))
-    dish_result = await session.execute(dish_query)
-    dish_ids = [row[0] for row in dish_result.all()]
-    
-    if not dish_ids:
-        return []
-    
-    # Ищем заказы, содержащие эти блюда
-    order_items_query = select(OrderItem.order_id).where(OrderItem.dish_id.in_(dish_ids))
-    order_items_result = await session.execute(order_items_query)
-    order_ids = list(set([row[0] for row in order_items_result.all()]))
-    
-    if not order_ids:
-        return []
-    
-    # Получаем заказы пользователя
+    # Один запрос: заказы пользователя, в которых есть найденное индексом блюдо
     query = select(Order).options(selectinload(Order.items), selectinload(Order.user)).where(
-        and_(
-            Order.user_id == user_id,
-            Order.id.in_(order_ids)
-        )
+        Order.user_id == user_id,
+        select(OrderItem.id).where(
+            OrderItem.order_id == Order.id,
+            OrderItem.dish_id.in_(matching_dish_ids(session, dish_name))
+        ).exists()
     ).order_by(Order.order_date.desc())
     
     result = await session.execute(query)
@@ -195,28 +285,18 @@ async def cancel_order(session: AsyncSession, order_id: int, user_id: int) -> bo
     if order.status == OrderStatus.CANCELLED:
         return False
     
-    from services.cafe_service import get_cafe_menu_for_date
-    
+    restored_stock = {}
     if order.cafe_id:
-        date_start = order.order_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = order.order_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        from models.cafe_menu import CafeMenu
-        for item in order.items:
-            result = await session.execute(
-                select(CafeMenu).where(
-                    CafeMenu.cafe_id == order.cafe_id,
-                    CafeMenu.dish_id == item.dish_id,
-                    CafeMenu.date >= date_start,
-                    CafeMenu.date <= date_end
-                )
-            )
-            menu_item = result.scalar_one_or_none()
-            if menu_item:
-                menu_item.available_quantity += item.quantity
+        restored_stock = await _shift_cafe_menu_stock(
+            session, order.cafe_id, order.order_date, _order_item_quantities(order), reserve=False
+        )
     
+    before = order_snapshot(order)
     order.status = OrderStatus.CANCELLED
+    await apply_order_change(session, before, None)
     await session.commit()
+    if restored_stock:
+        apply_menu_stock(order.cafe_id, order.order_date, restored_stock)
     return True
 
 async def update_order_status(
@@ -249,44 +329,30 @@ async def update_order_status(
     
     old_status = order.status
     
+    changed_stock = {}
     if order.cafe_id:
-        from models.cafe_menu import CafeMenu
-        date_start = order.order_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = order.order_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
+        # Остаток меняется относительно текущего значения в БД, а не прочитанного
+        # ранее, поэтому параллельные резервирования не перезаписываются
         if new_status == OrderStatus.CANCELLED and old_status != OrderStatus.CANCELLED:
-            for item in order.items:
-                result = await session.execute(
-                    select(CafeMenu).where(
-                        CafeMenu.cafe_id == order.cafe_id,
-                        CafeMenu.dish_id == item.dish_id,
-                        CafeMenu.date >= date_start,
-                        CafeMenu.date <= date_end
-                    )
-                )
-                menu_item = result.scalar_one_or_none()
-                if menu_item:
-                    menu_item.available_quantity += item.quantity
+            changed_stock = await _shift_cafe_menu_stock(
+                session, order.cafe_id, order.order_date, _order_item_quantities(order), reserve=False
+            )
         elif old_status == OrderStatus.CANCELLED and new_status != OrderStatus.CANCELLED:
-            for item in order.items:
-                result = await session.execute(
-                    select(CafeMenu).where(
-                        CafeMenu.cafe_id == order.cafe_id,
-                        CafeMenu.dish_id == item.dish_id,
-                        CafeMenu.date >= date_start,
-                        CafeMenu.date <= date_end
-                    )
-                )
-                menu_item = result.scalar_one_or_none()
-                if menu_item and menu_item.available_quantity >= item.quantity:
-                    menu_item.available_quantity -= item.quantity
+            changed_stock = await _shift_cafe_menu_stock(
+                session, order.cafe_id, order.order_date, _order_item_quantities(order), reserve=True
+            )
     
+    before = order_snapshot(order)
     order.status = new_status
     order.updated_at = datetime.now()
+    await apply_order_change(session, before, order_snapshot(order))
     await session.commit()
+    if changed_stock:
+        apply_menu_stock(order.cafe_id, order.order_date, changed_stock)
     await session.refresh(order)
     return order
 
+@read_replica
 async def get_all_orders(
     session: AsyncSession, 
     date: Optional[datetime] = None, 
@@ -312,34 +378,231 @@ async def get_all_orders(
         selectinload(Order.items).selectinload(OrderItem.dish),
         selectinload(Order.user)
     )
+    query = _filter_all_orders(query, date, user_id, status, search_term)
+    query = query.order_by(Order.order_date.desc())
+    
+    result = await session.execute(query)
+    return list(result.scalars().all())
+
+def _filter_all_orders(query, date: Optional[datetime], user_id: Optional[int],
+                       status: Optional[OrderStatus], search_term: Optional[str],
+                       user_joined: bool = False):
     if date:
-        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        query = query.where(
-            and_(
-                Order.order_date >= date_start,
-                Order.order_date <= date_end
-            )
-        )
+        query = query.where(Order.day == day_of(date))
     if user_id:
         query = query.where(Order.user_id == user_id)
     if status:
         query = query.where(Order.status == status)
     
     if search_term:
-        from models.user import User
-        query = query.join(User, Order.user_id == User.id)
+        if not user_joined:
+            query = query.join(User, Order.user_id == User.id)
         search_filter = or_(
             User.full_name.ilike(f"%{search_term}%"),
             User.username.ilike(f"%{search_term}%"),
             User.telegram_id.cast(String).ilike(f"%{search_term}%")
         )
         query = query.where(search_filter)
+    return query
+
+class OrderRow(NamedTuple):
+    """Заказ в списке: только столбцы, которые показывают экраны списков"""
+    id: int
+    order_date: datetime
+    status: OrderStatus
+    total_amount: float
+    items_count: int
+    user_id: int
+    user_full_name: Optional[str]
+    user_username: Optional[str]
+    user_telegram_id: int
+    
+    @property
+    def user_name(self) -> str:
+        return self.user_full_name or self.user_username or str(self.user_telegram_id)
+
+def _order_rows_query():
+    """SELECT строк OrderRow: один запрос без загрузки позиций и пользователей"""
+    items_count = (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+    )
+    return select(
+        Order.id, Order.order_date, Order.status, Order.total_amount, items_count,
+        Order.user_id, User.full_name, User.username, User.telegram_id
+    ).join(User, Order.user_id == User.id)
+
+@read_replica
+async def get_order_rows(
+    session: AsyncSession,
+    date: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    status: Optional[OrderStatus] = None,
+    search_term: Optional[str] = None
+) -> List[OrderRow]:
+    """
+    Заказы для экранов списков, с фильтрами get_all_orders
     
-    query = query.order_by(Order.order_date.desc())
+    В отличие от get_all_orders не загружает граф заказа (позиции, блюда,
+    пользователя): для карточки заказа используется get_order_by_id.
+    
+    Returns:
+        list[OrderRow]: Строки заказов (новые первые)
+    """
+    query = _filter_all_orders(_order_rows_query(), date, user_id, status, search_term, user_joined=True)
+    query = query.order_by(Order.order_date.desc(), Order.id.desc())
     
     result = await session.execute(query)
-    return list(result.scalars().all())
+    return [OrderRow(*row) for row in result.all()]
+
+@dataclass
+class OrderPage:
+    """
+    Страница списка заказов (новые первые)
+    
+    next_cursor ведет к более старым заказам, prev_cursor - к более новым;
+    None, если в эту сторону заказов нет.
+    """
+    orders: List[OrderRow]
+    total: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+def encode_order_cursor(order: OrderRow) -> str:
+    """Курсор страницы: (order_date, id) заказа, компактно для callback_data"""
+    return f"{order.order_date.strftime('%Y%m%d%H%M%S%f')}.{order.id}"
+
+def decode_order_cursor(cursor: str) -> Tuple[datetime, int]:
+    order_date, order_id = cursor.split(".")
+    return datetime.strptime(order_date, "%Y%m%d%H%M%S%f"), int(order_id)
+
+async def _fetch_order_page(
+    session: AsyncSession,
+    query,
+    count_query,
+    limit: int,
+    after: Optional[str],
+    before: Optional[str]
+) -> OrderPage:
+    """
+    Выбирает страницу по ключу (order_date, id) вместо OFFSET
+    
+    after - курсор последнего заказа предыдущей страницы (листаем к старым),
+    before - курсор первого заказа (листаем к новым). Берется limit + 1 строка,
+    лишняя показывает, есть ли заказы дальше.
+    """
+    if before:
+        order_date, order_id = decode_order_cursor(before)
+        query = query.where(or_(
+            Order.order_date > order_date,
+            and_(Order.order_date == order_date, Order.id > order_id)
+        )).order_by(Order.order_date.asc(), Order.id.asc())
+    else:
+        if after:
+            order_date, order_id = decode_order_cursor(after)
+            query = query.where(or_(
+                Order.order_date < order_date,
+                and_(Order.order_date == order_date, Order.id < order_id)
+            ))
+        query = query.order_by(Order.order_date.desc(), Order.id.desc())
+    
+    result = await session.execute(query.limit(limit + 1))
+    orders = [OrderRow(*row) for row in result.all()]
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    if before:
+        orders.reverse()
+    
+    total = (await session.execute(count_query)).scalar() or 0
+    
+    if before:
+        has_older, has_newer = True, has_more
+    else:
+        has_older, has_newer = has_more, bool(after)
+    
+    page = OrderPage(orders=orders, total=total)
+    if orders:
+        if has_older:
+            page.next_cursor = encode_order_cursor(orders[-1])
+        if has_newer:
+            page.prev_cursor = encode_order_cursor(orders[0])
+    return page
+
+@read_replica
+async def get_all_orders_page(
+    session: AsyncSession,
+    limit: int = 10,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    date: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    status: Optional[OrderStatus] = None,
+    search_term: Optional[str] = None
+) -> OrderPage:
+    """
+    Страница всех заказов с фильтрами get_all_orders (для администраторов)
+    
+    Args:
+        session: Сессия базы данных
+        limit: Заказов на странице
+        after: Курсор next_cursor предыдущей страницы (опционально)
+        before: Курсор prev_cursor для возврата назад (опционально)
+        date, user_id, status, search_term: Фильтры, как в get_all_orders
+    
+    Returns:
+        OrderPage: Строки заказов страницы и общее число заказов
+    """
+    query = _filter_all_orders(_order_rows_query(), date, user_id, status, search_term, user_joined=True)
+    count_query = _filter_all_orders(select(func.count(Order.id)), date, user_id, status, search_term)
+    return await _fetch_order_page(session, query, count_query, limit, after, before)
+
+@read_replica
+async def get_user_orders_page(
+    session: AsyncSession,
+    user_id: int,
+    limit: int = 5,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    exclude_status: Optional[OrderStatus] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    dish_name: Optional[str] = None
+) -> OrderPage:
+    """
+    Страница заказов пользователя (история заказов)
+    
+    Args:
+        session: Сессия базы данных
+        user_id: ID пользователя
+        limit: Заказов на странице
+        after: Курсор next_cursor предыдущей страницы (опционально)
+        before: Курсор prev_cursor для возврата назад (опционально)
+        exclude_status: Не показывать заказы с этим статусом (опционально)
+        date_from: Первый день периода, включительно (опционально)
+        date_to: Последний день периода, включительно (опционально)
+        dish_name: Только заказы с блюдом, название или описание которого содержит строку (опционально)
+    
+    Returns:
+        OrderPage: Строки заказов страницы и общее число заказов
+    """
+    conditions = [Order.user_id == user_id]
+    if exclude_status:
+        conditions.append(Order.status != exclude_status)
+    if date_from:
+        conditions.append(Order.day >= day_of(date_from))
+    if date_to:
+        conditions.append(Order.day <= day_of(date_to))
+    if dish_name:
+        conditions.append(
+            select(OrderItem.id)
+            .where(OrderItem.order_id == Order.id, OrderItem.dish_id.in_(matching_dish_ids(session, dish_name)))
+            .exists()
+        )
+    
+    query = _order_rows_query().where(*conditions)
+    count_query = select(func.count(Order.id)).where(*conditions)
+    return await _fetch_order_page(session, query, count_query, limit, after, before)
 
 async def update_order(
     session: AsyncSession, 
@@ -355,12 +618,14 @@ async def update_order(
         return None
     
     if items:
+        before = order_snapshot(order)
         for item in order.items:
             await session.delete(item)
         
         total_amount = sum(item['price'] * item['quantity'] for item in items)
         order.total_amount = total_amount
         
+        new_items = []
         for item_data in items:
             order_item = OrderItem(
                 order_id=order.id,
@@ -369,6 +634,9 @@ async def update_order(
                 price=item_data['price']
             )
             session.add(order_item)
+            new_items.append(order_item)
+        
+        await apply_order_change(session, before, order_snapshot(order, new_items))
     
     order.updated_at = datetime.now()
     await session.commit()
@@ -394,8 +662,10 @@ async def add_item_to_order(session: AsyncSession, order_id: int, user_id: int,
     )
     session.add(order_item)
     
+    before = order_snapshot(order)
     order.total_amount += price * quantity
     order.updated_at = datetime.now()
+    await apply_order_change(session, before, order_snapshot(order, [*order.items, order_item]))
     
     await session.commit()
     return True
@@ -411,6 +681,7 @@ async def remove_item_from_order(session: AsyncSession, order_id: int, user_id:
     if not item:
         return False
     
+    before = order_snapshot(order)
     order.total_amount -= item.price * item.quantity
     await session.delete(item)
     
@@ -418,6 +689,8 @@ async def remove_item_from_order(session: AsyncSession, order_id: int, user_id:
         order.total_amount = 0
     
     order.updated_at = datetime.now()
+    remaining_items = [order_item for order_item in order.items if order_item.id != item.id]
+    await apply_order_change(session, before, order_snapshot(order, remaining_items))
     await session.commit()
     return True
 
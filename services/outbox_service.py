@@ -0,0 +1,321 @@
+"""
+Транзакционный outbox уведомлений
+
+Уведомление записывается в notification_outbox в той же транзакции, что и
+изменение данных (например, создание заказа), поэтому не теряется при
+перезапуске и не задерживает ответ пользователю. Пул фоновых обработчиков
+забирает записи пачками: запись «арендуется» условным UPDATE (available_at
+сдвигается на время аренды), после отправки помечается SENT. Ошибки
+повторяются с экспоненциальной задержкой, после OUTBOX_MAX_ATTEMPTS попыток
+запись переходит в DEAD (dead letter). Текст формируется при отправке
+по событию и payload.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
+from sqlalchemy import select, update, delete, func, event as sa_event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from loguru import logger
+from config.settings import settings
+from models.notification_outbox import NotificationOutbox, OutboxStatus
+
+Renderer = Callable[[AsyncSession, Dict[str, Any]], Awaitable[Optional[Tuple[str, Optional[str]]]]]
+
+_renderers: Dict[str, Renderer] = {}
+
+def outbox_renderer(event: str):
+    """Регистрирует функцию, формирующую (текст, parse_mode) для события"""
+    def decorator(func: Renderer) -> Renderer:
+        _renderers[event] = func
+        return func
+    return decorator
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+async def enqueue_notification(session: AsyncSession, chat_ids: List[int], event: str,
+                               payload: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Добавляет уведомления в outbox текущей транзакции (без коммита)
+
+    После коммита транзакции фоновые обработчики будятся сразу,
+    не дожидаясь очередного опроса.
+
+    Args:
+        session: Сессия базы данных
+        chat_ids: Получатели (по записи на получателя)
+        event: Событие (ключ зарегистрированного outbox_renderer)
+        payload: Данные для формирования текста
+    """
+    raw_payload = json.dumps(payload, ensure_ascii=False) if payload else None
+    session.add_all([
+        NotificationOutbox(chat_id=chat_id, event=event, payload=raw_payload)
+        for chat_id in dict.fromkeys(chat_ids)
+    ])
+    if chat_ids:
+        sa_event.listen(session.sync_session, "after_commit", lambda _: outbox_dispatcher.wake(), once=True)
+
+async def enqueue_admin_notification(session: AsyncSession, event: str,
+                                     payload: Optional[Dict[str, Any]] = None) -> None:
+    """Добавляет уведомление каждому менеджеру в outbox текущей транзакции"""
+    from services.user_service import get_manager_telegram_ids
+    await enqueue_notification(session, await get_manager_telegram_ids(session), event, payload)
+
+@outbox_renderer("text")
+async def _render_text(session: AsyncSession, payload: Dict[str, Any]):
+    return payload["text"], payload.get("parse_mode")
+
+@outbox_renderer("new_order")
+async def _render_new_order(session: AsyncSession, payload: Dict[str, Any]):
+    from sqlalchemy.orm import selectinload
+    from models.order import Order, OrderItem
+    from utils.formatters import format_order, format_date
+
+    result = await session.execute(
+        select(Order)
+        .where(Order.id == payload["order_id"])
+        .options(selectinload(Order.items).selectinload(OrderItem.dish), selectinload(Order.user))
+    )
+    order = result.scalar_one_or_none()
+    if order is None:
+        return None
+
+    user = order.user
+    return (
+        f"🔔 Новый заказ!\n\n"
+        f"Заказ #{order.id}\n"
+        f"Пользователь: {user.full_name or user.username or user.telegram_id}\n"
+        f"Дата: {format_date(order.order_date)}\n"
+        f"Сумма: {order.total_amount:.0f} ₽\n\n"
+        f"{format_order(order)}"
+    ), None
+
+class OutboxDispatcher:
+    """
+    Пул фоновых обработчиков outbox
+
+    Args:
+        session_factory: Фабрика сессий (по умолчанию database.async_session
+            на момент вызова)
+        workers: Число обработчиков
+        batch_size: Записей за одну аренду
+        poll_interval: Интервал опроса без пробуждений (секунды)
+        max_attempts: Попыток до перевода записи в DEAD
+        backoff: Начальная задержка повтора (секунды)
+        lease: Время аренды пачки (секунды) - после него запись снова доступна
+    """
+
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None, workers: int = 2,
+                 batch_size: int = 50, poll_interval: float = 2.0, max_attempts: int = 5,
+                 backoff: float = 5.0, lease: float = 120.0):
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = timedelta(seconds=lease)
+        self._bot: Optional[Bot] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stats = dict.fromkeys(("sent", "retried", "dead"), 0)
+
+    def _get_session_factory(self) -> async_sessionmaker:
+        if self.session_factory is not None:
+            return self.session_factory
+
+        from database import database
+        if database.async_session is None:
+            raise RuntimeError("База данных не инициализирована. Вызовите init_db() перед использованием.")
+        return database.async_session
+
+    def start(self, bot: Bot) -> None:
+        """Запускает обработчики (после init_db)"""
+        if self._tasks:
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Обработчики outbox запущены: {self.workers}")
+
+    async def stop(self) -> None:
+        """Останавливает обработчики; арендованные записи вернутся после аренды"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        """Будит обработчики после коммита новых записей"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            try:
+                processed = await self.process_batch(self._bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обработчика outbox #{number}: {e}", exc_info=True)
+                processed = 0
+
+            if processed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, session: AsyncSession) -> List[NotificationOutbox]:
+        now = _utcnow()
+        candidates = (await session.execute(
+            select(NotificationOutbox.id)
+            .where(NotificationOutbox.status == OutboxStatus.PENDING, NotificationOutbox.available_at <= now)
+            .order_by(NotificationOutbox.id)
+            .limit(self.batch_size)
+        )).scalars().all()
+        if not candidates:
+            return []
+
+        # Условие на available_at повторяется: запись, которую успел арендовать
+        # другой обработчик (или другая реплика), не обновится
+        lease_mark = now + self.lease
+        claimed = (await session.execute(
+            update(NotificationOutbox)
+            .where(
+                NotificationOutbox.id.in_(candidates),
+                NotificationOutbox.status == OutboxStatus.PENDING,
+                NotificationOutbox.available_at <= now
+            )
+            .values(available_at=lease_mark)
+            .returning(NotificationOutbox.id)
+            .execution_options(synchronize_session=False)
+        )).scalars().all()
+        await session.commit()
+        if not claimed:
+            return []
+
+        result = await session.execute(
+            select(NotificationOutbox).where(NotificationOutbox.id.in_(claimed)).order_by(NotificationOutbox.id)
+        )
+        return list(result.scalars().all())
+
+    async def process_batch(self, bot: Bot) -> int:
+        """
+        Арендует и отправляет одну пачку записей
+
+        Returns:
+            int: Количество обработанных записей
+        """
+        from services.broadcast_service import broadcaster, mark_users_blocked
+
+        async with self._get_session_factory()() as session:
+            rows = await self._claim(session)
+            if not rows:
+                return 0
+
+            rendered: Dict[Tuple[str, Optional[str]], Any] = {}  # Один рендер на событие пачки
+            blocked = []
+            for row in rows:
+                key = (row.event, row.payload)
+                try:
+                    if key not in rendered:
+                        renderer = _renderers.get(row.event)
+                        if renderer is None:
+                            raise LookupError(f"Нет обработчика события {row.event}")
+                        rendered[key] = await renderer(session, json.loads(row.payload) if row.payload else {})
+                    message = rendered[key]
+                    if message is None:
+                        self._finish(row, OutboxStatus.DEAD, "Объект уведомления не найден")
+                        continue
+
+                    text, parse_mode = message
+                    await broadcaster.limiter.acquire(row.chat_id)
+                    await bot.send_message(row.chat_id, text, parse_mode=parse_mode)
+                    self._finish(row, OutboxStatus.SENT)
+                except TelegramRetryAfter as e:
+                    broadcaster.limiter.pause(e.retry_after)
+                    row.available_at = _utcnow() + timedelta(seconds=e.retry_after)
+                    self._stats["retried"] += 1
+                except TelegramForbiddenError as e:
+                    blocked.append(row.chat_id)
+                    self._finish(row, OutboxStatus.DEAD, str(e))
+                except Exception as e:
+                    self._retry(row, e)
+
+            await session.commit()
+
+        if blocked:
+            await mark_users_blocked(blocked)
+        return len(rows)
+
+    def _finish(self, row: NotificationOutbox, status: OutboxStatus, error: Optional[str] = None) -> None:
+        row.status = status
+        row.last_error = error
+        if status == OutboxStatus.SENT:
+            row.sent_at = _utcnow()
+            self._stats["sent"] += 1
+        else:
+            logger.error(f"Уведомление outbox #{row.id} ({row.event}) не доставлено: {error}")
+            self._stats["dead"] += 1
+
+    def _retry(self, row: NotificationOutbox, error: Exception) -> None:
+        row.attempts += 1
+        if row.attempts >= self.max_attempts:
+            self._finish(row, OutboxStatus.DEAD, str(error))
+            return
+        row.last_error = str(error)
+        row.available_at = _utcnow() + timedelta(seconds=self.backoff * 2 ** (row.attempts - 1))
+        self._stats["retried"] += 1
+        logger.warning(f"Уведомление outbox #{row.id} будет повторено (попытка {row.attempts}): {error}")
+
+    async def purge_sent(self, older_than: timedelta = timedelta(days=7)) -> int:
+        """
+        Удаляет отправленные записи старше older_than
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        async with self._get_session_factory()() as session:
+            result = await session.execute(
+                delete(NotificationOutbox).where(
+                    NotificationOutbox.status == OutboxStatus.SENT,
+                    NotificationOutbox.sent_at < _utcnow() - older_than
+                )
+            )
+            await session.commit()
+        return result.rowcount or 0
+
+    async def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики процесса и число записей по статусам
+
+        Returns:
+            Dict с отправленными, повторенными и мертвыми записями
+        """
+        counts = dict.fromkeys((s.value for s in OutboxStatus), 0)
+        try:
+            async with self._get_session_factory()() as session:
+                result = await session.execute(
+                    select(NotificationOutbox.status, func.count()).group_by(NotificationOutbox.status)
+                )
+                counts.update({status.value: count for status, count in result.all()})
+        except RuntimeError:
+            pass
+        return {**self._stats, "workers": len(self._tasks), "queue": counts}
+
+outbox_dispatcher = OutboxDispatcher(
+    workers=settings.OUTBOX_WORKERS,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS
+)
+
+async def get_outbox_stats() -> Dict[str, Any]:
+    """Счетчики общего пула обработчиков outbox"""
+    return await outbox_dispatcher.stats()
@@ -0,0 +1,229 @@
+"""
+Напоминания о дедлайне заказа
+
+Планировщик вычисляет точные моменты напоминаний (за 1 час и за 30 минут)
+по активным OrderDeadline на дату и по дедлайну из settings для заказов,
+которые не покрыты ни одной записью, и регистрирует одноразовые задачи
+с DateTrigger. Задача в момент срабатывания выбирает только пары
+(telegram_id, дата заказа) пользователей с PENDING-заказами, к которым
+относится дедлайн.
+
+Применимый дедлайн - самый конкретный из подходящих: кафе и офис > кафе >
+офис > общий на дату > settings.ORDER_DEADLINE_*.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional
+from apscheduler.triggers.date import DateTrigger
+from sqlalchemy import select, and_, or_, not_, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.order import Order, OrderStatus
+from models.order_deadline import OrderDeadline
+from models.user import User
+from database.query_monitor import count_statements
+from config.settings import settings
+from loguru import logger
+
+REMINDER_OFFSETS = (timedelta(hours=1), timedelta(minutes=30))
+JOB_PREFIX = "deadline_reminder"
+
+@dataclass(frozen=True)
+class ReminderPlan:
+    day: date
+    deadline_id: Optional[int]
+    deadline_time: datetime
+    fire_at: datetime
+    minutes_left: int
+
+    @property
+    def job_id(self) -> str:
+        return f"{JOB_PREFIX}:{self.day.isoformat()}:{self.deadline_id or 'default'}:{self.minutes_left}"
+
+def _rank(deadline: OrderDeadline) -> int:
+    return (deadline.cafe_id is not None) * 2 + (deadline.office_id is not None)
+
+def _matches(deadline: OrderDeadline):
+    conditions = []
+    if deadline.cafe_id is not None:
+        conditions.append(Order.cafe_id == deadline.cafe_id)
+    if deadline.office_id is not None:
+        conditions.append(User.office_id == deadline.office_id)
+    return and_(*conditions) if conditions else true()
+
+def _scope_condition(deadline: Optional[OrderDeadline], deadlines: List[OrderDeadline]):
+    """Заказы, для которых deadline - самый конкретный из подходящих (None - дедлайн по умолчанию)"""
+    rank = -1 if deadline is None else _rank(deadline)
+    more_specific = [_matches(d) for d in deadlines if _rank(d) > rank]
+    own = true() if deadline is None else _matches(deadline)
+    if not more_specific:
+        return own
+    return and_(own, not_(or_(*more_specific)))
+
+async def get_deadlines_for_day(session: AsyncSession, day: date) -> List[OrderDeadline]:
+    """Активные дедлайны на дату"""
+    result = await session.execute(
+        select(OrderDeadline).where(
+            OrderDeadline.day == day,
+            OrderDeadline.is_active == True
+        )
+    )
+    return list(result.scalars().all())
+
+def default_deadline_time(day: date) -> datetime:
+    """Дедлайн по умолчанию из settings на дату"""
+    return datetime.combine(day, time(settings.ORDER_DEADLINE_HOUR, settings.ORDER_DEADLINE_MINUTE))
+
+async def plan_deadline_reminders(session: AsyncSession, day: date) -> List[ReminderPlan]:
+    """
+    Вычисляет моменты напоминаний на дату
+
+    Args:
+        session: Сессия базы данных
+        day: Дата заказов
+
+    Returns:
+        List[ReminderPlan], отсортированный по времени срабатывания
+    """
+    deadlines = await get_deadlines_for_day(session, day)
+
+    targets = [(d.id, d.deadline_time) for d in deadlines]
+    # Общий дедлайн на дату перекрывает дедлайн по умолчанию для всех заказов
+    if not any(_rank(d) == 0 for d in deadlines):
+        targets.append((None, default_deadline_time(day)))
+
+    plans = [
+        ReminderPlan(
+            day=day,
+            deadline_id=deadline_id,
+            deadline_time=deadline_time,
+            fire_at=deadline_time - offset,
+            minutes_left=int(offset.total_seconds() // 60)
+        )
+        for deadline_id, deadline_time in targets
+        for offset in REMINDER_OFFSETS
+    ]
+    return sorted(plans, key=lambda plan: plan.fire_at)
+
+async def schedule_deadline_reminders(session: AsyncSession, days: Iterable[date],
+                                      scheduler=None, now: Optional[datetime] = None) -> int:
+    """
+    Заменяет задачи напоминаний на указанные даты одноразовыми задачами
+
+    Args:
+        session: Сессия базы данных
+        days: Даты заказов
+        scheduler: Планировщик (по умолчанию общий из scheduler_service)
+        now: Текущее время (для тестов)
+
+    Returns:
+        int: Количество зарегистрированных задач
+    """
+    if scheduler is None:
+        from services.scheduler_service import scheduler
+    now = now or datetime.now()
+
+    scheduled = 0
+    for day in days:
+        prefix = f"{JOB_PREFIX}:{day.isoformat()}:"
+        for job in scheduler.get_jobs():
+            if job.id.startswith(prefix):
+                job.remove()
+
+        for plan in await plan_deadline_reminders(session, day):
+            if plan.fire_at <= now:
+                continue
+            scheduler.add_job(
+                send_deadline_reminder,
+                trigger=DateTrigger(run_date=plan.fire_at),
+                args=[plan.day, plan.deadline_id, plan.minutes_left],
+                id=plan.job_id,
+                replace_existing=True
+            )
+            scheduled += 1
+
+    return scheduled
+
+async def reschedule_deadline_reminders(session: AsyncSession, day: date) -> None:
+    """Перепланирует напоминания на дату после изменения дедлайнов (если планировщик запущен)"""
+    from services.scheduler_service import scheduler
+    if not scheduler.running:
+        return
+    count = await schedule_deadline_reminders(session, [day], scheduler)
+    logger.info(f"Напоминания о дедлайне на {day.strftime('%d.%m.%Y')} перепланированы: {count}")
+
+@count_statements("job deadline_reminders", budget=0)
+async def refresh_deadline_reminders() -> None:
+    """Планирует напоминания на сегодня и завтра (при запуске и ежедневно)"""
+    from database.database import get_session
+
+    today = date.today()
+    async for session in get_session():
+        count = await schedule_deadline_reminders(session, [today, today + timedelta(days=1)])
+        logger.info(f"Запланировано напоминаний о дедлайне: {count}")
+
+async def get_reminder_recipients(session: AsyncSession, day: date,
+                                  deadline_id: Optional[int]) -> List[tuple]:
+    """
+    Пользователи с PENDING-заказами на дату, к которым относится дедлайн
+
+    Returns:
+        List[(telegram_id, order_date)]
+    """
+    deadlines = await get_deadlines_for_day(session, day)
+    deadline = None
+    if deadline_id is not None:
+        deadline = next((d for d in deadlines if d.id == deadline_id), None)
+        if deadline is None:
+            return []
+
+    result = await session.execute(
+        select(User.telegram_id, Order.order_date)
+        .select_from(Order)
+        .join(User, Order.user_id == User.id)
+        .where(
+            Order.status == OrderStatus.PENDING,
+            Order.day == day,
+            User.is_blocked.isnot(True),
+            _scope_condition(deadline, deadlines)
+        )
+        .distinct()
+    )
+    return [tuple(row) for row in result.all()]
+
+@count_statements("job deadline_reminder", budget=0)
+async def send_deadline_reminder(day: date, deadline_id: Optional[int], minutes_left: int) -> int:
+    """
+    Отправляет напоминание о дедлайне пользователям, к которым он относится
+
+    Returns:
+        int: Количество отправленных напоминаний
+    """
+    from database.database import get_session
+    from config.bot_instance import get_bot
+    from services.broadcast_service import broadcaster
+
+    bot = get_bot()
+    left_text = "остался 1 час" if minutes_left == 60 else f"осталось {minutes_left} минут"
+
+    async for session in get_session():
+        if deadline_id is None:
+            deadline_time = default_deadline_time(day)
+        else:
+            deadline = await session.get(OrderDeadline, deadline_id)
+            if deadline is None:
+                return 0
+            deadline_time = deadline.deadline_time
+
+        recipients = dict(await get_reminder_recipients(session, day, deadline_id))
+
+    def send(telegram_id: int):
+        message = (
+            f"⏰ Напоминание!\n\n"
+            f"До дедлайна заказа {left_text}.\n"
+            f"Ваш заказ на {recipients[telegram_id].strftime('%d.%m.%Y')} будет принят до {deadline_time.strftime('%H:%M')}.\n\n"
+            f"Для просмотра заказа используйте /orders"
+        )
+        return bot.send_message(telegram_id, message)
+
+    result = await broadcaster.broadcast(recipients, send, name=f"deadline_reminder_{minutes_left}")
+    return result.sent
@@ -1,119 +1,138 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, literal, union_all, Date
 from sqlalchemy.orm import selectinload
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from models.order import Order, OrderStatus, OrderItem
 from models.dish import Dish
 from models.user import User
 from models.cafe import Cafe
+from models.daily_stats import DailyDishStats, DailyUserStats
+from services.rollup_service import rollup_day_conditions, order_date_conditions
+from database.database import read_replica
+from utils.dates import day_of, day_range_conditions
+from config.settings import settings
 from collections import defaultdict
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 
+@read_replica
 async def get_orders_summary(session: AsyncSession, date: Optional[datetime] = None) -> Dict[str, Any]:
-    query = select(Order).options(selectinload(Order.user), selectinload(Order.items))
+    """
+    Сводка по заказам: количество, сумма и число уникальных пользователей
+    
+    Args:
+        session: Сессия базы данных
+        date: Дата для сводки (опционально, если None - за все время)
+    
+    Returns:
+        Dict со сводкой по заказам
+    """
+    query = select(
+        func.count(Order.id),
+        func.coalesce(func.sum(Order.total_amount), 0.0),
+        func.count(func.distinct(Order.user_id))
+    )
     if date:
-        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        query = query.where(
-            and_(
-                Order.order_date >= date_start,
-                Order.order_date <= date_end
-            )
-        )
+        query = query.where(Order.day == day_of(date))
     
     result = await session.execute(query)
-    orders = list(result.scalars().all())
-    
-    total_amount = sum(order.total_amount for order in orders)
-    unique_users = len(set(order.user_id for order in orders))
+    total_orders, total_amount, unique_users = result.one()
     
     return {
-        "total_orders": len(orders),
-        "total_amount": total_amount,
-        "unique_users": unique_users,
-        "orders": orders
+        "total_orders": total_orders,
+        "total_amount": float(total_amount),
+        "unique_users": unique_users
     }
 
+@read_replica
 async def get_dish_statistics(session: AsyncSession, date: Optional[datetime] = None) -> List[Dict[str, Any]]:
-    query = select(OrderItem, Dish, Order)
-    query = query.join(Dish, OrderItem.dish_id == Dish.id)
-    query = query.join(Order, OrderItem.order_id == Order.id)
+    """
+    Статистика по блюдам: количество порций и выручка (без отмененных заказов)
     
-    if date:
-        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        query = query.where(
-            and_(
-                Order.order_date >= date_start,
-                Order.order_date <= date_end,
-                Order.status != OrderStatus.CANCELLED
-            )
-        )
-    else:
-        query = query.where(Order.status != OrderStatus.CANCELLED)
+    Args:
+        session: Сессия базы данных
+        date: Дата для статистики (опционально, если None - за все время)
     
-    result = await session.execute(query)
-    items = result.all()
+    Returns:
+        List со статистикой, отсортированный по количеству порций
+    """
+    quantity = func.sum(OrderItem.quantity)
+    query = (
+        select(
+            Dish.id,
+            Dish.name,
+            quantity,
+            func.sum(OrderItem.price * OrderItem.quantity)
+        )
+        .join(Dish, OrderItem.dish_id == Dish.id)
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(Order.status != OrderStatus.CANCELLED)
+        .group_by(Dish.id, Dish.name)
+        .order_by(quantity.desc(), Dish.id)
+    )
     
-    dish_stats = defaultdict(lambda: {"quantity": 0, "revenue": 0.0, "name": ""})
+    if date:
+        query = query.where(Order.day == day_of(date))
     
-    for order_item, dish, order in items:
-        dish_stats[dish.id]["name"] = dish.name
-        dish_stats[dish.id]["quantity"] += order_item.quantity
-        dish_stats[dish.id]["revenue"] += order_item.price * order_item.quantity
+    result = await session.execute(query)
     
-    stats_list = [
+    return [
         {
             "dish_id": dish_id,
-            "name": stats["name"],
-            "quantity": stats["quantity"],
-            "revenue": stats["revenue"]
+            "name": name,
+            "quantity": int(dish_quantity),
+            "revenue": float(revenue)
         }
-        for dish_id, stats in dish_stats.items()
+        for dish_id, name, dish_quantity, revenue in result.all()
     ]
-    
-    return sorted(stats_list, key=lambda x: x["quantity"], reverse=True)
 
+@read_replica
 async def get_user_statistics(session: AsyncSession, date: Optional[datetime] = None) -> List[Dict[str, Any]]:
-    query = select(Order, User)
-    query = query.join(User, Order.user_id == User.id)
+    """
+    Статистика по пользователям: количество заказов, сумма и средний чек
+    (без отмененных заказов)
     
-    if date:
-        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        query = query.where(
-            and_(
-                Order.order_date >= date_start,
-                Order.order_date <= date_end,
-                Order.status != OrderStatus.CANCELLED
-            )
-        )
-    else:
-        query = query.where(Order.status != OrderStatus.CANCELLED)
+    Args:
+        session: Сессия базы данных
+        date: Дата для статистики (опционально, если None - за все время)
     
-    result = await session.execute(query)
-    orders = result.all()
+    Returns:
+        List со статистикой, отсортированный по количеству заказов
+    """
+    orders_count = func.count(Order.id)
+    query = (
+        select(
+            User.id,
+            User.full_name,
+            User.username,
+            User.telegram_id,
+            orders_count,
+            func.sum(Order.total_amount)
+        )
+        .join(User, Order.user_id == User.id)
+        .where(Order.status != OrderStatus.CANCELLED)
+        .group_by(User.id, User.full_name, User.username, User.telegram_id)
+        .order_by(orders_count.desc(), User.id)
+    )
     
-    user_stats = defaultdict(lambda: {"orders_count": 0, "total_amount": 0.0, "name": ""})
+    if date:
+        query = query.where(Order.day == day_of(date))
     
-    for order, user in orders:
-        user_stats[user.id]["name"] = user.full_name or user.username or f"User {user.telegram_id}"
-        user_stats[user.id]["orders_count"] += 1
-        user_stats[user.id]["total_amount"] += order.total_amount
+    result = await session.execute(query)
     
-    stats_list = [
-        {
+    stats_list = []
+    for user_id, full_name, username, telegram_id, count, total_amount in result.all():
+        total_amount = float(total_amount or 0.0)
+        stats_list.append({
             "user_id": user_id,
-            "name": stats["name"],
-            "orders_count": stats["orders_count"],
-            "total_amount": stats["total_amount"],
-            "avg_order": stats["total_amount"] / stats["orders_count"] if stats["orders_count"] > 0 else 0
-        }
-        for user_id, stats in user_stats.items()
-    ]
+            "name": full_name or username or f"User {telegram_id}",
+            "orders_count": count,
+            "total_amount": total_amount,
+            "avg_order": total_amount / count if count > 0 else 0
+        })
     
-    return sorted(stats_list, key=lambda x: x["orders_count"], reverse=True)
+    return stats_list
 
+@read_replica
 async def get_cafe_report(session: AsyncSession, date: datetime, cafe_id: Optional[int] = None) -> Dict[str, Any]:
     """
     Генерирует отчет по заказам для кафе
@@ -126,19 +145,13 @@ async def get_cafe_report(session: AsyncSession, date: datetime, cafe_id: Option
     Returns:
         Dict с данными отчета по кафе
     """
-    date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-    date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
     query = select(Order).options(
         selectinload(Order.user),
         selectinload(Order.items).selectinload(OrderItem.dish),
         selectinload(Order.cafe)
     ).where(
-        and_(
-            Order.order_date >= date_start,
-            Order.order_date <= date_end,
-            Order.status != OrderStatus.CANCELLED
-        )
+        Order.day == day_of(date),
+        Order.status != OrderStatus.CANCELLED
     )
     
     if cafe_id:
@@ -205,10 +218,197 @@ async def get_cafe_report(session: AsyncSession, date: datetime, cafe_id: Option
         "total_items": sum(r["total_items"] for r in cafe_reports)
     }
 
+@read_replica
+async def get_rollup_summary(session: AsyncSession, date_from: Optional[date] = None,
+                             date_to: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Сводка по неотмененным заказам за [date_from, date_to) по дневным агрегатам
+    
+    Args:
+        session: Сессия базы данных
+        date_from: Первый день периода (включительно, опционально)
+        date_to: День, следующий за последним днем периода (опционально)
+    
+    Returns:
+        Dict со сводкой в формате get_orders_summary
+    """
+    result = await session.execute(
+        select(
+            func.coalesce(func.sum(DailyUserStats.orders_count), 0),
+            func.coalesce(func.sum(DailyUserStats.total_amount), 0.0),
+            func.count(func.distinct(DailyUserStats.user_id))
+        ).where(
+            DailyUserStats.orders_count > 0,
+            *rollup_day_conditions(DailyUserStats, date_from, date_to)
+        )
+    )
+    total_orders, total_amount, unique_users = result.one()
+    
+    return {
+        "total_orders": int(total_orders),
+        "total_amount": float(total_amount),
+        "unique_users": unique_users
+    }
+
+def month_range(year: int, month: int) -> Tuple[date, date]:
+    """
+    Полуинтервал [первый день месяца, первый день следующего месяца)
+    """
+    date_from = date(year, month, 1)
+    date_to = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return date_from, date_to
+
+def quarter_range(year: int, quarter: int) -> Tuple[date, date]:
+    """
+    Полуинтервал [первый день квартала, первый день следующего квартала)
+    """
+    if quarter not in (1, 2, 3, 4):
+        raise ValueError(f"Некорректный номер квартала: {quarter}")
+    
+    first_month = 3 * (quarter - 1) + 1
+    date_from, _ = month_range(year, first_month)
+    _, date_to = month_range(year, first_month + 2)
+    return date_from, date_to
+
+@read_replica
+async def get_period_report(session: AsyncSession, date_from: date, date_to: date) -> Dict[str, Any]:
+    """
+    Отчет по неотмененным заказам за [date_from, date_to) с разбивкой по дням
+    
+    Итоги по дням и за весь период (включая число уникальных пользователей
+    за период, которое нельзя получить суммированием дневных значений)
+    считаются одним запросом по дневным агрегатам. Подходит для недели,
+    месяца, квартала и любого другого диапазона.
+    
+    Args:
+        session: Сессия базы данных
+        date_from: Первый день периода (включительно)
+        date_to: День, следующий за последним днем периода
+    
+    Returns:
+        Dict с итогами за период и списком итогов по дням (только дни с заказами)
+    """
+    conditions = [
+        DailyUserStats.orders_count > 0,
+        *rollup_day_conditions(DailyUserStats, date_from, date_to)
+    ]
+    totals = (
+        func.coalesce(func.sum(DailyUserStats.orders_count), 0),
+        func.coalesce(func.sum(DailyUserStats.total_amount), 0.0),
+        func.count(func.distinct(DailyUserStats.user_id))
+    )
+    by_day = (
+        select(DailyUserStats.day, *totals)
+        .where(*conditions)
+        .group_by(DailyUserStats.day)
+    )
+    period = select(literal(None, Date), *totals).where(*conditions)
+    
+    result = await session.execute(union_all(by_day, period))
+    
+    report = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "total_orders": 0,
+        "total_amount": 0.0,
+        "unique_users": 0,
+        "days": []
+    }
+    for day, total_orders, total_amount, unique_users in result.all():
+        row = {
+            "total_orders": int(total_orders),
+            "total_amount": float(total_amount),
+            "unique_users": unique_users
+        }
+        if day is None:
+            report.update(row)
+        else:
+            report["days"].append({"day": day, **row})
+    
+    report["days"].sort(key=lambda d: d["day"])
+    return report
+
+@read_replica
+async def get_rollup_dish_statistics(session: AsyncSession, date_from: Optional[date] = None,
+                                     date_to: Optional[date] = None,
+                                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Статистика по блюдам за [date_from, date_to) по дневным агрегатам
+    
+    Returns:
+        List в формате get_dish_statistics
+    """
+    quantity = func.sum(DailyDishStats.quantity)
+    query = (
+        select(Dish.id, Dish.name, quantity, func.sum(DailyDishStats.revenue))
+        .join(Dish, DailyDishStats.dish_id == Dish.id)
+        .where(*rollup_day_conditions(DailyDishStats, date_from, date_to))
+        .group_by(Dish.id, Dish.name)
+        .having(quantity > 0)
+        .order_by(quantity.desc(), Dish.id)
+    )
+    if limit:
+        query = query.limit(limit)
+    
+    result = await session.execute(query)
+    
+    return [
+        {
+            "dish_id": dish_id,
+            "name": name,
+            "quantity": int(dish_quantity),
+            "revenue": float(revenue)
+        }
+        for dish_id, name, dish_quantity, revenue in result.all()
+    ]
+
+@read_replica
+async def get_rollup_user_statistics(session: AsyncSession, date_from: Optional[date] = None,
+                                     date_to: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Статистика по пользователям за [date_from, date_to) по дневным агрегатам
+    
+    Returns:
+        List в формате get_user_statistics
+    """
+    orders_count = func.sum(DailyUserStats.orders_count)
+    result = await session.execute(
+        select(
+            User.id,
+            User.full_name,
+            User.username,
+            User.telegram_id,
+            orders_count,
+            func.sum(DailyUserStats.total_amount)
+        )
+        .join(User, DailyUserStats.user_id == User.id)
+        .where(*rollup_day_conditions(DailyUserStats, date_from, date_to))
+        .group_by(User.id, User.full_name, User.username, User.telegram_id)
+        .having(orders_count > 0)
+        .order_by(orders_count.desc(), User.id)
+    )
+    
+    stats_list = []
+    for user_id, full_name, username, telegram_id, count, total_amount in result.all():
+        total_amount = float(total_amount or 0.0)
+        stats_list.append({
+            "user_id": user_id,
+            "name": full_name or username or f"User {telegram_id}",
+            "orders_count": int(count),
+            "total_amount": total_amount,
+            "avg_order": total_amount / count if count > 0 else 0
+        })
+    
+    return stats_list
+
+@read_replica
 async def get_user_personal_statistics(session: AsyncSession, user_id: int, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Получает личную статистику пользователя
     
+    Итоги берутся из дневных агрегатов, топ блюд - одним GROUP BY запросом
+    по заказам пользователя.
+    
     Args:
         session: Сессия базы данных
         user_id: ID пользователя
@@ -218,60 +418,64 @@ async def get_user_personal_statistics(session: AsyncSession, user_id: int, date
     Returns:
         Dict с личной статистикой пользователя
     """
-    query = select(Order).options(
-        selectinload(Order.items).selectinload(OrderItem.dish)
-    ).where(
-        and_(
+    day_from = day_of(date_from)
+    day_to = day_of(date_to) + timedelta(days=1) if date_to else None
+    
+    totals_result = await session.execute(
+        select(
+            func.coalesce(func.sum(DailyUserStats.orders_count), 0),
+            func.coalesce(func.sum(DailyUserStats.total_amount), 0.0),
+            func.coalesce(func.sum(DailyUserStats.items_count), 0)
+        ).where(
+            DailyUserStats.user_id == user_id,
+            *rollup_day_conditions(DailyUserStats, day_from, day_to)
+        )
+    )
+    orders_count, total_amount, total_items = totals_result.one()
+    orders_count = int(orders_count)
+    total_amount = float(total_amount)
+    
+    count = func.sum(OrderItem.quantity)
+    dishes_query = (
+        select(Dish.id, Dish.name, count, func.sum(OrderItem.price * OrderItem.quantity))
+        .join(Order, OrderItem.order_id == Order.id)
+        .join(Dish, OrderItem.dish_id == Dish.id)
+        .where(
             Order.user_id == user_id,
-            Order.status != OrderStatus.CANCELLED
+            Order.status != OrderStatus.CANCELLED,
+            # Тот же период [day_from, day_to), что и у итогов из агрегатов
+            *order_date_conditions(day_from, day_to)
         )
+        .group_by(Dish.id, Dish.name)
+        .order_by(count.desc(), Dish.id)
+        .limit(5)
     )
     
-    if date_from:
-        query = query.where(Order.order_date >= date_from)
-    if date_to:
-        query = query.where(Order.order_date <= date_to)
-    
-    result = await session.execute(query)
-    orders = list(result.scalars().all())
-    
-    total_amount = sum(order.total_amount for order in orders)
-    total_items = sum(sum(item.quantity for item in order.items) for order in orders)
+    dishes_result = await session.execute(dishes_query)
+    top_dishes = [
+        {
+            "dish_id": dish_id,
+            "name": name,
+            "count": int(dish_count),
+            "total_amount": float(dish_amount)
+        }
+        for dish_id, name, dish_count, dish_amount in dishes_result.all()
+    ]
     
-    favorite_dishes = defaultdict(lambda: {"name": "", "count": 0, "total_amount": 0.0})
-    for order in orders:
-        for item in order.items:
-            favorite_dishes[item.dish_id]["name"] = item.dish.name
-            favorite_dishes[item.dish_id]["count"] += item.quantity
-            favorite_dishes[item.dish_id]["total_amount"] += item.price * item.quantity
-    
-    top_dishes = sorted(
-        [
-            {
-                "dish_id": dish_id,
-                "name": stats["name"],
-                "count": stats["count"],
-                "total_amount": stats["total_amount"]
-            }
-            for dish_id, stats in favorite_dishes.items()
-        ],
-        key=lambda x: x["count"],
-        reverse=True
-    )[:5]
-    
-    avg_order = total_amount / len(orders) if len(orders) > 0 else 0
+    avg_order = total_amount / orders_count if orders_count > 0 else 0
     
     return {
         "user_id": user_id,
-        "orders_count": len(orders),
+        "orders_count": orders_count,
         "total_amount": total_amount,
-        "total_items": total_items,
+        "total_items": int(total_items),
         "avg_order": avg_order,
         "top_dishes": top_dishes,
         "date_from": date_from,
         "date_to": date_to
     }
 
+@read_replica
 async def get_popular_dishes(session: AsyncSession, limit: int = 5) -> List[Dict[str, Any]]:
     """
     Получает топ популярных блюд на основе количества заказов
@@ -283,13 +487,52 @@ async def get_popular_dishes(session: AsyncSession, limit: int = 5) -> List[Dict
     Returns:
         List с популярными блюдами
     """
-    stats = await get_dish_statistics(session, date=None)
-    return stats[:limit]
-
-
-
-
-
-
-
+    return await get_rollup_dish_statistics(session, limit=limit)
 
+async def stream_order_export_rows(session: AsyncSession, date_from: date, date_to: date) -> AsyncIterator[list]:
+    """
+    Строки выгрузки заказов за [date_from, date_to) прямо из курсора БД
+    
+    Позиции заказа приходят отдельными строками, отсортированными по
+    заказу, и собираются в одну строку выгрузки; в памяти держится
+    только текущий заказ и пачка курсора.
+    
+    Args:
+        session: Сессия базы данных
+        date_from: Первый день периода (включительно)
+        date_to: День, следующий за последним днем периода
+    
+    Yields:
+        list: ID, пользователь, дата, статус, сумма, блюда
+    """
+    result = await session.stream(
+        select(
+            Order.id, User.full_name, User.username, User.telegram_id, Order.order_date,
+            Order.status, Order.total_amount, Dish.name, OrderItem.quantity
+        )
+        .join(User, Order.user_id == User.id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Dish, OrderItem.dish_id == Dish.id)
+        .where(*day_range_conditions(Order.day, date_from, date_to))
+        .order_by(Order.id, OrderItem.id)
+        .execution_options(yield_per=settings.EXPORT_CHUNK_ROWS)
+    )
+    
+    current = None
+    dishes: List[str] = []
+    async for order_id, full_name, username, telegram_id, order_date, status, total_amount, dish_name, quantity in result:
+        if current is None or current[0] != order_id:
+            if current is not None:
+                yield current + [", ".join(dishes)]
+            current = [
+                order_id,
+                full_name or username or f"ID {telegram_id}",
+                order_date.strftime('%d.%m.%Y'),
+                status.value,
+                total_amount
+            ]
+            dishes = []
+        if dish_name is not None:
+            dishes.append(f"{dish_name} x{quantity}")
+    if current is not None:
+        yield current + [", ".join(dishes)]
@@ -0,0 +1,243 @@
+"""
+Сервис дневных агрегатов (rollup) по блюдам, пользователям и кафе
+Агрегаты учитывают только неотмененные заказы и обновляются в той же
+транзакции, что и изменения заказов в order_service
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.dialects import sqlite, postgresql
+from datetime import date
+from collections import defaultdict
+from models.order import Order, OrderItem, OrderStatus
+from models.daily_stats import DailyDishStats, DailyUserStats, DailyCafeStats
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+from utils.dates import day_range_conditions
+
+_ROLLUPS = (
+    (DailyDishStats, ("day", "dish_id"), ("quantity", "revenue")),
+    (DailyUserStats, ("day", "user_id"), ("orders_count", "total_amount", "items_count")),
+    (DailyCafeStats, ("day", "cafe_id"), ("orders_count", "total_amount", "items_count")),
+)
+
+def order_snapshot(order: Order, items: Optional[Iterable[OrderItem]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Снимок вклада заказа в агрегаты
+
+    Args:
+        order: Заказ
+        items: Позиции заказа (по умолчанию order.items)
+
+    Returns:
+        Dict со снимком или None, если заказ отменен
+    """
+    if order.status == OrderStatus.CANCELLED:
+        return None
+
+    return {
+        "day": order.order_date.date(),
+        "user_id": order.user_id,
+        "cafe_id": order.cafe_id or 0,
+        "total_amount": order.total_amount or 0.0,
+        "items": [
+            (item.dish_id, item.quantity, item.price)
+            for item in (order.items if items is None else items)
+        ]
+    }
+
+def _add_snapshot(deltas: Dict[Any, Dict], snapshot: Optional[Dict[str, Any]], sign: int) -> None:
+    if snapshot is None:
+        return
+
+    day = snapshot["day"]
+    items_count = sum(quantity for _, quantity, _ in snapshot["items"])
+
+    for dish_id, quantity, price in snapshot["items"]:
+        dish_delta = deltas[DailyDishStats][(day, dish_id)]
+        dish_delta["quantity"] += sign * quantity
+        dish_delta["revenue"] += sign * price * quantity
+
+    for model, key in ((DailyUserStats, snapshot["user_id"]), (DailyCafeStats, snapshot["cafe_id"])):
+        delta = deltas[model][(day, key)]
+        delta["orders_count"] += sign
+        delta["total_amount"] += sign * snapshot["total_amount"]
+        delta["items_count"] += sign * items_count
+
+async def _increment_rows(session: AsyncSession, model, key_columns: Tuple[str, ...],
+                          rows: List[Dict[str, Any]]) -> None:
+    value_columns = [c for c in rows[0] if c not in key_columns]
+    dialect = session.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(model).values(rows)
+        table = model.__table__
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={c: table.c[c] + stmt.excluded[c] for c in value_columns}
+        )
+        await session.execute(stmt)
+        return
+
+    for row in rows:
+        existing = await session.get(model, tuple(row[c] for c in key_columns))
+        if existing:
+            for c in value_columns:
+                setattr(existing, c, getattr(existing, c) + row[c])
+        else:
+            session.add(model(**row))
+
+async def apply_order_change(session: AsyncSession, before: Optional[Dict[str, Any]],
+                             after: Optional[Dict[str, Any]]) -> None:
+    """
+    Применяет к агрегатам разницу между двумя снимками заказа
+    Коммит не выполняется - изменения попадают в текущую транзакцию
+
+    Args:
+        session: Сессия базы данных
+        before: Снимок до изменения (None - заказа не было или он отменен)
+        after: Снимок после изменения (None - заказ удален или отменен)
+    """
+    deltas: Dict[Any, Dict] = {
+        model: defaultdict(lambda value_columns=value_columns: dict.fromkeys(value_columns, 0))
+        for model, _, value_columns in _ROLLUPS
+    }
+    _add_snapshot(deltas, before, -1)
+    _add_snapshot(deltas, after, 1)
+
+    for model, key_columns, _ in _ROLLUPS:
+        rows = [
+            {**dict(zip(key_columns, key)), **values}
+            for key, values in deltas[model].items()
+            if any(values.values())
+        ]
+        if rows:
+            await _increment_rows(session, model, key_columns, rows)
+
+def order_date_conditions(date_from: Optional[date], date_to: Optional[date]) -> list:
+    """Условия на день заказа для дней [date_from, date_to)"""
+    return day_range_conditions(Order.day, date_from, date_to)
+
+def rollup_day_conditions(model, date_from: Optional[date], date_to: Optional[date]) -> list:
+    return day_range_conditions(model.day, date_from, date_to)
+
+async def compute_rollups_from_orders(session: AsyncSession, date_from: Optional[date] = None,
+                                      date_to: Optional[date] = None) -> Dict[Any, Dict]:
+    """
+    Считает агрегаты по сырым данным orders/order_items за [date_from, date_to)
+
+    Returns:
+        Dict {модель: {ключ: {колонка: значение}}}
+    """
+    day = Order.day
+    conditions = [Order.status != OrderStatus.CANCELLED, *order_date_conditions(date_from, date_to)]
+    computed: Dict[Any, Dict] = {model: {} for model, _, _ in _ROLLUPS}
+
+    dish_result = await session.execute(
+        select(day, OrderItem.dish_id, func.sum(OrderItem.quantity), func.sum(OrderItem.price * OrderItem.quantity))
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(*conditions)
+        .group_by(day, OrderItem.dish_id)
+    )
+    for dish_day, dish_id, quantity, revenue in dish_result.all():
+        computed[DailyDishStats][(dish_day, dish_id)] = {"quantity": int(quantity), "revenue": float(revenue)}
+
+    items_per_order = (
+        select(OrderItem.order_id, func.sum(OrderItem.quantity).label("quantity"))
+        .group_by(OrderItem.order_id)
+        .subquery()
+    )
+    items_count = func.coalesce(func.sum(items_per_order.c.quantity), 0)
+    for model, key_column in ((DailyUserStats, Order.user_id), (DailyCafeStats, func.coalesce(Order.cafe_id, 0))):
+        result = await session.execute(
+            select(day, key_column, func.count(Order.id), func.sum(Order.total_amount), items_count)
+            .outerjoin(items_per_order, items_per_order.c.order_id == Order.id)
+            .where(*conditions)
+            .group_by(day, key_column)
+        )
+        for row_day, key, orders_count, total_amount, items in result.all():
+            computed[model][(row_day, key)] = {
+                "orders_count": orders_count,
+                "total_amount": float(total_amount or 0.0),
+                "items_count": int(items)
+            }
+
+    return computed
+
+async def rebuild_daily_rollups(session: AsyncSession, date_from: Optional[date] = None,
+                                date_to: Optional[date] = None) -> Dict[str, int]:
+    """
+    Пересчитывает агрегаты за [date_from, date_to) по сырым данным (backfill)
+
+    Returns:
+        Dict {имя таблицы: количество записанных строк}
+    """
+    computed = await compute_rollups_from_orders(session, date_from, date_to)
+
+    written = {}
+    for model, key_columns, _ in _ROLLUPS:
+        await session.execute(delete(model).where(*rollup_day_conditions(model, date_from, date_to)))
+        rows = [
+            {**dict(zip(key_columns, key)), **values}
+            for key, values in computed[model].items()
+        ]
+        if rows:
+            await session.execute(insert(model), rows)
+        written[model.__tablename__] = len(rows)
+
+    await session.commit()
+    return written
+
+async def backfill_rollups_if_empty(session: AsyncSession) -> bool:
+    """
+    Заполняет агрегаты по всем заказам, если таблицы агрегатов пусты, а заказы есть
+
+    Нужно при обновлении существующей базы: отчеты читают только агрегаты
+    и без пересчета показывали бы нулевую статистику.
+
+    Returns:
+        bool: True, если агрегаты были пересчитаны
+    """
+    for model, _, _ in _ROLLUPS:
+        if await session.scalar(select(model.day).limit(1)) is not None:
+            return False
+
+    has_orders = await session.scalar(
+        select(Order.id).where(Order.status != OrderStatus.CANCELLED).limit(1)
+    )
+    if has_orders is None:
+        return False
+
+    await rebuild_daily_rollups(session)
+    return True
+
+async def check_rollup_consistency(session: AsyncSession, date_from: Optional[date] = None,
+                                   date_to: Optional[date] = None) -> List[str]:
+    """
+    Сравнивает агрегаты с сырыми данными за [date_from, date_to)
+
+    Returns:
+        List с описанием расхождений (пустой, если агрегаты согласованы)
+    """
+    computed = await compute_rollups_from_orders(session, date_from, date_to)
+
+    mismatches = []
+    for model, key_columns, value_columns in _ROLLUPS:
+        result = await session.execute(select(model).where(*rollup_day_conditions(model, date_from, date_to)))
+        stored = {}
+        for row in result.scalars().all():
+            values = {c: getattr(row, c) for c in value_columns}
+            if any(abs(v) > 1e-6 for v in values.values()):
+                stored[tuple(getattr(row, c) for c in key_columns)] = values
+
+        expected = computed[model]
+        for key in sorted(set(stored) | set(expected), key=str):
+            stored_values = stored.get(key, dict.fromkeys(value_columns, 0))
+            expected_values = expected.get(key, dict.fromkeys(value_columns, 0))
+            for c in value_columns:
+                if abs(stored_values[c] - expected_values[c]) > 1e-6:
+                    mismatches.append(
+                        f"{model.__tablename__} {dict(zip(key_columns, key))}: "
+                        f"{c} = {stored_values[c]}, ожидалось {expected_values[c]}"
+                    )
+
+    return mismatches
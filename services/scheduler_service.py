@@ -3,32 +3,38 @@ from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
 from aiogram import Bot
 from database.database import get_session
-from services.order_service import get_user_orders, get_all_orders
-from services.user_service import get_all_users, is_admin
-from services.report_service import get_orders_summary, get_dish_statistics, get_user_statistics, get_cafe_report
+from services.order_service import get_user_orders
+from services.user_service import get_manager_telegram_ids
+from services.broadcast_service import broadcaster
+from services.outbox_service import outbox_dispatcher
+from services.file_cache_service import file_id_cache, report_digest
+from services.report_service import get_rollup_summary, get_rollup_dish_statistics, get_rollup_user_statistics, get_period_report, get_cafe_report
 from services.cafe_service import get_all_cafes
-from services.notification_service import notify_user_about_order_change
-from utils.export_service import export_statistics_to_excel
-from models.order import OrderStatus
+from services.reminder_service import refresh_deadline_reminders
+from utils.export_service import export_statistics_to_excel, run_export
+from utils.metrics import instrument_scheduler
+from utils.dates import start_of_day
+from database.query_monitor import count_statements
 from config.settings import settings
 from loguru import logger
 from aiogram.types import BufferedInputFile
 
 scheduler = AsyncIOScheduler()
+instrument_scheduler(scheduler)
 
+@count_statements("job daily_cafe_reports", budget=0)
 async def send_daily_cafe_reports(bot: Bot):
     """
     Отправляет ежедневные отчеты по кафе офис-менеджерам
     Генерирует отдельный отчет для каждого кафе с группировкой заказов
     Выполняется автоматически по расписанию (настраивается в settings)
     """
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    today = start_of_day(datetime.now())
     
     async for session in get_session():
-        users = await get_all_users(session)
-        admin_users = [u for u in users if await is_admin(session, u.telegram_id)]
+        admin_ids = await get_manager_telegram_ids(session)
         
-        if not admin_users:
+        if not admin_ids:
             return
         
         cafes = await get_all_cafes(session, active_only=True)
@@ -39,11 +45,9 @@ async def send_daily_cafe_reports(bot: Bot):
                 f"📊 Отчет по заказам на {today.strftime('%d.%m.%Y')}\n\n"
                 f"На сегодня заказов нет."
             )
-            for admin in admin_users:
-                try:
-                    await bot.send_message(admin.telegram_id, report_text)
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке отчета админу {admin.telegram_id}: {e}")
+            await broadcaster.broadcast(
+                admin_ids, lambda chat_id: bot.send_message(chat_id, report_text), name="daily_cafe_reports"
+            )
             return
         
         for cafe_data in cafe_report["cafes"]:
@@ -74,30 +78,32 @@ async def send_daily_cafe_reports(bot: Bot):
                     report_text += f"   {delivery_type_text}\n"
                 report_text += f"   💰 Сумма: {order_detail['total']:.0f} ₽\n\n"
             
-            for admin in admin_users:
-                try:
-                    await bot.send_message(admin.telegram_id, report_text, parse_mode="HTML")
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке отчета по кафе админу {admin.telegram_id}: {e}")
+            await broadcaster.broadcast(
+                admin_ids,
+                lambda chat_id, text=report_text: bot.send_message(chat_id, text, parse_mode="HTML"),
+                name="daily_cafe_reports"
+            )
 
+@count_statements("job daily_report", budget=0)
 async def send_daily_report(bot: Bot):
     """
     Отправляет ежедневный отчет администраторам
     Включает сводку заказов, статистику по блюдам и пользователям
     Выполняется автоматически по расписанию (настраивается в settings)
     """
-    yesterday = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    yesterday = start_of_day(datetime.now()) - timedelta(days=1)
     
     async for session in get_session():
-        users = await get_all_users(session)
-        admin_users = [u for u in users if await is_admin(session, u.telegram_id)]
+        admin_ids = await get_manager_telegram_ids(session)
         
-        if not admin_users:
+        if not admin_ids:
             return
         
-        summary = await get_orders_summary(session, yesterday)
-        dishes = await get_dish_statistics(session, yesterday)
-        users_stats = await get_user_statistics(session, yesterday)
+        day_from = yesterday.date()
+        day_to = day_from + timedelta(days=1)
+        summary = await get_rollup_summary(session, day_from, day_to)
+        dishes = await get_rollup_dish_statistics(session, day_from, day_to)
+        users_stats = await get_rollup_user_statistics(session, day_from, day_to)
         
         report_text = (
             f"📊 Ежедневный отчет за {yesterday.strftime('%d.%m.%Y')}\n\n"
@@ -112,19 +118,31 @@ async def send_daily_report(bot: Bot):
             "users": users_stats
         }
         
-        excel_file = export_statistics_to_excel(stats_data)
-        file = BufferedInputFile(
-            excel_file.read(),
-            filename=f"daily_report_{yesterday.strftime('%Y-%m-%d')}.xlsx"
-        )
+        report_key = f"daily_report:{day_from.isoformat()}"
+        digest = report_digest(report_key, stats_data)
         
-        for admin in admin_users:
-            try:
-                await bot.send_message(admin.telegram_id, report_text)
-                await bot.send_document(admin.telegram_id, file, caption=f"📊 Отчет за {yesterday.strftime('%d.%m.%Y')}")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке ежедневного отчета админу {admin.telegram_id}: {e}")
+        async def build_file():
+            excel_file = await run_export(export_statistics_to_excel, stats_data)
+            return BufferedInputFile(
+                excel_file.read(),
+                filename=f"daily_report_{yesterday.strftime('%Y-%m-%d')}.xlsx"
+            )
+        
+        # Текст и файл - отдельные рассылки, чтобы повтор не дублировал уже доставленное
+        await broadcaster.broadcast(
+            admin_ids, lambda chat_id: bot.send_message(chat_id, report_text), name="daily_report"
+        )
+        # Файл загружается один раз, остальным администраторам уходит его file_id
+        await broadcaster.broadcast(
+            admin_ids,
+            lambda chat_id: file_id_cache.send_document(
+                bot, chat_id, report_key, digest, build_file,
+                caption=f"📊 Отчет за {yesterday.strftime('%d.%m.%Y')}"
+            ),
+            name="daily_report_file"
+        )
 
+@count_statements("job weekly_report", budget=0)
 async def send_weekly_report(bot: Bot):
     """
     Отправляет еженедельный отчет администраторам
@@ -133,97 +151,44 @@ async def send_weekly_report(bot: Bot):
     """
     today = datetime.now()
     week_start = today - timedelta(days=today.weekday())
-    week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
+    week_start = start_of_day(week_start)
     
     async for session in get_session():
-        users = await get_all_users(session)
-        admin_users = [u for u in users if await is_admin(session, u.telegram_id)]
+        admin_ids = await get_manager_telegram_ids(session)
         
-        if not admin_users:
+        if not admin_ids:
             return
         
-        total_orders = 0
-        total_amount = 0.0
-        unique_users_set = set()
-        
-        for day_offset in range(7):
-            date = week_start + timedelta(days=day_offset)
-            summary = await get_orders_summary(session, date)
-            total_orders += summary['total_orders']
-            total_amount += summary['total_amount']
-            for order in summary['orders']:
-                unique_users_set.add(order.user_id)
+        report = await get_period_report(session, week_start.date(), week_start.date() + timedelta(days=7))
         
         report_text = (
             f"📊 Еженедельный отчет\n"
             f"Период: {week_start.strftime('%d.%m.%Y')} - {(week_start + timedelta(days=6)).strftime('%d.%m.%Y')}\n\n"
-            f"Всего заказов: {total_orders}\n"
-            f"Уникальных пользователей: {len(unique_users_set)}\n"
-            f"Общая сумма: {total_amount:.0f} ₽"
+            f"Всего заказов: {report['total_orders']}\n"
+            f"Уникальных пользователей: {report['unique_users']}\n"
+            f"Общая сумма: {report['total_amount']:.0f} ₽"
         )
         
-        for admin in admin_users:
-            try:
-                await bot.send_message(admin.telegram_id, report_text)
-            except Exception as e:
-                logger.error(f"Ошибка при отправке еженедельного отчета админу {admin.telegram_id}: {e}")
-
-async def check_deadline_reminders(bot: Bot):
-    """
-    Проверяет и отправляет напоминания о дедлайне заказа
-    Отправляет напоминания за 1 час и за 30 минут до дедлайна
-    Выполняется каждую минуту для проверки текущего времени
-    """
-    now = datetime.now()
-    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    deadline_time = today.replace(
-        hour=settings.ORDER_DEADLINE_HOUR,
-        minute=settings.ORDER_DEADLINE_MINUTE,
-        second=0,
-        microsecond=0
-    )
-    
-    reminder_1h = deadline_time - timedelta(hours=1)
-    reminder_30m = deadline_time - timedelta(minutes=30)
-    
-    should_send_1h = (now.hour == reminder_1h.hour and now.minute == reminder_1h.minute)
-    should_send_30m = (now.hour == reminder_30m.hour and now.minute == reminder_30m.minute)
-    
-    if not (should_send_1h or should_send_30m):
-        return
-    
-    async for session in get_session():
-        all_orders = await get_all_orders(session, today)
-        today_orders = [o for o in all_orders if o.status == OrderStatus.PENDING and o.order_date.date() == today.date()]
-        
-        for order in today_orders:
-            try:
-                if should_send_1h:
-                    message = (
-                        f"⏰ Напоминание!\n\n"
-                        f"До дедлайна заказа остался 1 час.\n"
-                        f"Ваш заказ на {order.order_date.strftime('%d.%m.%Y')} будет принят до {settings.ORDER_DEADLINE_HOUR:02d}:{settings.ORDER_DEADLINE_MINUTE:02d}.\n\n"
-                        f"Для просмотра заказа используйте /orders"
-                    )
-                    await notify_user_about_order_change(bot, order.user.telegram_id, message)
-                
-                elif should_send_30m:
-                    message = (
-                        f"⏰ Напоминание!\n\n"
-                        f"До дедлайна заказа осталось 30 минут!\n"
-                        f"Ваш заказ на {order.order_date.strftime('%d.%m.%Y')} будет принят до {settings.ORDER_DEADLINE_HOUR:02d}:{settings.ORDER_DEADLINE_MINUTE:02d}.\n\n"
-                        f"Для просмотра заказа используйте /orders"
-                    )
-                    await notify_user_about_order_change(bot, order.user.telegram_id, message)
-            except Exception as e:
-                logger.error(f"Ошибка при отправке напоминания для заказа {order.id}: {e}")
+        if report['days']:
+            report_text += "\n\nПо дням:\n"
+            for day_report in report['days']:
+                report_text += (
+                    f"• {day_report['day'].strftime('%d.%m')}: {day_report['total_orders']} заказов, "
+                    f"{day_report['total_amount']:.0f} ₽\n"
+                )
+        
+        await broadcaster.broadcast(
+            admin_ids, lambda chat_id: bot.send_message(chat_id, report_text), name="weekly_report"
+        )
 
 def setup_scheduler(bot: Bot):
+    # Напоминания о дедлайне - одноразовые задачи на точное время;
+    # план на сегодня и завтра строится при запуске и каждую ночь
     scheduler.add_job(
-        check_deadline_reminders,
-        trigger=CronTrigger(minute="*"),
-        args=[bot],
+        refresh_deadline_reminders,
+        CronTrigger(hour=0, minute=1),
         id="deadline_reminders",
+        next_run_time=datetime.now(),
         replace_existing=True
     )
     
@@ -251,5 +216,12 @@ def setup_scheduler(bot: Bot):
         replace_existing=True
     )
     
+    scheduler.add_job(
+        outbox_dispatcher.purge_sent,
+        CronTrigger(hour=3, minute=0),
+        id="outbox_purge",
+        replace_existing=True
+    )
+    
     scheduler.start()
     logger.info("Планировщик задач запущен")
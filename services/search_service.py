@@ -0,0 +1,63 @@
+"""
+Поиск блюд по названию и описанию
+
+Запросы идут через индекс database.search_index: в SQLite - MATCH по
+FTS5-таблице dish_search, в PostgreSQL - ILIKE, который использует
+триграммные индексы. Строки короче трех символов триграмм не дают и
+ищутся обычным ILIKE.
+"""
+from sqlalchemy import Integer, Select, column, literal_column, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.search_index import FTS_TABLE, SQLITE_TRIGRAM
+from models.dish import Dish
+from typing import List
+
+MIN_INDEXED_LENGTH = 3
+
+_fts_table = table(FTS_TABLE, column("rowid", Integer))
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def matching_dish_ids(session: AsyncSession, text: str) -> Select:
+    """
+    Подзапрос id блюд, в названии или описании которых есть text
+
+    Args:
+        session: Сессия, в которой выполнится запрос (по ней выбирается диалект)
+        text: Искомая подстрока
+
+    Returns:
+        Select: SELECT id блюд для IN / EXISTS во внешнем запросе
+    """
+    text = text.strip()
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite" and SQLITE_TRIGRAM and len(text) >= MIN_INDEXED_LENGTH:
+        phrase = '"' + text.replace('"', '""') + '"'
+        return select(_fts_table.c.rowid).where(literal_column(FTS_TABLE).op("MATCH")(phrase))
+
+    pattern = f"%{_escape_like(text)}%"
+    return select(Dish.id).where(or_(
+        Dish.name.ilike(pattern, escape="\\"),
+        Dish.description.ilike(pattern, escape="\\")
+    ))
+
+async def search_dishes(session: AsyncSession, text: str, limit: int = 20) -> List[Dish]:
+    """
+    Поиск блюд каталога по названию и описанию
+
+    Args:
+        session: Сессия базы данных
+        text: Искомая подстрока
+        limit: Максимум блюд в ответе
+
+    Returns:
+        list[Dish]: Найденные блюда по названию
+    """
+    result = await session.execute(
+        select(Dish)
+        .where(Dish.id.in_(matching_dish_ids(session, text)))
+        .order_by(Dish.name)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
@@ -3,7 +3,7 @@ from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from models.user import User, UserRole
 from config.settings import settings
-from typing import Optional, List, Any
+from typing import Optional, List, Any, NamedTuple
 
 async def get_or_create_user(
     session: AsyncSession, 
@@ -33,11 +33,19 @@ async def get_or_create_user(
             if not user:
                 raise
     else:
+        changed = False
         if username and user.username != username:
             user.username = username
+            changed = True
         if full_name and user.full_name != full_name:
             user.full_name = full_name
-        await session.commit()
+            changed = True
+        if user.is_blocked:
+            # Пользователь снова пишет боту - значит, разблокировал его
+            user.is_blocked = False
+            changed = True
+        if changed:
+            await session.commit()
     
     return user
 
@@ -54,10 +62,41 @@ async def is_manager(session: AsyncSession, telegram_id: int) -> bool:
 async def is_admin(session: AsyncSession, telegram_id: int) -> bool:
     return await is_manager(session, telegram_id)
 
+async def get_manager_telegram_ids(session: AsyncSession) -> List[int]:
+    result = await session.execute(select(User.telegram_id).where(User.role == UserRole.MANAGER))
+    return list(result.scalars().all())
+
 async def get_all_users(session: AsyncSession) -> List[User]:
     result = await session.execute(select(User).order_by(User.created_at.desc()))
     return list(result.scalars().all())
 
+class UserRow(NamedTuple):
+    """Пользователь в списке: столбцы, которые показывают экраны списков"""
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    full_name: Optional[str]
+    office_name: Optional[str]
+    
+    @property
+    def display_name(self) -> str:
+        return self.full_name or self.username or f"ID: {self.telegram_id}"
+
+async def get_user_rows(session: AsyncSession) -> List[UserRow]:
+    """
+    Пользователи для экранов списков (новые первые) одним запросом
+    
+    Returns:
+        list[UserRow]: Строки пользователей с названием офиса
+    """
+    from models.office import Office
+    result = await session.execute(
+        select(User.id, User.telegram_id, User.username, User.full_name, Office.name)
+        .outerjoin(Office, User.office_id == Office.id)
+        .order_by(User.created_at.desc())
+    )
+    return [UserRow(*row) for row in result.all()]
+
 async def get_user_by_id(session: AsyncSession, user_id: int) -> Optional[User]:
     result = await session.execute(select(User).where(User.id == user_id))
     return result.scalar_one_or_none()
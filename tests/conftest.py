@@ -0,0 +1,27 @@
+import pytest
+from contextlib import contextmanager
+from database.query_monitor import install_query_monitor, statement_scope
+
+@pytest.fixture
+def statement_budget():
+    """
+    Проверка числа SQL-запросов внутри блока
+
+        with statement_budget(async_session, 8, "finalize_order") as counter:
+            await handler(...)
+
+    Тест падает, если запросов больше limit или один запрос повторился
+    max_repeats раз и более (N+1).
+    """
+    @contextmanager
+    def check(session_factory, limit: int, name: str = "test", max_repeats: int = 0):
+        install_query_monitor(session_factory.kw["bind"], slow_threshold_ms=0)
+        with statement_scope(name) as counter:
+            yield counter
+
+        statements = "\n".join(f"{count} x {sql}" for sql, count in counter.statements.most_common())
+        assert counter.count <= limit, f"{name}: {counter.count} запросов при бюджете {limit}\n{statements}"
+        if max_repeats:
+            assert not counter.repeated(max_repeats), f"{name}: повторяющиеся запросы\n{statements}"
+
+    return check
@@ -0,0 +1,99 @@
+import pytest
+from unittest.mock import patch
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendMessage
+from services.broadcast_service import BroadcastLimiter, Broadcaster
+
+METHOD = SendMessage(chat_id=1, text="test")
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def _broadcaster(fake: FakeTime, rate: float = 30, per_chat_interval: float = 1.0, **kwargs) -> Broadcaster:
+    limiter = BroadcastLimiter(rate, per_chat_interval, clock=fake.clock, sleep=fake.sleep)
+    return Broadcaster(limiter, clock=fake.clock, sleep=fake.sleep, **kwargs)
+
+@pytest.mark.asyncio
+async def test_global_rate_is_respected():
+    fake = FakeTime()
+    broadcaster = _broadcaster(fake, rate=10, concurrency=5)
+    sent_at = []
+
+    async def send(chat_id):
+        sent_at.append(fake.now)
+
+    result = await broadcaster.broadcast(range(30), send, mark_blocked=False)
+
+    assert result.sent == 30
+    # Первая секунда - запас ведра, дальше не быстрее 10 сообщений в секунду
+    assert fake.now == pytest.approx(2.0)
+    assert sum(1 for t in sent_at if t < 1.0) <= 10 + 10
+    assert result.throughput == pytest.approx(15.0)
+
+@pytest.mark.asyncio
+async def test_per_chat_interval_and_duplicates():
+    fake = FakeTime()
+    limiter = BroadcastLimiter(30, per_chat_interval=1.0, clock=fake.clock, sleep=fake.sleep)
+
+    await limiter.acquire(1)
+    await limiter.acquire(2)
+    assert fake.now == 0.0
+
+    await limiter.acquire(1)
+    assert fake.now == pytest.approx(1.0)
+
+    broadcaster = Broadcaster(limiter, clock=fake.clock, sleep=fake.sleep)
+    calls = []
+
+    async def send(chat_id):
+        calls.append(chat_id)
+
+    result = await broadcaster.broadcast([5, 5, 6], send, mark_blocked=False)
+    assert result.total == 2 and calls == [5, 6]
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_retries():
+    fake = FakeTime()
+    broadcaster = _broadcaster(fake, concurrency=1)
+    attempts = {}
+
+    async def send(chat_id):
+        attempts[chat_id] = attempts.get(chat_id, 0) + 1
+        if chat_id == 1 and attempts[chat_id] == 1:
+            raise TelegramRetryAfter(METHOD, "Flood control exceeded", retry_after=5)
+
+    result = await broadcaster.broadcast([1, 2], send, mark_blocked=False)
+
+    assert result.sent == 2 and result.retries == 1
+    assert attempts == {1: 2, 2: 1}
+    assert fake.now >= 5
+
+@pytest.mark.asyncio
+async def test_blocked_users_and_failures_are_reported():
+    fake = FakeTime()
+    broadcaster = _broadcaster(fake, max_retries=2, backoff=0.5)
+
+    async def send(chat_id):
+        if chat_id == 1:
+            raise TelegramForbiddenError(METHOD, "Forbidden: bot was blocked by the user")
+        if chat_id == 2:
+            raise TelegramNetworkError(METHOD, "Connection reset")
+
+    with patch("services.broadcast_service.mark_users_blocked") as mark_users_blocked:
+        result = await broadcaster.broadcast([1, 2, 3], send)
+
+    mark_users_blocked.assert_awaited_once_with([1])
+    assert result.blocked == [1]
+    assert result.failed == 1 and result.retries == 2
+    assert result.sent == 1
+    assert 0.5 in fake.sleeps and 1.0 in fake.sleeps
+    assert broadcaster.stats()["blocked"] == 1
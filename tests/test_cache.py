@@ -0,0 +1,151 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.cache import AsyncCache, cache_result, make_cache_key
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_cache_key_ignores_session():
+    async def func(session, date):
+        pass
+
+    key1 = make_cache_key(func, (AsyncSession(), "2024-01-01"), {})
+    key2 = make_cache_key(func, (AsyncSession(), "2024-01-01"), {})
+    key3 = make_cache_key(func, (AsyncSession(), "2024-01-02"), {})
+
+    assert key1 == key2
+    assert key1 != key3
+
+@pytest.mark.asyncio
+async def test_cache_hit_and_ttl():
+    clock = FakeClock()
+    cache = AsyncCache(clock=clock)
+    calls = []
+
+    @cache_result(ttl_seconds=10, cache=cache)
+    async def load(session, value):
+        calls.append(value)
+        return value * 2
+
+    assert await load(AsyncSession(), 1) == 2
+    assert await load(AsyncSession(), 1) == 2
+    assert calls == [1]
+
+    clock.now = 10
+    assert await load(AsyncSession(), 1) == 2
+    assert calls == [1, 1]
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["expirations"] == 1
+
+@pytest.mark.asyncio
+async def test_cache_lru_eviction():
+    cache = AsyncCache(max_entries=2)
+
+    async def loader():
+        return "value"
+
+    await cache.get_or_load("a", loader, 60)
+    await cache.get_or_load("b", loader, 60)
+    await cache.get_or_load("a", loader, 60)
+    await cache.get_or_load("c", loader, 60)
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+
+    await cache.get_or_load("a", loader, 60)
+    assert cache.stats()["hits"] == 2
+    await cache.get_or_load("b", loader, 60)
+    assert cache.stats()["misses"] == 4
+
+@pytest.mark.asyncio
+async def test_cache_max_bytes():
+    cache = AsyncCache(max_bytes=1000)
+
+    async def loader():
+        return "x" * 400
+
+    await cache.get_or_load("a", loader, 60)
+    await cache.get_or_load("b", loader, 60)
+    await cache.get_or_load("c", loader, 60)
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+
+@pytest.mark.asyncio
+async def test_cache_single_flight():
+    cache = AsyncCache()
+    calls = 0
+    release = asyncio.Event()
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    tasks = [asyncio.create_task(cache.get_or_load("key", loader, 60)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*tasks) == [1] * 5
+    assert calls == 1
+    assert cache.stats()["coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_cache_single_flight_propagates_errors():
+    cache = AsyncCache()
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        raise RuntimeError("db error")
+
+    tasks = [asyncio.create_task(cache.get_or_load("key", loader, 60)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.stats()["entries"] == 0
+
+@pytest.mark.asyncio
+async def test_cache_invalidate_tags():
+    cache = AsyncCache()
+
+    async def loader():
+        return "value"
+
+    await cache.get_or_load("a", loader, 60, tags=("dishes",))
+    await cache.get_or_load("b", loader, 60, tags=("dishes", "menu"))
+    await cache.get_or_load("c", loader, 60, tags=("orders",))
+
+    assert cache.invalidate_tags("dishes") == 2
+    assert cache.stats()["entries"] == 1
+
+@pytest.mark.asyncio
+async def test_cache_does_not_store_result_invalidated_during_load():
+    cache = AsyncCache()
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        return "stale"
+
+    task = asyncio.create_task(cache.get_or_load("key", loader, 60, tags=("dishes",)))
+    await asyncio.sleep(0)
+    cache.invalidate_tags("dishes")
+    release.set()
+
+    assert await task == "stale"
+    assert cache.stats()["entries"] == 0
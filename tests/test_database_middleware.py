@@ -0,0 +1,117 @@
+import pytest
+from datetime import datetime
+from aiogram.types import User as TelegramUser, Message, Chat
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from middleware.database_middleware import DatabaseMiddleware
+from models.user import User, UserRole
+from database.base import Base
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    yield async_session, statements
+
+    await engine.dispose()
+
+def _make_update(telegram_id: int = 123456, username: str = "testuser"):
+    from_user = TelegramUser(id=telegram_id, is_bot=False, first_name="Test", last_name="User", username=username)
+    message = Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=telegram_id, type="private"),
+        from_user=from_user,
+        text="/orders"
+    )
+    return message, {"event_from_user": from_user}
+
+@pytest.mark.asyncio
+async def test_middleware_injects_session_and_user(test_db):
+    async_session, statements = test_db
+    middleware = DatabaseMiddleware(async_session)
+    seen = {}
+
+    async def handler(update, data):
+        seen.update(data)
+
+    message, data = _make_update()
+    await middleware(handler, message, data)
+
+    assert isinstance(seen["session"], AsyncSession)
+    assert seen["user"].telegram_id == 123456
+    assert seen["user_is_admin"] is False
+
+    async with async_session() as session:
+        user = (await session.execute(select(User).where(User.telegram_id == 123456))).scalar_one()
+        user.role = UserRole.MANAGER
+        await session.commit()
+
+    statements.clear()
+    message, data = _make_update()
+    await middleware(handler, message, data)
+
+    assert seen["user_is_admin"] is True
+    # Известный пользователь без изменений: один SELECT, без COMMIT
+    assert len(statements) == 1
+
+@pytest.mark.asyncio
+async def test_middleware_commits_only_dirty_unit_of_work(test_db):
+    async_session, statements = test_db
+    middleware = DatabaseMiddleware(async_session)
+    commits = []
+
+    async def read_only(update, data):
+        event.listen(data["session"].sync_session, "after_commit", lambda session: commits.append(1))
+        await data["session"].execute(select(User))
+
+    async def rename(update, data):
+        data["user"].full_name = "Renamed"
+
+    message, data = _make_update()
+    await middleware(read_only, message, data)
+    commits.clear()
+
+    message, data = _make_update()
+    await middleware(read_only, message, data)
+    assert commits == []
+
+    message, data = _make_update()
+    await middleware(rename, message, data)
+
+    async with async_session() as session:
+        user = (await session.execute(select(User).where(User.telegram_id == 123456))).scalar_one()
+        assert user.full_name == "Renamed"
+
+@pytest.mark.asyncio
+async def test_middleware_rolls_back_on_error(test_db):
+    async_session, statements = test_db
+    middleware = DatabaseMiddleware(async_session)
+
+    async def failing(update, data):
+        data["user"].full_name = "Lost"
+        await data["session"].flush()
+        raise RuntimeError("handler error")
+
+    message, data = _make_update()
+    with pytest.raises(RuntimeError):
+        await middleware(failing, message, data)
+
+    async with async_session() as session:
+        user = (await session.execute(select(User).where(User.telegram_id == 123456))).scalar_one()
+        assert user.full_name == "Test User"
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import pytest
+from datetime import date, datetime
+from openpyxl import load_workbook
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from services.menu_management_service import add_dish
+from services.order_service import create_order
+from services.report_service import stream_order_export_rows
+from services.user_service import get_or_create_user
+from utils.export_service import (
+    export_statistics_to_excel, export_orders_stream, run_export, MAX_COLUMN_WIDTH
+)
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_session
+
+    await engine.dispose()
+
+def test_statistics_widths_and_header_style():
+    stats_data = {
+        "summary": {"total_orders": 3, "unique_users": 2, "total_amount": 300.0},
+        "dishes": [
+            {"name": "Борщ", "quantity": 2, "revenue": 200.0},
+            {"name": "Очень длинное название блюда " * 3, "quantity": 1, "revenue": 100.0}
+        ],
+        "users": []
+    }
+
+    wb = load_workbook(export_statistics_to_excel(stats_data))
+
+    dishes = wb["Блюда"]
+    assert dishes["A1"].font.b and dishes["A1"].alignment.horizontal == "center"
+    assert not dishes["A2"].font.b
+    assert dishes.column_dimensions["A"].width == MAX_COLUMN_WIDTH
+    assert dishes.column_dimensions["B"].width == len("Количество") + 2
+    assert wb["Сводка"]["B2"].value == 3
+
+@pytest.mark.asyncio
+async def test_run_export_builds_file_off_the_event_loop():
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def build(stats_data):
+        threads.append(threading.get_ident())
+        return export_statistics_to_excel(stats_data)
+
+    files = await asyncio.gather(*(run_export(build, {"dishes": []}) for _ in range(4)))
+
+    assert len(files) == 4
+    assert loop_thread not in threads
+
+@pytest.mark.asyncio
+async def test_orders_stream_from_cursor(test_db):
+    async with test_db() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        borsch = await add_dish(session, "Борщ", "", 100.0, "Супы")
+        plov = await add_dish(session, "Плов", "", 150.0, "Горячее")
+        items = [
+            {"dish_id": borsch.id, "quantity": 2, "price": borsch.price},
+            {"dish_id": plov.id, "quantity": 1, "price": plov.price}
+        ]
+        await create_order(session, user.id, datetime(2030, 5, 15), items)
+        await create_order(session, user.id, datetime(2030, 5, 31, 13, 0), items[:1])
+        await create_order(session, user.id, datetime(2030, 6, 1), items[:1])
+
+        excel_file = await export_orders_stream(
+            stream_order_export_rows(session, date(2030, 5, 1), date(2030, 6, 1))
+        )
+
+    ws = load_workbook(excel_file)["Заказы"]
+    rows = list(ws.iter_rows(min_row=2, values_only=True))
+    assert [row[2] for row in rows] == ["15.05.2030", "31.05.2030"]
+    assert rows[0][1] == "Test User"
+    assert rows[0][4] == 350.0
+    assert rows[0][5] == "Борщ x2, Плов x1"
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendDocument
+from aiogram.types import BufferedInputFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from models.cached_file import CachedFile
+from services.file_cache_service import FileIdCache, report_digest
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_session
+
+    await engine.dispose()
+
+class FakeBot:
+    """Выдает file_id на каждую загрузку и запоминает, что отправлено"""
+
+    def __init__(self):
+        self.sent = []
+        self.rejected = set()
+
+    async def send_document(self, chat_id, document, **kwargs):
+        await asyncio.sleep(0)
+        if isinstance(document, str):
+            if document in self.rejected:
+                raise TelegramBadRequest(SendDocument(chat_id=chat_id, document=document), "wrong file identifier")
+            file_id = document
+        else:
+            file_id = f"file-{len(self.sent)}"
+        self.sent.append((chat_id, document))
+        return SimpleNamespace(document=SimpleNamespace(file_id=file_id))
+
+    @property
+    def uploads(self):
+        return [document for _, document in self.sent if not isinstance(document, str)]
+
+def _builder(builds: list):
+    async def build():
+        builds.append(1)
+        return BufferedInputFile(b"report", filename="report.xlsx")
+    return build
+
+@pytest.mark.asyncio
+async def test_report_is_uploaded_once_for_all_admins(test_db):
+    cache = FileIdCache(session_factory=test_db)
+    bot, builds = FakeBot(), []
+    digest = report_digest("daily_report:2030-05-15", {"total_orders": 3})
+
+    await asyncio.gather(*(
+        cache.send_document(bot, chat_id, "daily_report:2030-05-15", digest, _builder(builds), caption="Отчет")
+        for chat_id in (1, 2, 3)
+    ))
+
+    assert len(builds) == 1
+    assert len(bot.uploads) == 1
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 2, 3]
+
+    # Новый процесс: file_id берется из БД
+    fresh = FileIdCache(session_factory=test_db)
+    await fresh.send_document(bot, 4, "daily_report:2030-05-15", digest, _builder(builds))
+    assert len(builds) == 1
+    assert bot.sent[-1] == (4, "file-0")
+    assert fresh.get_stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_changed_data_replaces_previous_version(test_db):
+    cache = FileIdCache(session_factory=test_db)
+    bot, builds = FakeBot(), []
+    old = report_digest("report_xlsx:2030-05-15", {"total_orders": 3})
+    new = report_digest("report_xlsx:2030-05-15", {"total_orders": 4})
+
+    await cache.send_document(bot, 1, "report_xlsx:2030-05-15", old, _builder(builds))
+    await cache.send_document(bot, 1, "report_xlsx:2030-05-15", new, _builder(builds))
+
+    assert old != new
+    assert len(builds) == 2
+    async with test_db() as session:
+        hashes = (await session.execute(select(CachedFile.content_hash))).scalars().all()
+    assert hashes == [new]
+    assert cache.get_stats()["invalidations"] == 1
+
+@pytest.mark.asyncio
+async def test_rejected_file_id_is_uploaded_again(test_db):
+    cache = FileIdCache(session_factory=test_db)
+    bot, builds = FakeBot(), []
+    digest = report_digest("cafe_report:2030-05-15", {"cafes": []})
+
+    await cache.send_document(bot, 1, "cafe_report:2030-05-15", digest, _builder(builds))
+    bot.rejected.add("file-0")
+    await cache.send_document(bot, 2, "cafe_report:2030-05-15", digest, _builder(builds))
+
+    assert len(builds) == 2
+    async with test_db() as session:
+        file_ids = (await session.execute(select(CachedFile.file_id))).scalars().all()
+    assert file_ids == ["file-1"]
@@ -0,0 +1,145 @@
+import pytest
+from datetime import date, datetime, timedelta
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from database.fsm_storage import SQLStorage, dumps_state_data, loads_state_data, storage_key
+from models.fsm_state import FSMState
+from models.order import OrderStatus
+
+KEY = StorageKey(bot_id=1, chat_id=123456, user_id=123456)
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    statements = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    yield async_session, statements
+
+    await engine.dispose()
+
+def test_state_data_round_trip():
+    data = {
+        "order_date": datetime(2030, 5, 15, 12, 30),
+        "deadline_date": date(2030, 5, 15),
+        "admin_orders_status": OrderStatus.PENDING,
+        "cart": [{"dish_id": 1, "quantity": 2, "price": 250.0, "name": "Борщ"}],
+        "admin_orders_user_id": None
+    }
+
+    raw = dumps_state_data(data)
+
+    assert loads_state_data(raw) == data
+    assert dumps_state_data({}) is None
+    assert loads_state_data(None) == {}
+
+@pytest.mark.asyncio
+async def test_update_data_calls_are_coalesced_into_one_write(test_db):
+    async_session, statements = test_db
+    storage = SQLStorage(async_session)
+
+    await storage.set_state(KEY, "OrderStates:choosing_dish")
+    await storage.update_data(KEY, {"cafe_id": 1})
+    await storage.update_data(KEY, {"order_date": datetime(2030, 5, 15)})
+    await storage.update_data(KEY, {"cart": [{"dish_id": 1, "quantity": 2}]})
+
+    assert storage.loads == 1
+    assert not any(s.lstrip().upper().startswith(("INSERT", "UPDATE")) for s in statements)
+
+    statements.clear()
+    assert await storage.flush([KEY]) == 1
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in statements) == 1
+
+    # Новый экземпляр (перезапуск бота) читает сохраненное состояние
+    restarted = SQLStorage(async_session)
+    assert await restarted.get_state(KEY) == "OrderStates:choosing_dish"
+    assert await restarted.get_data(KEY) == {
+        "cafe_id": 1,
+        "order_date": datetime(2030, 5, 15),
+        "cart": [{"dish_id": 1, "quantity": 2}]
+    }
+
+@pytest.mark.asyncio
+async def test_get_data_returns_copy(test_db):
+    async_session, _ = test_db
+    storage = SQLStorage(async_session)
+
+    await storage.set_data(KEY, {"cart": [{"dish_id": 1, "quantity": 1}]})
+    data = await storage.get_data(KEY)
+    data["cart"][0]["quantity"] = 5
+
+    assert (await storage.get_data(KEY))["cart"][0]["quantity"] == 1
+
+@pytest.mark.asyncio
+async def test_cleared_state_deletes_row(test_db):
+    async_session, _ = test_db
+    storage = SQLStorage(async_session)
+
+    await storage.set_state(KEY, "OrderStates:choosing_dish")
+    await storage.set_data(KEY, {"cafe_id": 1})
+    await storage.flush()
+
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    await storage.flush()
+
+    async with async_session() as session:
+        assert (await session.execute(select(FSMState))).scalars().all() == []
+
+@pytest.mark.asyncio
+async def test_expired_state_is_ignored_and_evicted(test_db):
+    async_session, _ = test_db
+    storage = SQLStorage(async_session, ttl=timedelta(hours=1))
+
+    await storage.set_data(KEY, {"cafe_id": 1})
+    await storage.close()
+
+    async with async_session() as session:
+        await session.execute(
+            update(FSMState)
+            .where(FSMState.key == storage_key(KEY))
+            .values(updated_at=datetime.utcnow() - timedelta(hours=2))
+        )
+        await session.commit()
+
+    assert await storage.get_data(KEY) == {}
+    assert await storage.evict_expired() == 1
+
+@pytest.mark.asyncio
+async def test_update_scope_shares_one_session(test_db):
+    from aiogram.types import User as TelegramUser
+    from database.database import update_scope
+    from middleware.database_middleware import DatabaseMiddleware
+
+    async_session, statements = test_db
+    storage = SQLStorage(async_session)
+    from_user = TelegramUser(id=123456, is_bot=False, first_name="Test")
+    seen = {}
+
+    async def handler(update, data):
+        seen["session"] = data["session"]
+        await storage.update_data(KEY, {"cafe_id": 1})
+
+    async with update_scope(async_session) as scope:
+        await storage.get_state(KEY)
+        await DatabaseMiddleware(async_session)(handler, None, {"event_from_user": from_user})
+        await storage.flush([KEY])
+        assert seen["session"] is scope.session
+
+    assert scope.session is None
+    assert await SQLStorage(async_session).get_data(KEY) == {"cafe_id": 1}
@@ -75,24 +75,22 @@ def mock_callback(mock_user):
     return callback
 
 @pytest.mark.asyncio
-async def test_start_command_creates_user(test_db, mock_message):
-    """Тест создания пользователя при команде /start"""
+async def test_start_command_uses_resolved_user(test_db, mock_message):
+    """Тест /start с пользователем, разрешенным в DatabaseMiddleware"""
     from handlers.start import cmd_start
     
     async_session = test_db
     
-    with patch('handlers.start.get_session') as mock_get_session:
-        mock_session = AsyncMock()
-        mock_get_session.return_value.__aiter__.return_value = [mock_session]
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+    
+    with patch.object(Message, 'answer', new_callable=AsyncMock) as mock_answer:
+        await cmd_start(mock_message, user=user, user_is_admin=False)
         
-        with patch('handlers.start.get_or_create_user') as mock_get_user:
-            mock_user_obj = MagicMock()
-            mock_user_obj.role.value = "user"
-            mock_get_user.return_value = mock_user_obj
-            
-            await cmd_start(mock_message)
-            
-            mock_get_user.assert_called_once()
+        mock_answer.assert_called_once()
+        keyboard = mock_answer.call_args.kwargs["reply_markup"]
+        callbacks = [button.callback_data for row in keyboard.inline_keyboard for button in row]
+        assert "admin_panel" not in callbacks
 
 @pytest.mark.asyncio
 async def test_order_creation_flow_integration(test_db):
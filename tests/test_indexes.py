@@ -0,0 +1,121 @@
+"""
+Проверка планов горячих запросов: EXPLAIN QUERY PLAN должен использовать индексы
+"""
+import enum
+import pytest
+from datetime import date, datetime
+from sqlalchemy import select, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from models.cafe_menu import CafeMenu
+from models.menu import Menu
+from models.order import Order, OrderItem, OrderStatus
+from models.order_deadline import OrderDeadline
+from models.user import User, UserRole
+from services.cafe_service import create_cafe
+from services.menu_management_service import add_dish
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_session
+
+    await engine.dispose()
+
+async def _plan(session: AsyncSession, statement) -> str:
+    conn = await session.connection()
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    # Enum хранится по имени; остальные параметры драйвер принимает как есть
+    params = tuple(
+        value.name if isinstance(value, enum.Enum) else value
+        for value in (compiled.params[name] for name in compiled.positiontup)
+    )
+    result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, params)
+    return " | ".join(row[-1] for row in result)
+
+DAY_START = datetime(2030, 5, 15)
+DAY = date(2030, 5, 15)
+
+HOT_QUERIES = [
+    (
+        "cafe menu item",
+        select(CafeMenu).where(and_(CafeMenu.cafe_id == 1, CafeMenu.dish_id == 2, CafeMenu.day == DAY)),
+        "uq_cafe_menu_cafe_dish_day"
+    ),
+    (
+        "cafe menu for date",
+        select(CafeMenu).where(and_(CafeMenu.cafe_id == 1, CafeMenu.day == DAY)),
+        "idx_cafe_menu_cafe_day"
+    ),
+    (
+        "selectinload order items",
+        select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3])),
+        "idx_order_item_order"
+    ),
+    (
+        "orders by dish",
+        select(OrderItem.order_id).where(OrderItem.dish_id.in_([1, 2])),
+        "idx_order_item_dish_order"
+    ),
+    (
+        "managers",
+        select(User.telegram_id).where(User.role == UserRole.MANAGER),
+        "idx_user_role"
+    ),
+    (
+        "users of office",
+        select(User).where(User.office_id == 1),
+        "idx_user_office"
+    ),
+    (
+        "deadline for cafe",
+        select(OrderDeadline).where(and_(OrderDeadline.day == DAY, OrderDeadline.cafe_id == 1)),
+        "idx_order_deadline_day_cafe_office"
+    ),
+    (
+        "menu for date",
+        select(Menu).where(Menu.day == DAY),
+        "uq_menu_day_dish"
+    ),
+    (
+        "user orders for date",
+        select(Order).where(and_(Order.user_id == 1, Order.day == DAY)),
+        "idx_order_user_day"
+    ),
+    (
+        "orders for date by status",
+        select(Order).where(and_(Order.day == DAY, Order.status == OrderStatus.PENDING)),
+        "idx_order_day_status"
+    ),
+]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name,statement,index", HOT_QUERIES, ids=[query[0] for query in HOT_QUERIES])
+async def test_hot_query_uses_index(test_db, name, statement, index):
+    async with test_db() as session:
+        plan = await _plan(session, statement)
+
+    assert index in plan, f"{name}: {plan}"
+
+@pytest.mark.asyncio
+async def test_cafe_menu_is_unique_per_cafe_dish_and_day(test_db):
+    async with test_db() as session:
+        cafe = await create_cafe(session, "Test Cafe")
+        dish = await add_dish(session, "Борщ", "", 100.0, "Супы")
+        session.add_all([
+            CafeMenu(cafe_id=cafe.id, dish_id=dish.id, date=DAY_START, available_quantity=5),
+            CafeMenu(cafe_id=cafe.id, dish_id=dish.id, date=DAY_START.replace(hour=12), available_quantity=3)
+        ])
+        with pytest.raises(IntegrityError):
+            await session.commit()
@@ -9,6 +9,7 @@ from services.menu_management_service import (
     delete_dish,
     load_menu_for_date
 )
+from services.cafe_service import create_cafe, upsert_cafe_menus, get_cafe_menu_item
 from services.menu_service import (
     get_menu_for_date,
     get_dish_categories
@@ -142,11 +143,44 @@ async def test_get_dish_categories(test_db):
         assert "Category A" in categories
         assert "Category B" in categories
 
+@pytest.mark.asyncio
+async def test_load_menu_for_date_upserts_in_one_statement(test_db, statement_budget):
+    async_session = test_db
+    menu_date = datetime(2030, 5, 31, 10, 0)
+    
+    async with async_session() as session:
+        dishes = [await add_dish(session, f"Dish {i}", "", 100.0, "Category") for i in range(5)]
+        dish_ids = [d.id for d in dishes]
+        
+        first = await load_menu_for_date(session, menu_date, dish_ids[:3], [1, 2, 3])
+        with statement_budget(async_session, 1, "load_menu_for_date"):
+            second = await load_menu_for_date(session, menu_date, dish_ids, [10, 20, 30, 40, 50])
+        
+        assert len(second) == 5
+        # Существующие строки обновлены на месте, объекты сессии тоже
+        assert {m.id for m in first} <= {m.id for m in second}
+        assert [m.available_quantity for m in first] == [10, 20, 30]
+        
+        menu_items = await get_menu_for_date(session, menu_date)
+        assert sorted(menu.available_quantity for _, menu in menu_items) == [10, 20, 30, 40, 50]
 
-
-
-
-
-
-
-
+@pytest.mark.asyncio
+async def test_cafe_menus_for_many_cafes_and_dates_in_one_upsert(test_db, statement_budget):
+    async_session = test_db
+    # Последний день месяца и следующий день
+    dates = [datetime(2030, 5, 31, 9, 0), datetime(2030, 6, 1)]
+    
+    async with async_session() as session:
+        cafes = [await create_cafe(session, f"Cafe {i}") for i in range(3)]
+        dishes = [await add_dish(session, f"Dish {i}", "", 100.0, "Category") for i in range(40)]
+        cafe_ids = [c.id for c in cafes]
+        dish_ids = [d.id for d in dishes]
+        
+        await upsert_cafe_menus(session, cafe_ids[:1], dates[:1], dish_ids[:1], [1])
+        with statement_budget(async_session, 1, "upsert_cafe_menus"):
+            items = await upsert_cafe_menus(session, cafe_ids, dates, dish_ids, [5] * 40)
+        
+        assert len(items) == 3 * 2 * 40
+        item = await get_cafe_menu_item(session, cafe_ids[0], datetime(2030, 5, 31), dish_ids[0])
+        assert item.available_quantity == 5
+        assert item.date == datetime(2030, 5, 31)
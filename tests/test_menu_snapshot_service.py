@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from services.menu_snapshot_service import menu_snapshots, get_menu_snapshot
+from services.cafe_service import create_cafe, load_cafe_menu_for_date
+from services.order_service import create_order, cancel_order
+from services.user_service import get_or_create_user
+from services.menu_management_service import add_dish, update_dish
+from database.base import Base
+
+ORDER_DATE = datetime(2030, 5, 15)
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    menu_snapshots.clear()
+    yield async_session
+    menu_snapshots.clear()
+
+    await engine.dispose()
+
+async def _create_menu(session):
+    user = await get_or_create_user(session, 123456, "testuser", "Test User")
+    dish1 = await add_dish(session, "Борщ", "Desc", 250.0, "Первые блюда")
+    dish2 = await add_dish(session, "Цезарь", "Desc", 220.0, "Салаты")
+    cafe = await create_cafe(session, "Test Cafe")
+    await load_cafe_menu_for_date(session, cafe.id, ORDER_DATE, [dish1.id, dish2.id], [5, 0])
+    return user, cafe, dish1, dish2
+
+@pytest.mark.asyncio
+async def test_snapshot_groups_available_dishes(test_db):
+    async_session = test_db
+
+    async with async_session() as session:
+        user, cafe, dish1, dish2 = await _create_menu(session)
+
+        menu = await get_menu_snapshot(session, cafe.id, ORDER_DATE)
+
+        assert menu.cafe_name == "Test Cafe"
+        assert set(menu.items) == {dish1.id, dish2.id}
+        assert [item.dish_id for item in menu.categories()["Первые блюда"]] == [dish1.id]
+        assert "Салаты" not in menu.categories()
+        assert await get_menu_snapshot(session, cafe.id, ORDER_DATE) is menu
+
+@pytest.mark.asyncio
+async def test_order_writes_update_snapshot_in_place(test_db):
+    async_session = test_db
+
+    async with async_session() as session:
+        user, cafe, dish1, dish2 = await _create_menu(session)
+        # Откат после неудачного резервирования сбрасывает ORM-объекты сессии
+        user_id, cafe_id, dish1_id, dish2_id = user.id, cafe.id, dish1.id, dish2.id
+        menu = await get_menu_snapshot(session, cafe_id, ORDER_DATE)
+        loads = menu_snapshots.loads
+
+        order = await create_order(session, user_id, ORDER_DATE, [
+            {"dish_id": dish1_id, "quantity": 2, "price": 250.0}
+        ], cafe_id=cafe_id)
+        order_id = order.id
+        assert menu.items[dish1_id].available_quantity == 3
+
+        with pytest.raises(ValueError):
+            await create_order(session, user_id, ORDER_DATE, [
+                {"dish_id": dish1_id, "quantity": 4, "price": 250.0}
+            ], cafe_id=cafe_id)
+        assert menu.items[dish1_id].available_quantity == 3
+
+        assert await cancel_order(session, order_id, user_id)
+        assert menu.items[dish1_id].available_quantity == 5
+
+        await load_cafe_menu_for_date(session, cafe_id, ORDER_DATE, [dish2_id], [7])
+        assert menu.items[dish2_id].available_quantity == 7
+
+        assert await get_menu_snapshot(session, cafe_id, ORDER_DATE) is menu
+        assert menu_snapshots.loads == loads
+
+@pytest.mark.asyncio
+async def test_snapshot_reloads_when_menu_composition_or_dish_changes(test_db):
+    async_session = test_db
+
+    async with async_session() as session:
+        user, cafe, dish1, dish2 = await _create_menu(session)
+        menu = await get_menu_snapshot(session, cafe.id, ORDER_DATE)
+
+        dish3 = await add_dish(session, "Плов", "Desc", 350.0, "Горячее")
+        await load_cafe_menu_for_date(session, cafe.id, ORDER_DATE, [dish3.id], [4])
+        menu = await get_menu_snapshot(session, cafe.id, ORDER_DATE)
+        assert menu.items[dish3.id].available_quantity == 4
+
+        await update_dish(session, dish1.id, price=300.0)
+        menu = await get_menu_snapshot(session, cafe.id, ORDER_DATE)
+        assert menu.items[dish1.id].price == 300.0
+
+@pytest.mark.asyncio
+async def test_stale_load_does_not_replace_newer_write(test_db):
+    async_session = test_db
+
+    async with async_session() as session:
+        user, cafe, dish1, dish2 = await _create_menu(session)
+        loads = menu_snapshots.loads
+
+        load = asyncio.create_task(get_menu_snapshot(session, cafe.id, ORDER_DATE))
+        await asyncio.sleep(0)
+        menu_snapshots.apply_stock(cafe.id, ORDER_DATE, {dish1.id: 1})
+        stale = await load
+
+        menu = await get_menu_snapshot(session, cafe.id, ORDER_DATE)
+        assert menu is not stale
+        assert menu.items[dish1.id].available_quantity == 5
+        assert menu_snapshots.loads == loads + 2
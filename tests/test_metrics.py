@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from datetime import datetime
+from aiogram import Bot, Dispatcher, Router, F
+from aiogram.types import Update
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from middleware.metrics_middleware import UpdateMetricsMiddleware, HandlerMetricsMiddleware
+from utils.metrics import (
+    MetricsRegistry, label_prefix, instrument_engine, instrument_scheduler,
+    DB_STATEMENTS, DB_POOL_WAIT, HANDLER_DURATION, UPDATES, JOB_DURATION, JOB_ERRORS
+)
+
+def test_label_prefix_strips_ids_and_dates():
+    assert label_prefix("order_details_15") == "order_details"
+    assert label_prefix("order_date_2030-05-15") == "order_date"
+    assert label_prefix("remove_item_3_4") == "remove_item"
+    assert label_prefix("qty_-1") == "qty"
+    assert label_prefix("admin_panel") == "admin_panel"
+    assert label_prefix(None) == "none"
+
+def test_histogram_exposition_is_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Тест", ("method",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, method="a")
+    histogram.observe(0.5, method="a")
+    registry.counter("test_total", "Тест").inc()
+
+    body = registry.render()
+    assert "# TYPE test_seconds histogram" in body
+    assert 'test_seconds_bucket{method="a",le="0.1"} 1' in body
+    assert 'test_seconds_bucket{method="a",le="1.0"} 2' in body
+    assert 'test_seconds_bucket{method="a",le="+Inf"} 2' in body
+    assert 'test_seconds_count{method="a"} 2' in body
+    assert "test_total 1" in body
+
+@pytest.mark.asyncio
+async def test_engine_statements_and_pool_wait_are_recorded():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine)
+    selects, checkouts = DB_STATEMENTS.value(operation="SELECT"), DB_POOL_WAIT.count()
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        await conn.execute(text("SELECT 2"))
+    await engine.dispose()
+
+    assert DB_STATEMENTS.value(operation="SELECT") - selects == 2
+    assert DB_POOL_WAIT.count() - checkouts == 1
+
+@pytest.mark.asyncio
+async def test_handler_latency_is_keyed_by_router_and_callback_prefix():
+    router = Router()
+
+    @router.callback_query(F.data.startswith("order_details_"))
+    async def order_details(callback):
+        return None
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+    labels = {"router": __name__, "event": "callback_query", "prefix": "order_details"}
+    handled, updates = HANDLER_DURATION.count(**labels), UPDATES.value(type="callback_query")
+
+    update = Update.model_validate({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1",
+            "chat_instance": "1",
+            "data": "order_details_15",
+            "from": {"id": 1, "is_bot": False, "first_name": "User"}
+        }
+    })
+    await dp.feed_update(bot, update)
+    await bot.session.close()
+
+    assert HANDLER_DURATION.count(**labels) - handled == 1
+    assert UPDATES.value(type="callback_query") - updates == 1
+
+@pytest.mark.asyncio
+async def test_scheduler_job_duration_and_errors():
+    scheduler = AsyncIOScheduler()
+    instrument_scheduler(scheduler)
+    done = asyncio.Event()
+    executed, failed = JOB_DURATION.count(job="metrics_job"), JOB_ERRORS.value(job="metrics_failing_job")
+
+    async def job():
+        done.set()
+
+    async def failing_job():
+        raise ValueError("boom")
+
+    scheduler.add_job(job, "date", run_date=datetime.now(), id="metrics_job_1")
+    scheduler.add_job(failing_job, "date", run_date=datetime.now(), id="metrics_failing_job_1")
+    scheduler.start()
+    try:
+        await asyncio.wait_for(done.wait(), timeout=5)
+        for _ in range(50):
+            if (JOB_ERRORS.value(job="metrics_failing_job") > failed
+                    and JOB_DURATION.count(job="metrics_job") > executed):
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        scheduler.shutdown(wait=False)
+
+    assert JOB_DURATION.count(job="metrics_job") - executed == 1
+    assert JOB_ERRORS.value(job="metrics_failing_job") - failed == 1
@@ -1,5 +1,5 @@
 import pytest
-from datetime import datetime
+from datetime import date, datetime
 from models.user import User, UserRole
 from models.dish import Dish
 from models.order import Order, OrderItem, OrderStatus
@@ -44,6 +44,13 @@ class TestOrderModel:
         assert order.status == OrderStatus.PENDING
         assert order.total_amount == 500.0
     
+    def test_order_day_follows_order_date(self):
+        order = Order(user_id=1, order_date=datetime(2030, 5, 31, 23, 30))
+        assert order.day == date(2030, 5, 31)
+        
+        order.order_date = datetime(2030, 6, 1, 0, 15)
+        assert order.day == date(2030, 6, 1)
+    
     def test_order_item_creation(self):
         item = OrderItem(
             order_id=1,
@@ -1,5 +1,6 @@
 import pytest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import StaticPool
 from services.order_service import (
@@ -7,11 +8,14 @@ from services.order_service import (
     get_user_orders,
     cancel_order,
     update_order_status,
-    get_all_orders
+    get_all_orders,
+    get_all_orders_page,
+    get_user_orders_page,
+    get_order_rows
 )
 from services.user_service import get_or_create_user
 from services.menu_management_service import add_dish
-from models.order import OrderStatus
+from models.order import Order, OrderStatus
 from database.base import Base
 
 @pytest.fixture
@@ -169,3 +173,197 @@ async def test_get_all_orders_with_filters(test_db):
 
 
 
+@pytest.mark.asyncio
+async def test_create_order_reserves_cafe_menu_stock(test_db):
+    from services.cafe_service import create_cafe, load_cafe_menu_for_date, get_cafe_menu_item
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish1 = await add_dish(session, "Dish 1", "Description", 100.0, "Category")
+        dish2 = await add_dish(session, "Dish 2", "Description", 200.0, "Category")
+        cafe = await create_cafe(session, "Test Cafe")
+        
+        order_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        await load_cafe_menu_for_date(session, cafe.id, order_date, [dish1.id, dish2.id], [5, 3])
+        
+        items = [
+            {"dish_id": dish1.id, "quantity": 2, "price": dish1.price},
+            {"dish_id": dish2.id, "quantity": 3, "price": dish2.price}
+        ]
+        order = await create_order(session, user.id, order_date, items, cafe_id=cafe.id)
+        
+        assert order.cafe_id == cafe.id
+        assert len(order.items) == 2
+        assert (await get_cafe_menu_item(session, cafe.id, order_date, dish1.id)).available_quantity == 3
+        assert (await get_cafe_menu_item(session, cafe.id, order_date, dish2.id)).available_quantity == 0
+
+@pytest.mark.asyncio
+async def test_create_order_reservation_is_all_or_nothing(test_db):
+    from services.cafe_service import create_cafe, load_cafe_menu_for_date, get_cafe_menu_item
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish1 = await add_dish(session, "Dish 1", "Description", 100.0, "Category")
+        dish2 = await add_dish(session, "Dish 2", "Description", 200.0, "Category")
+        dish3 = await add_dish(session, "Dish 3", "Description", 300.0, "Category")
+        cafe = await create_cafe(session, "Test Cafe")
+        user_id, cafe_id = user.id, cafe.id
+        dish1_id, dish2_id, dish3_id = dish1.id, dish2.id, dish3.id
+        
+        order_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        await load_cafe_menu_for_date(session, cafe_id, order_date, [dish1_id, dish2_id], [5, 1])
+        
+        short_items = [
+            {"dish_id": dish1_id, "quantity": 2, "price": 100.0},
+            {"dish_id": dish2_id, "quantity": 2, "price": 200.0}
+        ]
+        with pytest.raises(ValueError, match="Доступно только 1"):
+            await create_order(session, user_id, order_date, short_items, cafe_id=cafe_id)
+        
+        missing_items = [
+            {"dish_id": dish1_id, "quantity": 1, "price": 100.0},
+            {"dish_id": dish3_id, "quantity": 1, "price": 300.0}
+        ]
+        with pytest.raises(ValueError, match="не найдено"):
+            await create_order(session, user_id, order_date, missing_items, cafe_id=cafe_id)
+        
+        assert (await get_cafe_menu_item(session, cafe_id, order_date, dish1_id)).available_quantity == 5
+        assert (await get_cafe_menu_item(session, cafe_id, order_date, dish2_id)).available_quantity == 1
+        assert await get_user_orders(session, user_id) == []
+
+@pytest.mark.asyncio
+async def test_cancel_restores_stock_relative_to_concurrent_reservation(test_db):
+    from services.cafe_service import create_cafe, load_cafe_menu_for_date, get_cafe_menu_item
+    async_session = test_db
+    order_date = datetime(2030, 5, 15)
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish = await add_dish(session, "Dish", "Description", 100.0, "Category")
+        cafe = await create_cafe(session, "Test Cafe")
+        user_id, dish_id, cafe_id = user.id, dish.id, cafe.id
+        await load_cafe_menu_for_date(session, cafe_id, order_date, [dish_id], [10])
+        items = [{"dish_id": dish_id, "quantity": 3, "price": 100.0}]
+        order = await create_order(session, user_id, order_date, items, cafe_id=cafe_id)
+        order_id = order.id
+    
+    async with async_session() as cancelling, async_session() as ordering:
+        # Строка меню прочитана до параллельного резервирования
+        assert (await get_cafe_menu_item(cancelling, cafe_id, order_date, dish_id)).available_quantity == 7
+        await create_order(ordering, user_id, order_date, items, cafe_id=cafe_id)
+        
+        assert await cancel_order(cancelling, order_id, user_id)
+    
+    async with async_session() as session:
+        assert (await get_cafe_menu_item(session, cafe_id, order_date, dish_id)).available_quantity == 7
+
+@pytest.mark.asyncio
+async def test_orders_are_filtered_by_day_key(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish = await add_dish(session, "Test Dish", "Description", 100.0, "Test Category")
+        items = [{"dish_id": dish.id, "quantity": 1, "price": dish.price}]
+        
+        # Последний день месяца: конец дня и полночь следующего дня
+        late = await create_order(session, user.id, datetime(2030, 5, 31, 23, 30), items)
+        await create_order(session, user.id, datetime(2030, 6, 1), items)
+        # Вставка через Core получает day из order_date по умолчанию
+        await session.execute(insert(Order).values(user_id=user.id, order_date=datetime(2030, 5, 31, 8, 0)))
+        await session.commit()
+        
+        assert late.day == date(2030, 5, 31)
+        day_orders = await get_all_orders(session, date=datetime(2030, 5, 31))
+        assert len(day_orders) == 2
+        
+        user_orders = await get_user_orders(
+            session, user.id, date_from=datetime(2030, 5, 31), date_to=datetime(2030, 5, 31)
+        )
+        assert {order.day for order in user_orders} == {date(2030, 5, 31)}
+        assert len(user_orders) == 2
+
+@pytest.mark.asyncio
+async def test_order_pages_follow_keyset_cursors(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        other = await get_or_create_user(session, 654321, "other", "Other User")
+        dish = await add_dish(session, "Test Dish", "Description", 100.0, "Test Category")
+        items = [{"dish_id": dish.id, "quantity": 1, "price": dish.price}]
+        
+        # Два заказа с одинаковым временем: порядок внутри определяет id
+        same_time = datetime(2030, 5, 10, 12, 0)
+        orders = [await create_order(session, user.id, same_time, items) for _ in range(2)]
+        orders += [await create_order(session, user.id, datetime(2030, 5, day), items) for day in (11, 12, 13)]
+        await create_order(session, other.id, datetime(2030, 5, 14), items)
+        
+        first = await get_all_orders_page(session, limit=2, search_term="testuser")
+        assert first.total == 5
+        assert [o.id for o in first.orders] == [orders[4].id, orders[3].id]
+        assert first.prev_cursor is None
+        assert first.orders[0].user_name == "Test User"
+        
+        second = await get_all_orders_page(session, limit=2, after=first.next_cursor, search_term="testuser")
+        assert [o.id for o in second.orders] == [orders[2].id, orders[1].id]
+        
+        third = await get_all_orders_page(session, limit=2, after=second.next_cursor, search_term="testuser")
+        assert [o.id for o in third.orders] == [orders[0].id]
+        assert third.next_cursor is None
+        
+        back = await get_all_orders_page(session, limit=2, before=third.prev_cursor, search_term="testuser")
+        assert [o.id for o in back.orders] == [o.id for o in second.orders]
+        assert back.prev_cursor is not None
+
+@pytest.mark.asyncio
+async def test_user_orders_page_filters_in_sql(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        soup = await add_dish(session, "Борщ", "", 100.0, "Супы")
+        main = await add_dish(session, "Плов", "", 150.0, "Горячее")
+        
+        pending = await create_order(session, user.id, datetime(2030, 5, 10), [{"dish_id": soup.id, "quantity": 1, "price": 100.0}])
+        done = await create_order(session, user.id, datetime(2030, 5, 11), [{"dish_id": soup.id, "quantity": 1, "price": 100.0}])
+        other = await create_order(session, user.id, datetime(2030, 5, 12), [{"dish_id": main.id, "quantity": 1, "price": 150.0}])
+        await update_order_status(session, done.id, OrderStatus.COMPLETED)
+        await update_order_status(session, other.id, OrderStatus.CONFIRMED)
+        
+        page = await get_user_orders_page(session, user.id, exclude_status=OrderStatus.PENDING)
+        assert page.total == 2
+        assert [o.id for o in page.orders] == [other.id, done.id]
+        
+        page = await get_user_orders_page(session, user.id, exclude_status=OrderStatus.PENDING, dish_name="борщ")
+        assert page.total == 1
+        assert [o.id for o in page.orders] == [done.id]
+        
+        page = await get_user_orders_page(session, user.id, date_from=datetime(2030, 5, 10), date_to=datetime(2030, 5, 10))
+        assert [o.id for o in page.orders] == [pending.id]
+
+@pytest.mark.asyncio
+async def test_list_screens_use_single_projection_query(test_db, statement_budget):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dishes = [await add_dish(session, f"Блюдо {i}", "", 100.0, "Супы") for i in range(3)]
+        items = [{"dish_id": d.id, "quantity": 2, "price": d.price} for d in dishes]
+        for day in range(1, 13):
+            await create_order(session, user.id, datetime(2030, 5, day), items)
+    
+    async with async_session() as session:
+        with statement_budget(async_session, 1, "order rows"):
+            rows = await get_order_rows(session, date=datetime(2030, 5, 1))
+        with statement_budget(async_session, 2, "orders page"):
+            page = await get_all_orders_page(session, limit=10)
+        # Строки не попадают в сессию как ORM-объекты
+        assert not any(isinstance(obj, Order) for obj in session.identity_map.values())
+    
+    assert rows[0].items_count == 6
+    assert rows[0].total_amount == 600.0
+    assert rows[0].user_name == "Test User"
+    assert len(page.orders) == 10 and page.total == 12
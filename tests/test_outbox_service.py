@@ -0,0 +1,118 @@
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from models.notification_outbox import NotificationOutbox, OutboxStatus
+from models.user import UserRole
+from services.order_service import create_order
+from services.outbox_service import OutboxDispatcher, enqueue_notification
+from services.user_service import get_or_create_user, update_user
+from services.menu_management_service import add_dish
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_session
+
+    await engine.dispose()
+
+class FakeBot:
+    def __init__(self, fail_for=None, error=None):
+        self.sent = []
+        self.fail_for = fail_for or set()
+        self.error = error
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if chat_id in self.fail_for:
+            raise self.error
+        self.sent.append((chat_id, text))
+
+async def _rows(async_session):
+    async with async_session() as session:
+        result = await session.execute(select(NotificationOutbox).order_by(NotificationOutbox.id))
+        return list(result.scalars().all())
+
+@pytest.mark.asyncio
+async def test_order_enqueues_admin_notifications_in_same_transaction(test_db):
+    async_session = test_db
+
+    async with async_session() as session:
+        admin = await get_or_create_user(session, 7001, "admin", "Admin")
+        await update_user(session, admin.id, role=UserRole.MANAGER)
+        user = await get_or_create_user(session, 7002, "user", "User")
+        dish = await add_dish(session, "Борщ", "Описание", 100.0, "Супы")
+        items = [{"dish_id": dish.id, "quantity": 2, "price": dish.price}]
+
+        order = await create_order(session, user.id, datetime(2030, 5, 15), items, notify_admins=True)
+        await create_order(session, user.id, datetime(2030, 5, 15), items)
+
+    rows = await _rows(async_session)
+    assert [(row.chat_id, row.event, row.status) for row in rows] == [(7001, "new_order", OutboxStatus.PENDING)]
+
+    bot = FakeBot()
+    dispatcher = OutboxDispatcher(async_session)
+    assert await dispatcher.process_batch(bot) == 1
+    assert await dispatcher.process_batch(bot) == 0
+
+    assert len(bot.sent) == 1
+    chat_id, text = bot.sent[0]
+    assert chat_id == 7001 and f"Заказ #{order.id}" in text and "Борщ" in text
+    assert (await _rows(async_session))[0].status == OutboxStatus.SENT
+
+@pytest.mark.asyncio
+async def test_failed_notifications_are_retried_then_dead_lettered(test_db):
+    async_session = test_db
+    async with async_session() as session:
+        await enqueue_notification(session, [7101, 7102], "text", {"text": "Привет"})
+        await session.commit()
+
+    dispatcher = OutboxDispatcher(async_session, max_attempts=2, backoff=0)
+    forbidden = TelegramForbiddenError(SendMessage(chat_id=7102, text="x"), "bot was blocked by the user")
+    bot = FakeBot(fail_for={7101}, error=RuntimeError("network down"))
+
+    with patch("services.broadcast_service.mark_users_blocked") as mark_users_blocked:
+        await dispatcher.process_batch(bot)
+        rows = await _rows(async_session)
+        assert rows[0].status == OutboxStatus.PENDING and rows[0].attempts == 1
+        assert rows[1].status == OutboxStatus.SENT
+
+        await dispatcher.process_batch(bot)
+        rows = await _rows(async_session)
+        assert rows[0].status == OutboxStatus.DEAD and "network down" in rows[0].last_error
+
+        async with async_session() as session:
+            await enqueue_notification(session, [7102], "text", {"text": "Еще раз"})
+            await session.commit()
+        await dispatcher.process_batch(FakeBot(fail_for={7102}, error=forbidden))
+
+    mark_users_blocked.assert_awaited_once_with([7102])
+    assert (await _rows(async_session))[2].status == OutboxStatus.DEAD
+    assert (await dispatcher.stats())["queue"] == {"pending": 0, "sent": 1, "dead": 2}
+
+@pytest.mark.asyncio
+async def test_claimed_rows_are_not_sent_twice(test_db):
+    async_session = test_db
+    async with async_session() as session:
+        await enqueue_notification(session, [7201, 7202, 7203], "text", {"text": "Обед"})
+        await session.commit()
+
+    first, second = OutboxDispatcher(async_session, batch_size=2), OutboxDispatcher(async_session, batch_size=2)
+    bot = FakeBot()
+
+    assert await first.process_batch(bot) == 2
+    assert await second.process_batch(bot) == 1
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [7201, 7202, 7203]
@@ -0,0 +1,102 @@
+import pytest
+from datetime import datetime
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from database.query_monitor import (
+    normalize_sql, parameter_shape, statement_scope, report_statement_budget, install_query_monitor
+)
+from services.cafe_service import create_cafe, load_cafe_menu_for_date
+from services.menu_management_service import add_dish
+from services.order_service import create_order
+from services.user_service import get_or_create_user
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_session
+
+    await engine.dispose()
+
+@pytest.fixture
+def log_messages():
+    messages = []
+    handler_id = logger.add(lambda message: messages.append(str(message)), level="WARNING")
+    yield messages
+    logger.remove(handler_id)
+
+def test_normalize_sql_and_parameter_shape():
+    assert normalize_sql("SELECT *\n  FROM dishes WHERE id = 15 AND name = 'Борщ'") == \
+        "SELECT * FROM dishes WHERE id = ? AND name = ?"
+    assert normalize_sql("SELECT * FROM dishes WHERE id IN (?, ?, ?)") == \
+        normalize_sql("SELECT * FROM dishes WHERE id IN (?)")
+    assert normalize_sql("SELECT * FROM t WHERE a = $1 AND b IN ($2, $3)") == \
+        "SELECT * FROM t WHERE a = $? AND b IN (...)"
+
+    assert parameter_shape((1, "a", None)) == "(int, str, null)"
+    assert parameter_shape({"id": 1}) == "{id: int}"
+    assert parameter_shape([(1, "a"), (2, "b")], executemany=True) == "2 x (int, str)"
+
+@pytest.mark.asyncio
+async def test_slow_queries_are_logged_with_shape(test_db, log_messages):
+    engine = test_db.kw["bind"]
+    install_query_monitor(engine, slow_threshold_ms=0.000001)
+
+    async with test_db() as session:
+        await session.execute(text("SELECT :value"), {"value": 42})
+
+    slow = [message for message in log_messages if "Медленный запрос" in message]
+    assert slow and "SELECT ?" in slow[0] and "(int)" in slow[0]
+
+@pytest.mark.asyncio
+async def test_repeated_statements_are_reported_as_n_plus_one(test_db, log_messages):
+    install_query_monitor(test_db.kw["bind"], slow_threshold_ms=0)
+
+    async with test_db() as session:
+        with statement_scope("update 1 callback_query:order_details") as counter:
+            for dish_id in range(6):
+                await session.execute(text(f"SELECT * FROM dishes WHERE id = {dish_id}"))
+
+    assert counter.count == 6
+    assert report_statement_budget(counter, budget=10, repeat_threshold=5)
+    assert "возможный N+1" in log_messages[-1]
+    assert not report_statement_budget(counter, budget=10, repeat_threshold=0)
+    assert report_statement_budget(counter, budget=5, repeat_threshold=0)
+
+@pytest.mark.asyncio
+async def test_create_order_statements_do_not_grow_with_items(test_db, statement_budget):
+    async_session = test_db
+    order_date = datetime(2030, 5, 15)
+
+    async with async_session() as session:
+        user = await get_or_create_user(session, 9001, "user", "User")
+        cafe = await create_cafe(session, "Test Cafe")
+        dishes = [await add_dish(session, f"Блюдо {i}", "", 100.0, "Супы") for i in range(5)]
+        await load_cafe_menu_for_date(session, cafe.id, order_date, [d.id for d in dishes], [10] * 5)
+
+    counts = []
+    for dishes_in_order in (dishes[:1], dishes):
+        items = [{"dish_id": d.id, "quantity": 1, "price": d.price} for d in dishes_in_order]
+        async with async_session() as session:
+            with statement_budget(async_session, 15, "create_order") as counter:
+                await create_order(session, user.id, order_date, items, cafe_id=cafe.id)
+        # SQLite не пакетирует INSERT ... RETURNING без sentinel-столбца, поэтому
+        # позиции вставляются по одной; в PostgreSQL это один запрос
+        item_inserts = sum(
+            count for sql, count in counter.statements.items() if sql.startswith("INSERT INTO order_items")
+        )
+        counts.append(counter.count - item_inserts)
+
+    # Остатки резервируются одним UPDATE, агрегаты - одним upsert на таблицу
+    assert counts[0] == counts[1]
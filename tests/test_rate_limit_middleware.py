@@ -0,0 +1,88 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+from aiogram.types import User, Message, CallbackQuery, Chat
+from middleware.rate_limit_middleware import BucketLimit, RateLimitStore, RateLimitMiddleware
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _make_message(user_id: int = 1) -> Message:
+    return Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="Test"),
+        text="/menu"
+    )
+
+def _make_callback(user_id: int = 1) -> CallbackQuery:
+    return CallbackQuery(
+        id="1",
+        from_user=User(id=user_id, is_bot=False, first_name="Test"),
+        chat_instance="1",
+        data="start"
+    )
+
+def test_bucket_refills_over_time():
+    clock = FakeClock()
+    store = RateLimitStore(BucketLimit(capacity=3, refill_rate=1), clock=clock)
+
+    assert [store.consume(1) is None for _ in range(4)] == [True, True, True, False]
+
+    clock.now = 1.0
+    assert store.consume(1) is None
+    assert store.consume(1) is not None
+    assert store.stats()["throttled"] == 2
+
+def test_managers_use_their_own_limit():
+    clock = FakeClock()
+    store = RateLimitStore(BucketLimit(capacity=1, refill_rate=1), manager_limit=None, managers={42}, clock=clock)
+
+    assert all(store.consume(42) is None for _ in range(100))
+
+    store.set_manager(7, True)
+    store.set_manager(42, False)
+    assert store.consume(7) is None and store.consume(7) is None
+    assert store.consume(42) is None
+    assert store.consume(42) is not None
+
+def test_sweep_drops_only_refilled_buckets():
+    clock = FakeClock()
+    store = RateLimitStore(BucketLimit(capacity=10, refill_rate=1), sweep_interval=5, clock=clock)
+
+    store.consume(1)
+    clock.now = 6.0
+    store.consume(2)
+    assert store.stats()["buckets"] == 2
+
+    clock.now = 11.0
+    assert store.sweep() == 1
+    assert store.stats()["buckets"] == 1
+
+@pytest.mark.asyncio
+async def test_middleware_shares_bucket_across_event_types():
+    clock = FakeClock()
+    store = RateLimitStore(BucketLimit(capacity=3, refill_rate=1), clock=clock)
+    middleware = RateLimitMiddleware(store, message_cost=2, callback_cost=1)
+    handler = AsyncMock()
+
+    with patch.object(Message, "answer", new_callable=AsyncMock) as message_answer, \
+            patch.object(CallbackQuery, "answer", new_callable=AsyncMock) as callback_answer:
+        await middleware(handler, _make_message(), {})
+        await middleware(handler, _make_callback(), {})
+        await middleware(handler, _make_callback(), {})
+        await middleware(handler, _make_message(), {})
+        await middleware(handler, _make_callback(), {})
+
+        assert handler.await_count == 2
+        # Предупреждение отправляется один раз за серию отклоненных событий
+        assert callback_answer.await_args_list[0].kwargs == {"show_alert": True}
+        assert callback_answer.await_args_list[1].kwargs == {}
+        message_answer.assert_not_awaited()
+
+    assert store.stats()["throttled_by_type"] == {"CallbackQuery": 2, "Message": 1}
@@ -0,0 +1,66 @@
+import pytest
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+import database.database as database_module
+from database.base import Base
+from database.database import update_scope, read_from_primary
+from services.order_service import create_order, get_all_orders
+from services.report_service import get_orders_summary
+from services.user_service import get_or_create_user
+
+async def _make_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+@pytest.fixture
+async def primary_and_replica(monkeypatch):
+    primary_engine, primary = await _make_db()
+    replica_engine, replica = await _make_db()
+    monkeypatch.setattr(database_module, "read_session", replica)
+
+    yield primary, replica
+
+    await primary_engine.dispose()
+    await replica_engine.dispose()
+
+async def _place_order(async_session, telegram_id: int):
+    async with async_session() as session:
+        user = await get_or_create_user(session, telegram_id, "user", "User")
+        await create_order(session, user.id, datetime(2030, 5, 15), [])
+
+@pytest.mark.asyncio
+async def test_read_only_services_use_replica_unless_opted_out(primary_and_replica):
+    primary, replica = primary_and_replica
+    await _place_order(primary, 1)
+    await _place_order(replica, 2)
+    await _place_order(replica, 3)
+
+    async with primary() as session:
+        assert len(await get_all_orders(session)) == 2
+        assert (await get_orders_summary(session, datetime(2030, 5, 15)))["total_orders"] == 2
+
+        with read_from_primary():
+            assert len(await get_all_orders(session)) == 1
+
+@pytest.mark.asyncio
+async def test_update_scope_reuses_one_replica_session(primary_and_replica):
+    primary, replica = primary_and_replica
+    await _place_order(replica, 2)
+
+    async with update_scope(primary) as scope:
+        session = scope.get_session()
+        first = await get_all_orders(session)
+        second = await get_all_orders(session)
+        replica_session = scope.read_session
+
+        assert replica_session is not None
+        assert first[0] is second[0]
+
+    assert scope.read_session is None
@@ -0,0 +1,106 @@
+import pytest
+from datetime import date, datetime, timedelta
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from models.user import User
+from models.office import Office
+from models.cafe import Cafe
+from models.order import Order, OrderStatus
+from models.order_deadline import OrderDeadline
+from services.reminder_service import (
+    plan_deadline_reminders, schedule_deadline_reminders, get_reminder_recipients, default_deadline_time
+)
+
+DAY = date(2030, 5, 15)
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as session:
+        yield session
+
+    await engine.dispose()
+
+async def _seed(session: AsyncSession):
+    office = Office(name="Офис")
+    session.add(office)
+    await session.flush()
+    cafes = [Cafe(name="Кафе 1", office_id=office.id), Cafe(name="Кафе 2", office_id=office.id)]
+    users = [
+        User(telegram_id=1, office_id=office.id),
+        User(telegram_id=2, office_id=office.id),
+        User(telegram_id=3, office_id=office.id, is_blocked=True),
+        User(telegram_id=4)
+    ]
+    session.add_all(cafes + users)
+    await session.flush()
+
+    order_date = datetime.combine(DAY, datetime.min.time())
+    session.add_all([
+        Order(user_id=users[0].id, cafe_id=cafes[0].id, order_date=order_date, status=OrderStatus.PENDING),
+        Order(user_id=users[1].id, cafe_id=cafes[1].id, order_date=order_date, status=OrderStatus.PENDING),
+        Order(user_id=users[1].id, cafe_id=cafes[1].id, order_date=order_date, status=OrderStatus.CONFIRMED),
+        Order(user_id=users[2].id, cafe_id=cafes[0].id, order_date=order_date, status=OrderStatus.PENDING),
+        Order(user_id=users[3].id, cafe_id=cafes[0].id, order_date=order_date, status=OrderStatus.PENDING)
+    ])
+    await session.commit()
+    return office, cafes
+
+@pytest.mark.asyncio
+async def test_plan_uses_default_deadline_without_records(test_db):
+    plans = await plan_deadline_reminders(test_db, DAY)
+
+    assert [plan.minutes_left for plan in plans] == [60, 30]
+    assert all(plan.deadline_id is None for plan in plans)
+    assert plans[0].fire_at == default_deadline_time(DAY) - timedelta(hours=1)
+
+@pytest.mark.asyncio
+async def test_recipients_follow_most_specific_deadline(test_db):
+    office, cafes = await _seed(test_db)
+    cafe_deadline = OrderDeadline(
+        date=datetime(2030, 5, 15), deadline_time=datetime(2030, 5, 15, 10, 0), cafe_id=cafes[0].id
+    )
+    office_deadline = OrderDeadline(
+        date=datetime(2030, 5, 15), deadline_time=datetime(2030, 5, 15, 11, 0), office_id=office.id
+    )
+    test_db.add_all([cafe_deadline, office_deadline])
+    await test_db.commit()
+
+    plans = await plan_deadline_reminders(test_db, DAY)
+    assert {plan.deadline_id for plan in plans} == {cafe_deadline.id, office_deadline.id, None}
+
+    cafe_recipients = await get_reminder_recipients(test_db, DAY, cafe_deadline.id)
+    office_recipients = await get_reminder_recipients(test_db, DAY, office_deadline.id)
+    default_recipients = await get_reminder_recipients(test_db, DAY, None)
+
+    # Заблокированный пользователь и подтвержденные заказы не получают напоминаний
+    assert sorted(telegram_id for telegram_id, _ in cafe_recipients) == [1, 4]
+    assert [telegram_id for telegram_id, _ in office_recipients] == [2]
+    assert default_recipients == []
+
+@pytest.mark.asyncio
+async def test_schedule_replaces_jobs_for_day(test_db):
+    scheduler = AsyncIOScheduler()
+    now = datetime(2030, 5, 15, 0, 0)
+
+    assert await schedule_deadline_reminders(test_db, [DAY], scheduler, now=now) == 2
+
+    test_db.add(OrderDeadline(date=datetime(2030, 5, 15), deadline_time=datetime(2030, 5, 15, 9, 0)))
+    await test_db.commit()
+
+    late = datetime(2030, 5, 15, 8, 15)
+    assert await schedule_deadline_reminders(test_db, [DAY], scheduler, now=late) == 1
+    jobs = scheduler.get_jobs()
+    assert len(jobs) == 1
+    assert jobs[0].args[2] == 30
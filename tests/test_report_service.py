@@ -1,11 +1,14 @@
 import pytest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import StaticPool
 from services.report_service import (
     get_orders_summary,
     get_dish_statistics,
-    get_user_statistics
+    get_user_statistics,
+    get_period_report,
+    month_range,
+    quarter_range
 )
 from services.user_service import get_or_create_user
 from services.menu_management_service import add_dish
@@ -117,3 +120,149 @@ async def test_get_user_statistics(test_db):
 
 
 
+async def _legacy_python_statistics(session, date):
+    """Прежняя реализация отчетов: загрузка ORM-строк и подсчет в Python"""
+    from collections import defaultdict
+    from sqlalchemy import select, and_
+    from models.order import Order, OrderItem
+    from models.dish import Dish
+    from models.user import User
+    
+    date_filter = []
+    if date:
+        date_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        date_end = date.replace(hour=23, minute=59, second=59, microsecond=999999)
+        date_filter = [Order.order_date >= date_start, Order.order_date <= date_end]
+    
+    orders = list((await session.execute(select(Order).where(*date_filter))).scalars().all())
+    summary = {
+        "total_orders": len(orders),
+        "total_amount": sum(order.total_amount for order in orders),
+        "unique_users": len(set(order.user_id for order in orders))
+    }
+    
+    rows = (await session.execute(
+        select(OrderItem, Dish, Order)
+        .join(Dish, OrderItem.dish_id == Dish.id)
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(and_(*date_filter, Order.status != OrderStatus.CANCELLED))
+    )).all()
+    dish_stats = defaultdict(lambda: {"quantity": 0, "revenue": 0.0, "name": ""})
+    for order_item, dish, order in rows:
+        dish_stats[dish.id]["name"] = dish.name
+        dish_stats[dish.id]["quantity"] += order_item.quantity
+        dish_stats[dish.id]["revenue"] += order_item.price * order_item.quantity
+    dishes = {dish_id: stats for dish_id, stats in dish_stats.items()}
+    
+    rows = (await session.execute(
+        select(Order, User)
+        .join(User, Order.user_id == User.id)
+        .where(and_(*date_filter, Order.status != OrderStatus.CANCELLED))
+    )).all()
+    user_stats = defaultdict(lambda: {"orders_count": 0, "total_amount": 0.0, "name": ""})
+    for order, user in rows:
+        user_stats[user.id]["name"] = user.full_name or user.username or f"User {user.telegram_id}"
+        user_stats[user.id]["orders_count"] += 1
+        user_stats[user.id]["total_amount"] += order.total_amount
+    users = {user_id: stats for user_id, stats in user_stats.items()}
+    
+    return summary, dishes, users
+
+@pytest.mark.asyncio
+async def test_sql_aggregation_matches_python_implementation(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        users = [
+            await get_or_create_user(session, 111, "user1", "User 1"),
+            await get_or_create_user(session, 222, "user2", None),
+            await get_or_create_user(session, 333, None, None)
+        ]
+        dishes = [
+            await add_dish(session, f"Dish {i}", "Desc", 50.0 * i + 0.25, "Category")
+            for i in range(1, 5)
+        ]
+        
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        days = [today - timedelta(days=1), today, today + timedelta(hours=13, minutes=30)]
+        
+        for n in range(18):
+            user = users[n % len(users)]
+            order_items = [
+                {"dish_id": dishes[(n + k) % len(dishes)].id, "quantity": 1 + (n + k) % 3, "price": dishes[(n + k) % len(dishes)].price}
+                for k in range(1 + n % 3)
+            ]
+            order = await create_order(session, user.id, days[n % len(days)], order_items)
+            if n % 5 == 0:
+                await update_order_status(session, order.id, OrderStatus.CANCELLED)
+        
+        for date in (None, today, today - timedelta(days=1), today + timedelta(days=3)):
+            expected_summary, expected_dishes, expected_users = await _legacy_python_statistics(session, date)
+            
+            summary = await get_orders_summary(session, date)
+            assert summary["total_orders"] == expected_summary["total_orders"]
+            assert summary["unique_users"] == expected_summary["unique_users"]
+            assert summary["total_amount"] == pytest.approx(expected_summary["total_amount"])
+            assert "orders" not in summary
+            
+            dish_stats = await get_dish_statistics(session, date)
+            assert {s["dish_id"] for s in dish_stats} == set(expected_dishes)
+            for stat in dish_stats:
+                expected = expected_dishes[stat["dish_id"]]
+                assert stat["name"] == expected["name"]
+                assert stat["quantity"] == expected["quantity"]
+                assert stat["revenue"] == pytest.approx(expected["revenue"])
+            assert [s["quantity"] for s in dish_stats] == sorted((s["quantity"] for s in dish_stats), reverse=True)
+            
+            user_stats = await get_user_statistics(session, date)
+            assert {s["user_id"] for s in user_stats} == set(expected_users)
+            for stat in user_stats:
+                expected = expected_users[stat["user_id"]]
+                assert stat["name"] == expected["name"]
+                assert stat["orders_count"] == expected["orders_count"]
+                assert stat["total_amount"] == pytest.approx(expected["total_amount"])
+                assert stat["avg_order"] == pytest.approx(expected["total_amount"] / expected["orders_count"])
+            assert [s["orders_count"] for s in user_stats] == sorted((s["orders_count"] for s in user_stats), reverse=True)
+
+@pytest.mark.asyncio
+async def test_get_period_report(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user1 = await get_or_create_user(session, 111, "user1", "User 1")
+        user2 = await get_or_create_user(session, 222, "user2", "User 2")
+        dish = await add_dish(session, "Test Dish", "Description", 100.0, "Category")
+        items = [{"dish_id": dish.id, "quantity": 1, "price": dish.price}]
+        
+        await create_order(session, user1.id, datetime(2024, 3, 31, 12, 0), items)
+        await create_order(session, user1.id, datetime(2024, 4, 1, 12, 0), items)
+        await create_order(session, user2.id, datetime(2024, 4, 1, 13, 0), items)
+        await create_order(session, user1.id, datetime(2024, 4, 30, 12, 0), items)
+        cancelled = await create_order(session, user2.id, datetime(2024, 4, 30, 13, 0), items)
+        await update_order_status(session, cancelled.id, OrderStatus.CANCELLED)
+        await create_order(session, user2.id, datetime(2024, 5, 1, 12, 0), items)
+        
+        date_from, date_to = month_range(2024, 4)
+        report = await get_period_report(session, date_from, date_to)
+        
+        assert report["total_orders"] == 3
+        assert report["total_amount"] == 300.0
+        assert report["unique_users"] == 2
+        assert [(d["day"], d["total_orders"], d["unique_users"]) for d in report["days"]] == [
+            (date(2024, 4, 1), 2, 2),
+            (date(2024, 4, 30), 1, 1)
+        ]
+        
+        quarter = await get_period_report(session, *quarter_range(2024, 2))
+        assert quarter["total_orders"] == 4
+        
+        empty = await get_period_report(session, *month_range(2023, 12))
+        assert empty["total_orders"] == 0
+        assert empty["days"] == []
+
+def test_month_and_quarter_ranges():
+    assert month_range(2024, 2) == (date(2024, 2, 1), date(2024, 3, 1))
+    assert month_range(2024, 12) == (date(2024, 12, 1), date(2025, 1, 1))
+    assert quarter_range(2024, 4) == (date(2024, 10, 1), date(2025, 1, 1))
+    with pytest.raises(ValueError):
+        quarter_range(2024, 5)
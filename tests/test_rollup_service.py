@@ -0,0 +1,193 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from services.rollup_service import rebuild_daily_rollups, check_rollup_consistency, backfill_rollups_if_empty
+from services.report_service import (
+    get_orders_summary,
+    get_dish_statistics,
+    get_user_statistics,
+    get_rollup_summary,
+    get_rollup_dish_statistics,
+    get_rollup_user_statistics,
+    get_user_personal_statistics
+)
+from services.user_service import get_or_create_user
+from services.menu_management_service import add_dish
+from services.order_service import (
+    create_order,
+    cancel_order,
+    update_order_status,
+    update_order,
+    get_order_by_id,
+    add_item_to_order,
+    remove_item_from_order
+)
+from models.order import OrderStatus
+from models.daily_stats import DailyDishStats, DailyUserStats, DailyCafeStats
+from database.base import Base
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    yield async_session
+    
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_rollups_follow_order_changes(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish1 = await add_dish(session, "Dish 1", "Desc", 100.0, "Category")
+        dish2 = await add_dish(session, "Dish 2", "Desc", 200.0, "Category")
+        today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        
+        order = await create_order(session, user.id, today, [
+            {"dish_id": dish1.id, "quantity": 2, "price": dish1.price}
+        ])
+        assert await check_rollup_consistency(session) == []
+        
+        assert await add_item_to_order(session, order.id, user.id, dish2.id, 1, dish2.price)
+        assert await check_rollup_consistency(session) == []
+        
+        order = await update_order(session, order.id, user.id, [
+            {"dish_id": dish1.id, "quantity": 1, "price": dish1.price},
+            {"dish_id": dish2.id, "quantity": 3, "price": dish2.price}
+        ])
+        assert await check_rollup_consistency(session) == []
+        
+        order = await get_order_by_id(session, order.id, user.id)
+        item_id = next(item.id for item in order.items if item.dish_id == dish1.id)
+        assert await remove_item_from_order(session, order.id, user.id, item_id)
+        assert await check_rollup_consistency(session) == []
+        
+        await update_order_status(session, order.id, OrderStatus.CONFIRMED)
+        assert await check_rollup_consistency(session) == []
+        
+        summary = await get_rollup_summary(session)
+        assert summary["total_orders"] == 1
+        assert summary["total_amount"] == 600.0
+        
+        other_order = await create_order(session, user.id, today, [
+            {"dish_id": dish1.id, "quantity": 1, "price": dish1.price}
+        ])
+        assert await cancel_order(session, other_order.id, user.id)
+        assert await check_rollup_consistency(session) == []
+        
+        await update_order_status(session, order.id, OrderStatus.CANCELLED)
+        assert await check_rollup_consistency(session) == []
+        assert (await get_rollup_summary(session))["total_orders"] == 0
+
+@pytest.mark.asyncio
+async def test_rebuild_daily_rollups(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish = await add_dish(session, "Dish", "Desc", 100.0, "Category")
+        today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        items = [{"dish_id": dish.id, "quantity": 2, "price": dish.price}]
+        
+        await create_order(session, user.id, today, items)
+        await create_order(session, user.id, today - timedelta(days=1), items)
+        
+        for model in (DailyDishStats, DailyUserStats, DailyCafeStats):
+            await session.execute(delete(model))
+        await session.commit()
+        assert await check_rollup_consistency(session) != []
+        
+        written = await rebuild_daily_rollups(session, today.date(), today.date() + timedelta(days=1))
+        assert written == {"daily_dish_stats": 1, "daily_user_stats": 1, "daily_cafe_stats": 1}
+        assert await check_rollup_consistency(session, today.date(), today.date() + timedelta(days=1)) == []
+        assert await check_rollup_consistency(session) != []
+        
+        await rebuild_daily_rollups(session)
+        assert await check_rollup_consistency(session) == []
+
+@pytest.mark.asyncio
+async def test_backfill_rollups_if_empty(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        assert not await backfill_rollups_if_empty(session)
+        
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish = await add_dish(session, "Dish", "Desc", 100.0, "Category")
+        items = [{"dish_id": dish.id, "quantity": 2, "price": dish.price}]
+        await create_order(session, user.id, datetime(2030, 5, 15, 12, 0), items)
+        
+        # Агрегаты уже ведутся - повторный пересчет не нужен
+        assert not await backfill_rollups_if_empty(session)
+        
+        for model in (DailyDishStats, DailyUserStats, DailyCafeStats):
+            await session.execute(delete(model))
+        await session.commit()
+        
+        assert await backfill_rollups_if_empty(session)
+        assert await check_rollup_consistency(session) == []
+        assert (await get_rollup_summary(session))["total_orders"] == 1
+
+@pytest.mark.asyncio
+async def test_rollup_reports_match_raw_reports(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user1 = await get_or_create_user(session, 111, "user1", "User 1")
+        user2 = await get_or_create_user(session, 222, "user2", "User 2")
+        dish1 = await add_dish(session, "Dish 1", "Desc", 100.0, "Category")
+        dish2 = await add_dish(session, "Dish 2", "Desc", 200.0, "Category")
+        today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        
+        await create_order(session, user1.id, today, [
+            {"dish_id": dish1.id, "quantity": 2, "price": dish1.price},
+            {"dish_id": dish2.id, "quantity": 1, "price": dish2.price}
+        ])
+        await create_order(session, user2.id, today, [
+            {"dish_id": dish2.id, "quantity": 3, "price": dish2.price}
+        ])
+        await create_order(session, user1.id, today - timedelta(days=1), [
+            {"dish_id": dish1.id, "quantity": 5, "price": dish1.price}
+        ])
+        
+        day_from = today.date()
+        day_to = day_from + timedelta(days=1)
+        
+        assert await get_rollup_summary(session, day_from, day_to) == await get_orders_summary(session, today)
+        assert await get_rollup_dish_statistics(session, day_from, day_to) == await get_dish_statistics(session, today)
+        assert await get_rollup_user_statistics(session, day_from, day_to) == await get_user_statistics(session, today)
+        
+        personal = await get_user_personal_statistics(session, user1.id)
+        assert personal["orders_count"] == 2
+        assert personal["total_amount"] == 900.0
+        assert personal["total_items"] == 8
+        assert personal["top_dishes"][0]["dish_id"] == dish1.id
+        assert personal["top_dishes"][0]["count"] == 7
+
+@pytest.mark.asyncio
+async def test_personal_statistics_use_same_period_for_totals_and_dishes(test_db):
+    async_session = test_db
+    
+    async with async_session() as session:
+        user = await get_or_create_user(session, 123456, "testuser", "Test User")
+        dish = await add_dish(session, "Dish", "Desc", 100.0, "Category")
+        items = [{"dish_id": dish.id, "quantity": 2, "price": dish.price}]
+        await create_order(session, user.id, datetime(2030, 5, 15, 18, 0), items)
+        
+        # date_to в середине дня покрывает весь день и в итогах, и в топе блюд
+        personal = await get_user_personal_statistics(
+            session, user.id, datetime(2030, 5, 15), datetime(2030, 5, 15, 12, 0)
+        )
+        assert personal["orders_count"] == 1
+        assert personal["top_dishes"][0]["count"] == 2
@@ -0,0 +1,63 @@
+import pytest
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database.base import Base
+from services.menu_management_service import add_dish, update_dish, delete_dish
+from services.order_service import create_order, search_user_orders_by_dish
+from services.search_service import search_dishes
+from services.user_service import get_or_create_user
+
+@pytest.fixture
+async def test_db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield async_session
+
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_dish_search_matches_name_and_description(test_db):
+    async with test_db() as session:
+        borsch = await add_dish(session, "Борщ украинский", "со сметаной", 100.0, "Супы")
+        plov = await add_dish(session, "Плов", "Рис, баранина", 150.0, "Горячее")
+        await add_dish(session, "Tea", "", 50.0, "Напитки")
+
+        assert [d.id for d in await search_dishes(session, "БОРЩ")] == [borsch.id]
+        assert [d.id for d in await search_dishes(session, "сметан")] == [borsch.id]
+        assert [d.id for d in await search_dishes(session, "te")] != []
+
+        # Индекс следует за изменениями блюд
+        await update_dish(session, plov.id, name="Плов узбекский", description="")
+        assert [d.id for d in await search_dishes(session, "узбек")] == [plov.id]
+        assert await search_dishes(session, "баранина") == []
+
+        await delete_dish(session, borsch.id)
+        assert await search_dishes(session, "борщ") == []
+
+@pytest.mark.asyncio
+async def test_order_search_is_one_query_scoped_to_user(test_db, statement_budget):
+    async with test_db() as session:
+        user = await get_or_create_user(session, 1, "user", "User")
+        other = await get_or_create_user(session, 2, "other", "Other")
+        soup = await add_dish(session, "Борщ", "", 100.0, "Супы")
+        main = await add_dish(session, "Плов", "", 150.0, "Горячее")
+
+        mine = await create_order(session, user.id, datetime(2030, 5, 15), [{"dish_id": soup.id, "quantity": 1, "price": 100.0}])
+        await create_order(session, user.id, datetime(2030, 5, 16), [{"dish_id": main.id, "quantity": 1, "price": 150.0}])
+        await create_order(session, other.id, datetime(2030, 5, 15), [{"dish_id": soup.id, "quantity": 1, "price": 100.0}])
+
+    async with test_db() as session:
+        # Поиск - один запрос, остальные два - загрузка позиций и пользователя
+        with statement_budget(test_db, 3, "search_user_orders_by_dish"):
+            orders = await search_user_orders_by_dish(session, user.id, "борщ")
+
+    assert [order.id for order in orders] == [mine.id]
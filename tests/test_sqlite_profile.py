@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from database.base import Base
+from database.sqlite_profile import SQLiteWriteQueue, configure_sqlite_engine
+from models.dish import Dish
+from services.menu_management_service import add_dish
+
+@pytest.fixture
+async def sqlite_file(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'lunch_bot.db'}"
+    reader = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_size=3, max_overflow=0)
+    writer = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0)
+    configure_sqlite_engine(reader)
+    configure_sqlite_engine(writer, writer=True)
+
+    async with reader.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    queue = SQLiteWriteQueue(max_batch=50)
+    queue.bind(writer)
+
+    yield async_sessionmaker(reader, class_=AsyncSession, expire_on_commit=False), queue
+
+    await queue.stop()
+    await writer.dispose()
+    await reader.dispose()
+
+@pytest.mark.asyncio
+async def test_connections_use_wal_and_pragmas(sqlite_file):
+    async_session, _ = sqlite_file
+
+    async with async_session() as session:
+        journal_mode = (await session.execute(text("PRAGMA journal_mode"))).scalar()
+        synchronous = (await session.execute(text("PRAGMA synchronous"))).scalar()
+        busy_timeout = (await session.execute(text("PRAGMA busy_timeout"))).scalar()
+
+    assert journal_mode == "wal"
+    assert synchronous == 1  # NORMAL
+    assert busy_timeout > 0
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_are_group_committed(sqlite_file):
+    async_session, queue = sqlite_file
+
+    dishes = await asyncio.gather(*(
+        queue.submit(lambda session, i=i: add_dish(session, f"Блюдо {i}", "", 100.0, "Супы"))
+        for i in range(40)
+    ))
+
+    assert len({dish.id for dish in dishes}) == 40
+    stats = queue.get_stats()
+    assert stats["jobs"] == 40
+    assert stats["batches"] < 40
+    assert stats["largest_batch"] > 1
+
+    async with async_session() as session:
+        assert (await session.execute(select(func.count(Dish.id)))).scalar() == 40
+
+@pytest.mark.asyncio
+async def test_failed_job_rolls_back_only_its_savepoint(sqlite_file):
+    async_session, queue = sqlite_file
+
+    async def failing(session):
+        session.add_all([Dish(name="Откатится", price=100.0), Dish(name="Без цены", price=None)])
+        await session.commit()
+
+    results = await asyncio.gather(
+        queue.submit(lambda session: add_dish(session, "Борщ", "", 100.0, "Супы")),
+        queue.submit(failing),
+        queue.submit(lambda session: add_dish(session, "Плов", "", 150.0, "Горячее")),
+        return_exceptions=True
+    )
+
+    assert isinstance(results[1], Exception)
+    async with async_session() as session:
+        names = set((await session.execute(select(Dish.name))).scalars().all())
+    assert names == {"Борщ", "Плов"}
+    assert queue.get_stats()["failed_jobs"] == 1
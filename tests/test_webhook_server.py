@@ -0,0 +1,122 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from utils import webhook_server
+from utils.webhook_server import WebhookServer, SECRET_HEADER
+
+class FakeSession:
+    async def close(self):
+        pass
+
+class FakeBot:
+    def __init__(self):
+        self.session = FakeSession()
+        self.webhook = None
+
+    async def set_webhook(self, **kwargs):
+        self.webhook = kwargs
+
+class FakeDispatcher:
+    def __init__(self, block=None):
+        self.fed = []
+        self.block = block
+
+    async def emit_startup(self, **kwargs):
+        pass
+
+    async def emit_shutdown(self, **kwargs):
+        pass
+
+    def resolve_used_update_types(self):
+        return ["message", "callback_query"]
+
+    async def feed_update(self, bot, update):
+        if self.block is not None:
+            await self.block.wait()
+        self.fed.append(update.update_id)
+
+def _update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "User"},
+            "text": "/start"
+        }
+    }
+
+@pytest.fixture
+def webhook_settings(monkeypatch):
+    monkeypatch.setattr(webhook_server.settings, "WEBHOOK_URL", "https://example.com/")
+    monkeypatch.setattr(webhook_server.settings, "WEBHOOK_SHUTDOWN_TIMEOUT", 1)
+
+@pytest.mark.asyncio
+async def test_webhook_checks_secret_and_feeds_updates(webhook_settings):
+    bot, dispatcher = FakeBot(), FakeDispatcher()
+    server = WebhookServer(dispatcher, bot, secret_token="s3cret", queue_size=10, concurrency=2)
+
+    async with TestClient(TestServer(server.create_app())) as client:
+        assert bot.webhook["url"] == "https://example.com/webhook"
+        assert bot.webhook["secret_token"] == "s3cret"
+        assert bot.webhook["allowed_updates"] == ["message", "callback_query"]
+
+        response = await client.post("/webhook", json=_update(1), headers={SECRET_HEADER: "wrong"})
+        assert response.status == 401
+        response = await client.post("/webhook", json=_update(1))
+        assert response.status == 401
+
+        response = await client.post("/webhook", json=_update(2), headers={SECRET_HEADER: "s3cret"})
+        assert response.status == 200
+        await asyncio.wait_for(server.queue.join(), timeout=1)
+
+    assert dispatcher.fed == [2]
+    assert server.metrics()["unauthorized"] == 2
+    assert server.metrics()["processed"] == 1
+
+@pytest.mark.asyncio
+async def test_webhook_acks_before_processing_and_rejects_when_queue_full(webhook_settings):
+    block = asyncio.Event()
+    bot, dispatcher = FakeBot(), FakeDispatcher(block=block)
+    server = WebhookServer(dispatcher, bot, secret_token="s3cret", queue_size=2, concurrency=1)
+    headers = {SECRET_HEADER: "s3cret"}
+
+    async with TestClient(TestServer(server.create_app())) as client:
+        # Первый апдейт забирает обработчик, следующие два заполняют очередь
+        statuses = []
+        for update_id in range(1, 5):
+            response = await client.post("/webhook", json=_update(update_id), headers=headers)
+            statuses.append(response.status)
+            await asyncio.sleep(0)
+
+        assert statuses == [200, 200, 200, 503]
+        assert dispatcher.fed == []
+
+        block.set()
+        await asyncio.wait_for(server.queue.join(), timeout=1)
+
+    assert dispatcher.fed == [1, 2, 3]
+    assert server.metrics()["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_health_endpoints(webhook_settings, monkeypatch):
+    async def healthy():
+        return {"status": "healthy", "checks": {"database": {"status": "ok", "message": ""}}}
+
+    async def metrics(extra):
+        return "".join(f"quicklunch_webhook_{key} {value}\n" for key, value in extra.items())
+
+    monkeypatch.setattr(webhook_server, "check_system_health", healthy)
+    monkeypatch.setattr(webhook_server, "render_metrics", metrics)
+    server = WebhookServer(FakeDispatcher(), FakeBot(), secret_token="s3cret")
+
+    async with TestClient(TestServer(server.create_app())) as client:
+        assert (await client.get("/healthz")).status == 200
+
+        response = await client.get("/readyz")
+        assert response.status == 200
+        assert (await response.json())["checks"]["update_queue"]["status"] == "ok"
+
+        body = await (await client.get("/metrics")).text()
+        assert "quicklunch_webhook_queue_capacity 1000" in body
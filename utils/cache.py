@@ -1,38 +1,275 @@
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+"""
+Асинхронный in-memory кэш результатов функций
+
+- ключ строится по аргументам функции без AsyncSession
+- LRU-вытеснение с ограничением по числу записей и по размеру
+- TTL для каждой записи по монотонным часам
+- single-flight: одновременные промахи по одному ключу выполняют одну загрузку
+- инвалидация по тегам
+- счетчики попаданий, промахов и вытеснений для экрана состояния системы
+
+Кэшировать стоит только простые данные (строки, числа, списки, словари),
+а не ORM-объекты: результат разделяется между разными сессиями.
+"""
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from functools import wraps
+from typing import Optional, Dict, Any, Callable, Iterable, Tuple, FrozenSet
+from sqlalchemy.ext.asyncio import AsyncSession
+from config.settings import settings
 
-_cache: Dict[str, tuple[Any, datetime]] = {}
-_cache_ttl: Dict[str, timedelta] = {}
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    size: int
+    tags: FrozenSet[str]
 
-def cache_result(ttl_seconds: int = 300):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            
-            if cache_key in _cache:
-                value, timestamp = _cache[cache_key]
-                if datetime.now() - timestamp < timedelta(seconds=ttl_seconds):
-                    return value
-            
-            result = await func(*args, **kwargs)
-            _cache[cache_key] = (result, datetime.now())
-            return result
-        
-        return wrapper
-    return decorator
+@dataclass
+class _InFlight:
+    future: asyncio.Future
+    tags: FrozenSet[str]
+
+def _estimate_size(value: Any, _seen: Optional[set] = None) -> int:
+    """Приблизительный размер значения в байтах (с учетом вложенных контейнеров)"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k, _seen) + _estimate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_estimate_size(item, _seen) for item in value)
+    return size
+
+def make_cache_key(func: Callable, args: Tuple, kwargs: Dict[str, Any]) -> str:
+    """
+    Строит ключ кэша по функции и аргументам, пропуская сессии БД
+
+    Args:
+        func: Кэшируемая функция
+        args: Позиционные аргументы вызова
+        kwargs: Именованные аргументы вызова
+
+    Returns:
+        str: Ключ кэша
+    """
+    key_args = tuple(arg for arg in args if not isinstance(arg, AsyncSession))
+    key_kwargs = tuple(sorted(
+        (name, value) for name, value in kwargs.items()
+        if not isinstance(value, AsyncSession)
+    ))
+    return f"{func.__module__}.{func.__qualname__}:{key_args!r}:{key_kwargs!r}"
+
+class AsyncCache:
+    """
+    LRU-кэш с TTL, single-flight загрузкой и инвалидацией по тегам
+
+    Args:
+        max_entries: Максимальное число записей
+        max_bytes: Максимальный суммарный размер записей (приблизительно)
+        clock: Источник монотонного времени (для тестов)
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._tag_versions: Dict[str, int] = {}
+        self._generation = 0
+        self._bytes = 0
+        self._stats = dict.fromkeys(
+            ("hits", "misses", "coalesced", "evictions", "expirations", "invalidations"), 0
+        )
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry.expires_at <= self._clock():
+            self._remove(key)
+            self._stats["expirations"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry.value
+
+    def _store(self, key: str, value: Any, ttl_seconds: float, tags: FrozenSet[str]) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = _Entry(value, self._clock() + ttl_seconds, size, tags)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._stats["evictions"] += 1
+
+    def _tags_snapshot(self, tags: FrozenSet[str]) -> Tuple[int, Dict[str, int]]:
+        return self._generation, {tag: self._tag_versions.get(tag, 0) for tag in tags}
+
+    async def get_or_load(self, key: str, loader: Callable[[], Any], ttl_seconds: float,
+                          tags: Iterable[str] = ()) -> Any:
+        """
+        Возвращает значение из кэша или загружает его через loader
+
+        Одновременные промахи по одному ключу ждут одну загрузку. Если за время
+        загрузки один из тегов был инвалидирован, результат не сохраняется.
 
-def clear_cache(pattern: Optional[str] = None):
-    if pattern is None:
-        _cache.clear()
-    else:
-        keys_to_remove = [k for k in _cache.keys() if pattern in k]
+        Args:
+            key: Ключ кэша
+            loader: Корутинная функция без аргументов, загружающая значение
+            ttl_seconds: Время жизни записи
+            tags: Теги записи для инвалидации
+
+        Returns:
+            Значение из кэша или результат loader
+        """
+        tags = frozenset(tags)
+
+        while True:
+            found, value = self._lookup(key)
+            if found:
+                self._stats["hits"] += 1
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+
+            self._stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight.future)
+            except asyncio.CancelledError:
+                if not inflight.future.cancelled():
+                    raise
+                # Загрузивший запрос был отменен - пробуем загрузить сами
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        inflight = _InFlight(future, tags)
+        self._inflight[key] = inflight
+        versions = self._tags_snapshot(tags)
+
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Ожидающие получат исключение из future, сам загружающий - через raise;
+                # помечаем его полученным, чтобы asyncio не логировал future без ожидающих
+                future.exception()
+            raise
+        else:
+            if self._tags_snapshot(tags) == versions:
+                self._store(key, value, ttl_seconds, tags)
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is inflight:
+                del self._inflight[key]
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """
+        Удаляет все записи с любым из указанных тегов
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        tags = frozenset(tags)
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+        keys_to_remove = [key for key, entry in self._entries.items() if entry.tags & tags]
         for key in keys_to_remove:
-            _cache.pop(key, None)
+            self._remove(key)
+
+        for key in [key for key, inflight in self._inflight.items() if inflight.tags & tags]:
+            del self._inflight[key]
+
+        self._stats["invalidations"] += len(keys_to_remove)
+        return len(keys_to_remove)
 
+    def clear(self) -> None:
+        """Полностью очищает кэш (счетчики сохраняются)"""
+        self._generation += 1
+        self._entries.clear()
+        self._inflight.clear()
+        self._bytes = 0
 
+    def stats(self) -> Dict[str, Any]:
+        """
+        Возвращает счетчики кэша
 
+        Returns:
+            Dict с числом записей, размером, попаданиями, промахами и вытеснениями
+        """
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **self._stats,
+            "hit_rate": (self._stats["hits"] + self._stats["coalesced"]) / lookups if lookups else 0.0
+        }
+
+default_cache = AsyncCache(max_entries=settings.CACHE_MAX_ENTRIES, max_bytes=settings.CACHE_MAX_BYTES)
+
+def cache_result(ttl_seconds: int = 300, tags: Iterable[str] = (), cache: Optional[AsyncCache] = None):
+    """
+    Декоратор кэширования результата асинхронной функции
+
+    Запись всегда помечается тегом с именем функции, поэтому
+    invalidate_tags("get_dish_categories") сбрасывает все ее результаты.
+
+    Args:
+        ttl_seconds: Время жизни записи
+        tags: Дополнительные теги для инвалидации
+        cache: Экземпляр кэша (по умолчанию общий default_cache)
+    """
+    def decorator(func):
+        entry_tags = frozenset((func.__name__, *tags))
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            target = cache or default_cache
+            return await target.get_or_load(
+                make_cache_key(func, args, kwargs),
+                lambda: func(*args, **kwargs),
+                ttl_seconds,
+                entry_tags
+            )
+
+        return wrapper
+    return decorator
 
+def invalidate_tags(*tags: str) -> int:
+    """Удаляет из общего кэша все записи с указанными тегами"""
+    return default_cache.invalidate_tags(*tags)
 
+def clear_cache() -> None:
+    """Полностью очищает общий кэш"""
+    default_cache.clear()
 
+def get_cache_stats() -> Dict[str, Any]:
+    """Счетчики общего кэша"""
+    return default_cache.stats()
@@ -166,3 +166,19 @@ class CallbackData:
         except ValueError:
             return None
 
+    
+    @staticmethod
+    def create_orders_page(prefix: str, page: int, direction: str, cursor: str) -> str:
+        return f"{prefix}{page}_{direction}_{cursor}"
+    
+    @staticmethod
+    def parse_orders_page(prefix: str, callback_data: str) -> Optional[Tuple[int, str, str]]:
+        if not callback_data.startswith(prefix):
+            return None
+        try:
+            page, direction, cursor = callback_data.replace(prefix, "", 1).split("_", 2)
+            if direction not in ("a", "b"):
+                return None
+            return int(page), direction, cursor
+        except ValueError:
+            return None
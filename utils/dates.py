@@ -0,0 +1,46 @@
+"""
+Границы дней
+
+Заказы, меню и дедлайны хранят момент в DateTime-столбце и ключ дня
+в Date-столбце day (его заполняет слой моделей). Выборка за день - равенство
+по day, за период - полуоткрытый интервал дней [date_from, date_to).
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Optional, Tuple, Union
+
+DateLike = Union[date, datetime]
+
+def day_of(value: Optional[DateLike]) -> Optional[date]:
+    """Ключ дня для даты или даты-времени"""
+    if value is None:
+        return None
+    return value.date() if isinstance(value, datetime) else value
+
+def start_of_day(value: DateLike) -> datetime:
+    """Полночь того же дня"""
+    return datetime.combine(day_of(value), time.min)
+
+def day_bounds(value: DateLike) -> Tuple[datetime, datetime]:
+    """Начало дня и начало следующего дня (полуоткрытый интервал)"""
+    start = start_of_day(value)
+    return start, start + timedelta(days=1)
+
+def day_range_conditions(column, date_from: Optional[DateLike], date_to: Optional[DateLike]) -> list:
+    """Условия на Date-столбец для дней [date_from, date_to)"""
+    conditions = []
+    if date_from:
+        conditions.append(column >= day_of(date_from))
+    if date_to:
+        conditions.append(column < day_of(date_to))
+    return conditions
+
+def day_key_default(source: str) -> Callable[[Any], Optional[date]]:
+    """
+    Значение по умолчанию для столбца day при INSERT (в том числе через Core)
+
+    Args:
+        source: Имя DateTime-столбца, из которого берется день
+    """
+    def default(context) -> Optional[date]:
+        return day_of(context.get_current_parameters().get(source))
+    return default
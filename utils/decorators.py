@@ -1,8 +1,6 @@
 from functools import wraps
 from typing import Callable, Awaitable, Any
 from aiogram.types import Message, CallbackQuery
-from database.database import get_session
-from services.user_service import is_admin
 
 def admin_required(func: Callable) -> Callable:
     @wraps(func)
@@ -15,13 +13,14 @@ def admin_required(func: Callable) -> Callable:
                 await event.answer("Ошибка: не удалось определить пользователя", show_alert=True)
             return
         
-        async for session in get_session():
-            if not await is_admin(session, user_id):
-                if isinstance(event, Message):
-                    await event.answer("У вас нет прав администратора")
-                elif isinstance(event, CallbackQuery):
-                    await event.answer("У вас нет прав администратора", show_alert=True)
-                return
+        # Роль разрешается один раз в DatabaseMiddleware; aiogram передает
+        # user_is_admin, только если он объявлен в сигнатуре обработчика
+        if not kwargs.get("user_is_admin"):
+            if isinstance(event, Message):
+                await event.answer("У вас нет прав администратора")
+            elif isinstance(event, CallbackQuery):
+                await event.answer("У вас нет прав администратора", show_alert=True)
+            return
         
         return await func(event, *args, **kwargs)
     
@@ -1,100 +1,215 @@
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
-from datetime import datetime
-from io import BytesIO, StringIO
+"""
+Экспорт отчетов в Excel и CSV
+
+Книги пишутся в режиме write_only: ширина столбцов считается при
+добавлении строк, а сами строки копятся во временном файле
+(в памяти, пока он мал), после чего лист выводится одним проходом.
+Заголовки оформляются заранее зарегистрированным именованным стилем.
+
+Построение книги - синхронная работа, поэтому обработчики и планировщик
+вызывают ее через run_export (пул потоков, не больше
+EXPORT_MAX_CONCURRENCY выгрузок одновременно), а выгрузка заказов за
+период читает строки из курсора БД пачками по EXPORT_CHUNK_ROWS.
+"""
+import asyncio
 import csv
+import functools
+import pickle
+import tempfile
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle
+from openpyxl.utils import get_column_letter
+from config.settings import settings
 
-def export_orders_to_excel(orders_data: list[dict]) -> BytesIO:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Заказы"
-    
-    headers = ["ID", "Пользователь", "Дата", "Статус", "Сумма", "Блюда"]
-    ws.append(headers)
-    
-    header_font = Font(bold=True)
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center")
-    
-    for order in orders_data:
-        dishes_text = ", ".join([f"{item['name']} x{item['quantity']}" for item in order.get('items', [])])
-        ws.append([
-            order['id'],
-            order['user_name'],
-            order['date'].strftime('%d.%m.%Y'),
-            order['status'],
-            order['total_amount'],
-            dishes_text
-        ])
-    
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
+T = TypeVar("T")
+
+HEADER_STYLE = "export_header"
+MAX_COLUMN_WIDTH = 50
+ORDER_HEADERS = ["ID", "Пользователь", "Дата", "Статус", "Сумма", "Блюда"]
+
+# Строки листа в памяти до 1 МБ, дальше - во временном файле на диске
+_SPOOL_MAX_BYTES = 1024 * 1024
+
+def _header_style() -> NamedStyle:
+    return NamedStyle(name=HEADER_STYLE, font=Font(bold=True), alignment=Alignment(horizontal="center"))
+
+class ExportSheet:
+    """Лист книги: ширины столбцов считаются при добавлении строк"""
+
+    def __init__(self, title: str, header_rows: Iterable[int] = (1,)):
+        self.title = title
+        self.header_rows = set(header_rows)
+        self.widths: List[int] = []
+        self.row_count = 0
+        self._spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+
+    def append(self, row: Sequence[Any]) -> None:
+        self.append_many([row])
+
+    def append_many(self, rows: Iterable[Sequence[Any]]) -> None:
+        rows = [list(row) for row in rows]
+        for row in rows:
+            for index, value in enumerate(row):
+                length = len(str(value)) if value is not None else 0
+                if index == len(self.widths):
+                    self.widths.append(length)
+                elif length > self.widths[index]:
+                    self.widths[index] = length
+        self.row_count += len(rows)
+        pickle.dump(rows, self._spool, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _rows(self):
+        self._spool.seek(0)
+        while True:
             try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
+                chunk = pickle.load(self._spool)
+            except EOFError:
+                return
+            yield from chunk
+
+    def write_to(self, workbook: Workbook) -> None:
+        ws = workbook.create_sheet(self.title)
+        # В write_only ширины задаются до первой строки
+        for index, width in enumerate(self.widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = min(width + 2, MAX_COLUMN_WIDTH)
+        for row_index, row in enumerate(self._rows(), 1):
+            if row_index in self.header_rows:
+                row = [_styled_cell(ws, value) for value in row]
+            ws.append(row)
+        self._spool.close()
+
+def _styled_cell(ws, value) -> WriteOnlyCell:
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = HEADER_STYLE
+    return cell
+
+class ExportWorkbook:
+    """Книга из листов ExportSheet, сохраняемая в режиме write_only"""
+
+    def __init__(self):
+        self.sheets: List[ExportSheet] = []
+
+    def sheet(self, title: str, header_rows: Iterable[int] = (1,)) -> ExportSheet:
+        sheet = ExportSheet(title, header_rows)
+        self.sheets.append(sheet)
+        return sheet
+
+    def save(self) -> BytesIO:
+        wb = Workbook(write_only=True)
+        wb.add_named_style(_header_style())
+        for sheet in self.sheets:
+            sheet.write_to(wb)
+        output = BytesIO()
+        wb.save(output)
+        output.seek(0)
+        return output
+
+_executor: Optional[ThreadPoolExecutor] = None
+_slots: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = weakref.WeakKeyDictionary()
+
+def _export_pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.EXPORT_MAX_CONCURRENCY, thread_name_prefix="export")
+    loop = asyncio.get_running_loop()
+    if loop not in _slots:
+        _slots[loop] = asyncio.Semaphore(settings.EXPORT_MAX_CONCURRENCY)
+    return _executor, _slots[loop]
+
+async def run_export(func: Callable[..., T], *args: Any) -> T:
+    """
+    Выполняет построение файла в пуле потоков экспорта
+
+    Args:
+        func: Синхронная функция экспорта (например, export_statistics_to_excel)
+        *args: Ее аргументы
+
+    Returns:
+        Результат функции
+    """
+    executor, slots = _export_pool()
+    async with slots:
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args))
+
+def order_export_row(order: dict) -> list:
+    dishes_text = ", ".join([f"{item['name']} x{item['quantity']}" for item in order.get('items', [])])
+    return [
+        order['id'],
+        order['user_name'],
+        order['date'].strftime('%d.%m.%Y'),
+        order['status'],
+        order['total_amount'],
+        dishes_text
+    ]
+
+async def export_orders_stream(rows: AsyncIterable[Sequence[Any]]) -> BytesIO:
+    """
+    Выгрузка заказов из потока строк (курсора БД) в Excel
+
+    Строки передаются в пул потоков пачками по EXPORT_CHUNK_ROWS, поэтому
+    в памяти одновременно находится не больше одной пачки.
+
+    Args:
+        rows: Асинхронный поток строк в порядке ORDER_HEADERS
+
+    Returns:
+        BytesIO: Файл xlsx
+    """
+    executor, slots = _export_pool()
+    loop = asyncio.get_running_loop()
+    async with slots:
+        book = ExportWorkbook()
+        sheet = book.sheet("Заказы")
+        sheet.append(ORDER_HEADERS)
+        chunk = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= settings.EXPORT_CHUNK_ROWS:
+                await loop.run_in_executor(executor, sheet.append_many, chunk)
+                chunk = []
+        if chunk:
+            await loop.run_in_executor(executor, sheet.append_many, chunk)
+        return await loop.run_in_executor(executor, book.save)
+
+def export_orders_to_excel(orders_data: list[dict]) -> BytesIO:
+    book = ExportWorkbook()
+    sheet = book.sheet("Заказы")
+    sheet.append(ORDER_HEADERS)
+    sheet.append_many(order_export_row(order) for order in orders_data)
+    return book.save()
 
 def export_statistics_to_excel(stats_data: dict) -> BytesIO:
-    wb = Workbook()
+    book = ExportWorkbook()
     
     if 'summary' in stats_data:
-        ws = wb.active
-        ws.title = "Сводка"
+        ws = book.sheet("Сводка")
         ws.append(["Показатель", "Значение"])
         ws.append(["Всего заказов", stats_data['summary']['total_orders']])
         ws.append(["Уникальных пользователей", stats_data['summary']['unique_users']])
         ws.append(["Общая сумма", stats_data['summary']['total_amount']])
     
     if 'dishes' in stats_data:
-        ws = wb.create_sheet("Блюда")
+        ws = book.sheet("Блюда")
         ws.append(["Блюдо", "Количество", "Выручка"])
-        for dish in stats_data['dishes']:
-            ws.append([dish['name'], dish['quantity'], dish['revenue']])
+        ws.append_many([dish['name'], dish['quantity'], dish['revenue']] for dish in stats_data['dishes'])
     
     if 'users' in stats_data:
-        ws = wb.create_sheet("Пользователи")
+        ws = book.sheet("Пользователи")
         ws.append(["Пользователь", "Заказов", "Сумма", "Средний чек"])
-        for user in stats_data['users']:
-            ws.append([
-                user['name'],
-                user['orders_count'],
-                user['total_amount'],
-                user['avg_order']
-            ])
+        ws.append_many(
+            [user['name'], user['orders_count'], user['total_amount'], user['avg_order']]
+            for user in stats_data['users']
+        )
     
-    for ws in wb.worksheets:
-        header_font = Font(bold=True)
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center")
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
+    if not book.sheets:
+        book.sheet("Сводка")
     
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
+    return book.save()
 
 def export_statistics_to_csv(stats_data: dict) -> BytesIO:
     output = StringIO()
@@ -138,12 +253,11 @@ def export_statistics_to_csv(stats_data: dict) -> BytesIO:
     return csv_file
 
 def export_cafe_report_to_excel(cafe_report: dict) -> BytesIO:
-    wb = Workbook()
+    book = ExportWorkbook()
     
     date_str = cafe_report['date'].strftime('%d.%m.%Y')
     
-    ws_summary = wb.active
-    ws_summary.title = "Сводка"
+    ws_summary = book.sheet("Сводка")
     ws_summary.append(["Отчет по кафе", f"Дата: {date_str}"])
     ws_summary.append([])
     ws_summary.append(["Всего заказов", cafe_report['total_orders']])
@@ -152,7 +266,8 @@ def export_cafe_report_to_excel(cafe_report: dict) -> BytesIO:
     ws_summary.append([])
     
     for cafe_data in cafe_report['cafes']:
-        ws = wb.create_sheet(cafe_data['cafe_name'])
+        # Строка 9 - заголовок таблицы заказов
+        ws = book.sheet(cafe_data['cafe_name'], header_rows=(1, 9))
         ws.append(["Отчет по кафе", cafe_data['cafe_name']])
         ws.append(["Дата", date_str])
         ws.append([])
@@ -162,42 +277,15 @@ def export_cafe_report_to_excel(cafe_report: dict) -> BytesIO:
         ws.append(["Всего позиций", cafe_data['total_items']])
         ws.append([])
         ws.append(["Сотрудник", "Блюда", "Время доставки", "Тип доставки", "Сумма"])
-        
-        for order in cafe_data['orders']:
-            ws.append([
+        ws.append_many(
+            [
                 order['user_name'],
                 order['items'],
                 order.get('delivery_time', ''),
                 order.get('delivery_type', ''),
                 f"{order['total']:.2f} ₽"
-            ])
-    
-    for ws in wb.worksheets:
-        header_font = Font(bold=True)
-        for row in ws.iter_rows(min_row=1, max_row=1):
-            for cell in row:
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center")
-        
-        if ws.title != "Сводка":
-            for row in ws.iter_rows(min_row=9, max_row=9):
-                for cell in row:
-                    cell.font = header_font
-                    cell.alignment = Alignment(horizontal="center")
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
+            ]
+            for order in cafe_data['orders']
+        )
     
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
\ No newline at end of file
+    return book.save()
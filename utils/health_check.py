@@ -51,6 +51,12 @@ async def get_system_info() -> dict:
         dict: Информация о системе
     """
     from config.settings import settings
+    from utils.cache import get_cache_stats
+    from middleware.rate_limit_middleware import get_rate_limit_stats
+    from services.broadcast_service import get_broadcast_stats
+    from services.outbox_service import get_outbox_stats
+    from database.sqlite_profile import get_sqlite_writer_stats
+    from services.file_cache_service import get_file_cache_stats
     
     return {
         "bot_token_set": bool(settings.BOT_TOKEN and settings.BOT_TOKEN != "your_bot_token_here"),
@@ -58,9 +64,49 @@ async def get_system_info() -> dict:
         "admin_count": len(settings.ADMIN_IDS),
         "order_deadline": f"{settings.ORDER_DEADLINE_HOUR:02d}:{settings.ORDER_DEADLINE_MINUTE:02d}",
         "daily_report_time": f"{settings.DAILY_REPORT_HOUR:02d}:{settings.DAILY_REPORT_MINUTE:02d}",
-        "weekly_report": f"День {settings.WEEKLY_REPORT_DAY}, {settings.WEEKLY_REPORT_HOUR:02d}:{settings.WEEKLY_REPORT_MINUTE:02d}"
+        "weekly_report": f"День {settings.WEEKLY_REPORT_DAY}, {settings.WEEKLY_REPORT_HOUR:02d}:{settings.WEEKLY_REPORT_MINUTE:02d}",
+        "cache": get_cache_stats(),
+        "rate_limit": get_rate_limit_stats(),
+        "broadcast": get_broadcast_stats(),
+        "outbox": await get_outbox_stats(),
+        "sqlite_writer": get_sqlite_writer_stats(),
+        "file_cache": get_file_cache_stats()
     }
 
+def _flatten_metrics(prefix: str, value, lines: list) -> None:
+    if isinstance(value, bool):
+        lines.append(f"{prefix} {int(value)}")
+    elif isinstance(value, (int, float)):
+        lines.append(f"{prefix} {value}")
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten_metrics(f"{prefix}_{key}", item, lines)
+
+async def render_metrics(extra: dict = None) -> str:
+    """
+    Формирует метрики в текстовом формате Prometheus
+    
+    Числовые значения get_system_info() становятся метриками quicklunch_<раздел>_<ключ>,
+    за ними следуют гистограммы и счетчики utils.metrics.
+    
+    Args:
+        extra: Дополнительные разделы (например, счетчики webhook)
+    
+    Returns:
+        str: Текст для эндпоинта /metrics
+    """
+    info = await get_system_info()
+    sections = {key: info[key] for key in ("cache", "rate_limit", "broadcast", "outbox", "sqlite_writer", "file_cache")}
+    if extra:
+        sections["webhook"] = extra
+    
+    from utils.metrics import render_registry
+    
+    lines = []
+    for name, section in sections.items():
+        _flatten_metrics(f"quicklunch_{name}", section, lines)
+    return "\n".join(lines) + "\n" + render_registry()
+
 
 
 
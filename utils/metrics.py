@@ -0,0 +1,301 @@
+"""
+Метрики в текстовом формате Prometheus
+
+Реестр счетчиков и гистограмм без внешних зависимостей. Значения
+накапливаются в процессе и отдаются эндпоинтом /metrics (webhook-сервер
+или отдельный сервер метрик при METRICS_PORT в режиме polling).
+
+Источники:
+- middleware.metrics_middleware - апдейты и время обработчиков
+  (по модулю роутера и префиксу callback_data);
+- instrument_engine - SQL-запросы и ожидание соединения из пула;
+- BotApiMetricsMiddleware - время и ошибки вызовов Bot API по методам;
+- instrument_scheduler - длительность и ошибки задач планировщика.
+"""
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_INF_LABEL = 'le="+Inf"'
+_DYNAMIC_SUFFIX = re.compile(r"(_[^_]*\d[^_]*)+$")
+
+def label_prefix(value: Optional[str], limit: int = 40) -> str:
+    """
+    Убирает из callback_data или ID задачи сегменты с числами (ID, даты)
+
+    "order_details_15" -> "order_details", "qty_-1" -> "qty"
+    """
+    if not value:
+        return "none"
+    return _DYNAMIC_SUFFIX.sub("", value)[:limit] or "none"
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """Монотонный счетчик"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram(_Metric):
+    """Гистограмма длительностей (секунды) с накопительными корзинами"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Ключ меток -> [счетчики корзин..., +Inf, сумма]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        row = self._values.get(key)
+        if row is None:
+            row = self._values[key] = [0] * (len(self.buckets) + 2)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[index] += 1
+        row[-2] += 1
+        row[-1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        row = self._values.get(self._key(labels))
+        return int(row[-2]) if row else 0
+
+    def total(self, **labels: Any) -> float:
+        row = self._values.get(self._key(labels))
+        return row[-1] if row else 0.0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, row in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, row):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {int(count)}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LABEL)} {int(row[-2])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(row[-2])}")
+        return lines
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n" if lines else ""
+
+registry = MetricsRegistry()
+
+UPDATES = registry.counter("quicklunch_updates_total", "Обработанные апдейты", ("type",))
+UPDATE_DURATION = registry.histogram(
+    "quicklunch_update_duration_seconds", "Полное время обработки апдейта", ("type",)
+)
+HANDLER_DURATION = registry.histogram(
+    "quicklunch_handler_duration_seconds", "Время обработчика", ("router", "event", "prefix")
+)
+HANDLER_ERRORS = registry.counter(
+    "quicklunch_handler_errors_total", "Исключения обработчиков", ("router", "event", "prefix")
+)
+DB_STATEMENTS = registry.counter("quicklunch_db_statements_total", "SQL-запросы", ("operation",))
+DB_STATEMENT_DURATION = registry.histogram(
+    "quicklunch_db_statement_duration_seconds", "Время выполнения SQL-запроса", ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+DB_POOL_WAIT = registry.histogram(
+    "quicklunch_db_pool_checkout_wait_seconds", "Ожидание соединения из пула",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+BOT_API_DURATION = registry.histogram(
+    "quicklunch_bot_api_duration_seconds", "Время вызова Bot API", ("method",)
+)
+BOT_API_ERRORS = registry.counter(
+    "quicklunch_bot_api_errors_total", "Ошибки вызовов Bot API", ("method", "error")
+)
+JOB_DURATION = registry.histogram(
+    "quicklunch_scheduler_job_duration_seconds", "Время задачи планировщика", ("job",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+JOB_ERRORS = registry.counter("quicklunch_scheduler_job_errors_total", "Ошибки задач планировщика", ("job",))
+
+def _sql_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+def instrument_engine(engine) -> None:
+    """
+    Подключает метрики SQL-запросов и ожидания пула к движку
+
+    Args:
+        engine: AsyncEngine или Engine
+    """
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("metrics_started")
+        if not started:
+            return
+        operation = _sql_operation(statement)
+        DB_STATEMENTS.inc(operation=operation)
+        DB_STATEMENT_DURATION.observe(time.perf_counter() - started.pop(), operation=operation)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    # В SQLAlchemy нет события «до выдачи соединения», поэтому время
+    # ожидания измеряется вокруг получения соединения самим пулом
+    pool = sync_engine.pool
+    do_get = pool._do_get
+
+    def _timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+    pool._do_get = _timed_do_get
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки вызовов Bot API по методам (bot.session.middleware)"""
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, "__api_method__", type(method).__name__)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            BOT_API_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            BOT_API_DURATION.observe(time.perf_counter() - started, method=name)
+
+def instrument_scheduler(scheduler) -> None:
+    """Подключает метрики длительности и ошибок задач APScheduler"""
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+
+    # У задач max_instances=1, поэтому одновременно выполняется один запуск задачи
+    started: Dict[str, float] = {}
+
+    def _listener(event) -> None:
+        if event.code == EVENT_JOB_SUBMITTED:
+            started[event.job_id] = time.perf_counter()
+            return
+
+        job = label_prefix(event.job_id)
+        began = started.pop(event.job_id, None)
+        if began is not None:
+            JOB_DURATION.observe(time.perf_counter() - began, job=job)
+        if event.code == EVENT_JOB_ERROR:
+            JOB_ERRORS.inc(job=job)
+
+    scheduler.add_listener(_listener, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+def render_registry() -> str:
+    """Текст метрик общего реестра"""
+    return registry.render()
+
+async def start_metrics_server(host: str, port: int):
+    """
+    Отдельный сервер /metrics и /healthz для режима polling
+
+    Returns:
+        web.AppRunner: Для остановки через cleanup()
+    """
+    from aiohttp import web
+    from utils.health_check import render_metrics
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=await render_metrics(), content_type="text/plain", charset="utf-8")
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/healthz", healthz)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Сервер метрик слушает {host}:{port}")
+    return runner
@@ -0,0 +1,165 @@
+"""
+Режим webhook: встроенный aiohttp-сервер
+
+POST на WEBHOOK_PATH проверяет секретный токен (X-Telegram-Bot-Api-Secret-Token),
+кладет апдейт в очередь и сразу отвечает 200 - Telegram не ждет обработки.
+Апдейты из очереди обрабатывают WEBHOOK_CONCURRENCY задач; при переполнении
+очереди сервер отвечает 503, и Telegram повторит доставку позже.
+
+Тот же сервер отдает /healthz (процесс жив), /readyz (БД доступна, очередь
+не переполнена) и /metrics (текстовый формат Prometheus), поэтому несколько
+реплик можно поставить за один балансировщик.
+"""
+import asyncio
+import hmac
+from typing import Any, Dict, List, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from loguru import logger
+from config.settings import settings
+from utils.health_check import check_system_health, render_metrics
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookServer:
+    """
+    Прием апдейтов через webhook с быстрым ответом и пулом обработчиков
+
+    Args:
+        dispatcher: Диспетчер aiogram
+        bot: Бот
+        secret_token: Секрет, который Telegram передает в заголовке
+        path: Путь webhook
+        queue_size: Максимум апдейтов, ожидающих обработки
+        concurrency: Число одновременно обрабатываемых апдейтов
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, path: str = "/webhook",
+                 queue_size: int = 1000, concurrency: int = 20):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.path = path
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._workers: List[asyncio.Task] = []
+        self._stats = dict.fromkeys(("received", "processed", "failed", "rejected", "unauthorized"), 0)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.handle_healthz)
+        app.router.add_get("/readyz", self.handle_readyz)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not self.secret_token or not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            self._stats["unauthorized"] += 1
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Некорректный апдейт webhook: {e}")
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self._stats["rejected"] += 1
+            logger.warning("Очередь апдейтов webhook переполнена, Telegram повторит доставку")
+            return web.Response(status=503)
+
+        self._stats["received"] += 1
+        return web.Response(status=200)
+
+    async def handle_healthz(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def handle_readyz(self, request: web.Request) -> web.Response:
+        health = await check_system_health()
+        saturated = self.queue.full()
+        health["checks"]["update_queue"] = {
+            "status": "error" if saturated else "ok",
+            "message": f"{self.queue.qsize()}/{self.queue.maxsize}"
+        }
+        ready = health["status"] == "healthy" and not saturated
+        return web.json_response(health, status=200 if ready else 503)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        body = await render_metrics(self.metrics())
+        return web.Response(text=body, content_type="text/plain", charset="utf-8")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Счетчики приема апдейтов и глубина очереди"""
+        return {
+            **self._stats,
+            "queue_size": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "workers": len(self._workers)
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dispatcher.feed_update(self.bot, update)
+                self._stats["processed"] += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.error(f"Ошибка обработки апдейта {update.update_id}: {e}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    async def _on_startup(self, app: web.Application) -> None:
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        await self.dispatcher.emit_startup(bot=self.bot, dispatcher=self.dispatcher)
+        await self.bot.set_webhook(
+            url=settings.WEBHOOK_URL.rstrip("/") + self.path,
+            secret_token=self.secret_token,
+            allowed_updates=self.dispatcher.resolve_used_update_types(),
+            max_connections=min(100, self.concurrency * 2)
+        )
+        logger.info(f"Webhook установлен: {settings.WEBHOOK_URL.rstrip('/')}{self.path}")
+
+    async def _on_shutdown(self, app: web.Application) -> None:
+        # Webhook не удаляется: остальные реплики продолжают принимать апдейты
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=settings.WEBHOOK_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано апдейтов при остановке: {self.queue.qsize()}")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.dispatcher.emit_shutdown(bot=self.bot, dispatcher=self.dispatcher)
+        await self.bot.session.close()
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, server: Optional[WebhookServer] = None) -> None:
+    """Запускает aiohttp-сервер webhook до остановки процесса"""
+    if not settings.WEBHOOK_URL or not settings.WEBHOOK_SECRET:
+        raise RuntimeError("Для режима webhook нужны WEBHOOK_URL и WEBHOOK_SECRET")
+
+    server = server or WebhookServer(
+        dispatcher,
+        bot,
+        secret_token=settings.WEBHOOK_SECRET,
+        path=settings.WEBHOOK_PATH,
+        queue_size=settings.WEBHOOK_QUEUE_SIZE,
+        concurrency=settings.WEBHOOK_CONCURRENCY
+    )
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Сервер webhook слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()